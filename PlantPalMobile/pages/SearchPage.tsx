@@ -14,9 +14,11 @@ import { Ionicons } from "@expo/vector-icons";
 import { useFonts } from "expo-font";
 import { useNavigation } from "@react-navigation/native";
 import AsyncStorage from "@react-native-async-storage/async-storage";
+import { useAuth } from "../src/contexts/AuthContext";
 
 export default function SearchPage() {
   const navigation = useNavigation();
+  const { getAuthHeader } = useAuth();
   const [fontsLoaded] = useFonts({
     Poppins: require("../assets/fonts/Poppins-Regular.ttf"),
     "Poppins-Bold": require("../assets/fonts/Poppins-Bold.ttf"),
@@ -60,7 +62,11 @@ export default function SearchPage() {
 
     try {
      
-      const response = await fetch(`http://127.0.0.1:8000/api/search_plants/?q=${query}`);
+      // The JWT lets the backend record the search in the user's history
+      const response = await fetch(
+        `http://127.0.0.1:8000/api/search_plants/?q=${encodeURIComponent(query)}`,
+        { headers: getAuthHeader() }
+      );
       if (!response.ok) throw new Error("Failed to fetch data");
       const data = await response.json();
       setResults(data);
@@ -2,6 +2,14 @@ import { useState, useEffect } from "react";
 import { Trash2, ChevronDown } from "lucide-react";
 import BackgroundImage from "../assets/background.png";
 
+// Server-side sort keys for each option in the Filter dropdown
+const SORT_PARAMS: Record<string, string> = {
+  newest: "-created_at",
+  oldest: "created_at",
+  "name-asc": "user_name",
+  "name-desc": "-user_name",
+};
+
 type UserType = {
   id: string;
   full_name: string;
@@ -14,6 +22,7 @@ export default function UserAccount() {
   const API_BASE = "http://127.0.0.1:8000/api/";
 
   const [users, setUsers] = useState<UserType[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [sortBy, setSortBy] = useState<string>("newest");
   const [deleteUserId, setDeleteUserId] = useState<string | null>(null);
   const [filterOpen, setFilterOpen] = useState(false);
@@ -22,10 +31,14 @@ export default function UserAccount() {
 
   useEffect(() => {
     fetchUsers();
-  }, [accessToken]);
+  }, [accessToken, sortBy]);
 
-  const fetchUsers = () => {
-    fetch(`${API_BASE}get_users/`, {
+  // Loads the first page, or the page after `cursor` when loading more
+  const fetchUsers = (cursor?: string) => {
+    const params = new URLSearchParams({ limit: "50", sort: SORT_PARAMS[sortBy] });
+    if (cursor) params.set("cursor", cursor);
+
+    fetch(`${API_BASE}get_users/?${params.toString()}`, {
       method: "GET",
       headers: {
         "Content-Type": "application/json",
@@ -37,7 +50,9 @@ export default function UserAccount() {
         return res.json();
       })
       .then((data) => {
-        if (Array.isArray(data)) setUsers(data);
+        if (!Array.isArray(data.results)) return;
+        setUsers((prev) => (cursor ? [...prev, ...data.results] : data.results));
+        setNextCursor(data.next_cursor);
       })
       .catch((err) => console.error("Error fetching users:", err));
   };
@@ -76,21 +91,6 @@ export default function UserAccount() {
     });
   };
 
-  const sortedUsers = [...users].sort((a, b) => {
-    switch (sortBy) {
-      case "newest":
-        return new Date(b.date_joined).getTime() - new Date(a.date_joined).getTime();
-      case "oldest":
-        return new Date(a.date_joined).getTime() - new Date(b.date_joined).getTime();
-      case "name-asc":
-        return a.full_name.localeCompare(b.full_name);
-      case "name-desc":
-        return b.full_name.localeCompare(a.full_name);
-      default:
-        return 0;
-    }
-  });
-
   return (
     <div
       className="flex h-screen font-['Poppins'] bg-cover bg-center relative"
@@ -174,7 +174,7 @@ export default function UserAccount() {
       </thead>
 
       <tbody>
-        {sortedUsers.map((user, index) => (
+        {users.map((user, index) => (
           <tr
             key={index}
             className="bg-[#e1f0d1] text-[#2F4F2F] rounded-xl shadow-sm"
@@ -211,7 +211,7 @@ export default function UserAccount() {
           </tr>
         ))}
 
-        {sortedUsers.length === 0 && (
+        {users.length === 0 && (
           <tr>
             <td
               colSpan={5}
@@ -224,6 +224,17 @@ export default function UserAccount() {
       </tbody>
     </table>
   </div>
+
+  {nextCursor && (
+    <div className="flex justify-center mt-2">
+      <button
+        className="bg-[#C9E4C5] hover:bg-[#b4d9ae] text-[#2F4F2F] font-medium px-4 py-2 rounded-lg shadow-sm transition"
+        onClick={() => fetchUsers(nextCursor)}
+      >
+        Load more
+      </button>
+    </div>
+  )}
 </div>
 
           </div>
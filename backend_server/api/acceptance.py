@@ -0,0 +1,138 @@
+"""
+In-memory index of which users accepted which terms version.
+
+For every terms_id we keep the set of accepting user ids plus a watermark:
+the newest accepted_at seen. The first lookup loads the version with keyset
+pages over the (terms_id, accepted_at, user_id) index; later refreshes only
+fetch rows from `overlap` seconds before the watermark, so compliance checks
+never scan user_acceptance in full. accepted_at is the inserting
+transaction's start time, so a row can commit after rows with a later
+timestamp were already read; the overlap re-reads that window (the user set
+makes re-reads harmless). Acceptances recorded by this process are added
+immediately.
+"""
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from supabaseclient import supabase
+
+
+class _VersionState:
+    def __init__(self):
+        self.users = set()
+        self.sorted_users = None  # built lazily for paging, dropped on change
+        self.watermark = None     # newest accepted_at seen (datetime)
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+
+class AcceptanceIndex:
+    def __init__(self, refresh_interval=60, page_size=1000, overlap=30):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self.overlap = timedelta(seconds=overlap)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _state(self, terms_id):
+        terms_id = str(terms_id)
+        with self._lock:
+            state = self._versions.get(terms_id)
+            if state is None:
+                state = self._versions[terms_id] = _VersionState()
+        return terms_id, state
+
+    def _fresh_state(self, terms_id):
+        terms_id, state = self._state(terms_id)
+        if time.monotonic() - state.refreshed_at >= self.refresh_interval:
+            with state.lock:
+                if time.monotonic() - state.refreshed_at >= self.refresh_interval:
+                    self._refresh(terms_id, state)
+        return state
+
+    def _refresh(self, terms_id, state):
+        """Pull rows accepted since watermark - overlap, page by page."""
+        floor = (state.watermark - self.overlap).isoformat() if state.watermark else None
+        last = None  # (accepted_at, user_id) of the previous page's last row
+        while True:
+            query = (
+                supabase.table("user_acceptance")
+                .select("user_id, accepted_at")
+                .eq("terms_id", terms_id)
+            )
+            if last:
+                accepted_at, user_id = last
+                query = query.or_(
+                    f'accepted_at.gt."{accepted_at}",'
+                    f'and(accepted_at.eq."{accepted_at}",user_id.gt.{user_id})'
+                )
+            elif floor:
+                query = query.gte("accepted_at", floor)
+            rows = (
+                query.order("accepted_at").order("user_id")
+                .limit(self.page_size)
+                .execute()
+            ).data or []
+
+            new_users = {str(row["user_id"]) for row in rows} - state.users
+            if new_users:
+                state.users |= new_users
+                state.sorted_users = None
+            if rows:
+                last = (rows[-1]["accepted_at"], rows[-1]["user_id"])
+                newest = datetime.fromisoformat(last[0])
+                state.watermark = max(state.watermark or newest, newest)
+            if len(rows) < self.page_size:
+                break
+        state.refreshed_at = time.monotonic()
+
+    # --------------------------------------------------------------------
+    # Queries
+    # --------------------------------------------------------------------
+    def has_accepted(self, terms_id, user_id):
+        return str(user_id) in self._fresh_state(terms_id).users
+
+    def check(self, terms_id, user_ids):
+        """Bulk membership check: {user_id: bool}."""
+        users = self._fresh_state(terms_id).users
+        return {str(user_id): str(user_id) in users for user_id in user_ids}
+
+    def count(self, terms_id):
+        return len(self._fresh_state(terms_id).users)
+
+    def accepted_page(self, terms_id, after=None, limit=50):
+        """
+        One page of accepting user ids in id order, starting after `after`.
+        Returns (user_ids, next_cursor).
+        """
+        state = self._fresh_state(terms_id)
+        with state.lock:
+            if state.sorted_users is None:
+                state.sorted_users = sorted(state.users)
+            ordered = state.sorted_users
+
+        start = bisect.bisect_right(ordered, after) if after else 0
+        page = ordered[start:start + limit]
+        next_cursor = page[-1] if start + limit < len(ordered) else None
+        return page, next_cursor
+
+    # --------------------------------------------------------------------
+    # Writes
+    # --------------------------------------------------------------------
+    def record(self, terms_id, user_id):
+        """Add an acceptance this process just wrote."""
+        _, state = self._state(terms_id)
+        with state.lock:
+            if str(user_id) not in state.users:
+                state.users.add(str(user_id))
+                state.sorted_users = None
+
+
+acceptance_index = AcceptanceIndex(
+    refresh_interval=settings.ACCEPTANCE_INDEX_REFRESH,
+    overlap=settings.ACCEPTANCE_INDEX_OVERLAP,
+)
@@ -0,0 +1,96 @@
+"""
+Cascade-aware bulk deletion of mobile users.
+
+Dependent rows are removed table by table with one in_() delete per chunk of
+users, so deleting N users costs (1 lookup + one delete per table) round-trips
+per chunk of BULK_DELETE_CHUNK ids, instead of several round-trips per user.
+"""
+from supabaseclient import supabase
+
+BULK_DELETE_MAX_USERS = 500
+BULK_DELETE_CHUNK = 100  # ids per in_() filter, keeps request URLs short
+
+# (table, column, key) in deletion order; users itself goes last.
+# key says which user value the column holds: the users.id or the email
+# (notes and scan rows are keyed by the JWT subject, which is the email).
+DEPENDENT_TABLES = [
+    ("profiles", "user_id", "id"),
+    ("user_acceptance", "user_id", "id"),
+    ("notes", "user_id", "email"),
+    ("plants", "user_id", "email"),  # scan records written by scan_plant
+    ("search_history", "user_email", "email"),
+]
+
+
+def total_steps(user_count):
+    chunks = -(-user_count // BULK_DELETE_CHUNK)
+    return chunks * (len(DEPENDENT_TABLES) + 2)  # + lookup + users delete
+
+
+def delete_users(job, user_ids, invalid=(), on_deleted=None):
+    """
+    Job body: delete every user in `user_ids` (canonical UUID strings) and
+    their dependent rows. Ids rejected by the view are passed as `invalid` so
+    they still get an outcome. `on_deleted(emails)` is called after each
+    chunk so callers can drop per-user caches. Returns per-user outcomes.
+    """
+    outcomes = {user_id: {"status": "invalid", "error": "Not a UUID"} for user_id in invalid}
+
+    for start in range(0, len(user_ids), BULK_DELETE_CHUNK):
+        chunk = user_ids[start:start + BULK_DELETE_CHUNK]
+        steps_left = len(DEPENDENT_TABLES) + 2
+
+        found = (
+            supabase.table("users")
+            .select("id, user_email")
+            .in_("id", chunk)
+            .execute()
+        ).data or []
+        job.advance()
+        steps_left -= 1
+
+        emails = {str(row["id"]): row["user_email"] for row in found}
+        for user_id in chunk:
+            if user_id not in emails:
+                outcomes[user_id] = {"status": "not_found"}
+        if not emails:
+            job.advance(steps_left)
+            continue
+
+        keys = {"id": list(emails), "email": [e for e in emails.values() if e]}
+        step = None
+        try:
+            for table, column, key in DEPENDENT_TABLES:
+                step = table
+                if keys[key]:
+                    supabase.table(table).delete().in_(column, keys[key]).execute()
+                job.advance()
+                steps_left -= 1
+
+            step = "users"
+            deleted = (
+                supabase.table("users")
+                .delete()
+                .in_("id", keys["id"])
+                .execute()
+            ).data or []
+            job.advance()
+            deleted_ids = {str(row["id"]) for row in deleted}
+            if on_deleted:
+                on_deleted(emails[user_id] for user_id in deleted_ids if user_id in emails)
+        except Exception as e:
+            print(f"⚠️ Bulk delete failed on {step}:", e)
+            job.advance(steps_left)
+            for user_id in emails:
+                outcomes[user_id] = {"status": "failed", "error": f"{step}: {e}"}
+            continue
+
+        for user_id in emails:
+            outcomes[user_id] = {"status": "deleted"} if user_id in deleted_ids else {
+                "status": "failed", "error": "User row was not deleted"
+            }
+
+    return {
+        "deleted": sum(1 for o in outcomes.values() if o["status"] == "deleted"),
+        "users": outcomes,
+    }
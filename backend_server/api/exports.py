@@ -0,0 +1,97 @@
+"""
+Streaming exports for the admin dashboard.
+
+Rows are read from Supabase in keyset-paginated chunks and rendered as CSV or
+NDJSON one chunk at a time (optionally gzip-compressed on the fly), so memory
+use stays flat however many rows are exported.
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.http import StreamingHttpResponse
+
+from supabaseclient import supabase
+from .utils import apply_keyset
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+def iter_rows(table, columns, order_column, filters=(), chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield every row of `table`, fetched page by page on (order_column, id)."""
+    last = None
+    while True:
+        query = supabase.table(table).select(columns)
+        for apply_filter in filters:
+            query = apply_filter(query)
+        if last:
+            query = apply_keyset(query, order_column, *last)
+
+        rows = query.order(order_column).order("id").limit(chunk_size).execute().data or []
+        yield from rows
+
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1][order_column], rows[-1]["id"])
+
+
+def _chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_csv(rows, fieldnames, chunk_size=EXPORT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in _chunked(rows, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def render_ndjson(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    for chunk in _chunked(rows, chunk_size):
+        yield "".join(json.dumps(row, default=str) + "\n" for row in chunk).encode()
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def streaming_export(rows, filename, output="csv", fieldnames=None, compress=False):
+    """Build the StreamingHttpResponse for an export."""
+    chunks = render_csv(rows, fieldnames) if output == "csv" else render_ndjson(rows)
+    filename = f"{filename}.{output}"
+    content_type = EXPORT_CONTENT_TYPES[output]
+
+    if compress:
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
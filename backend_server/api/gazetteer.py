@@ -0,0 +1,256 @@
+"""
+Offline gazetteer for address autocomplete.
+
+The index is built once (see `manage.py build_gazetteer`) from a GeoNames
+country extract such as PH.txt, and stored as a single sorted file that is
+memory-mapped by every worker:
+
+    magic (8 bytes) | entry count (uint32) | offsets (uint32 * count) | entries
+
+Each entry is `<normalized key>\\t<json payload>\\n`, sorted by key, so a prefix
+lookup is a binary search over the offsets followed by a short forward scan.
+Payloads use the same shape as Nominatim results, so clients can't tell the two
+sources apart.
+
+A forward scan only ranks the first SCAN_LIMIT places in key order, which for
+short prefixes ("s", "san") would miss the big cities. So for every prefix
+matching more places than that, the builder also stores a ranked entry,
+`\\x01<prefix>\\t<json list of the TOP_N most populated places>`, and search
+answers those prefixes from it directly.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import unicodedata
+
+from django.conf import settings
+
+from .geocoding import normalize_query
+
+MAGIC = b"PPGAZ02\0"
+_HEADER = struct.Struct("<8sI")
+_OFFSET = struct.Struct("<I")
+
+# GeoNames feature classes we keep: A = country/region/city admin areas, P = populated places
+_FEATURE_CLASSES = {"A", "P"}
+
+SCAN_LIMIT = 200  # places a forward scan looks at; busier prefixes get a ranked entry
+TOP_N = 20        # places kept per ranked entry
+_RANKED = b"\x01"  # sorts before every normalized key
+
+
+def normalize_key(text: str) -> str:
+    text = unicodedata.normalize("NFKD", normalize_query(text))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+# --------------------------------------------------------------------
+# Reader
+# --------------------------------------------------------------------
+class Gazetteer:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a PlantPal gazetteer index")
+        self._offsets_start = _HEADER.size
+        self._entries_start = self._offsets_start + self.count * _OFFSET.size
+
+    def _entry_start(self, i):
+        return self._entries_start + _OFFSET.unpack_from(self._mm, self._offsets_start + i * _OFFSET.size)[0]
+
+    def _key_at(self, i, length):
+        start = self._entry_start(i)
+        key = self._mm[start:start + length]
+        tab = key.find(b"\t")
+        return key if tab == -1 else key[:tab]
+
+    def _lower_bound(self, prefix: bytes):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid, len(prefix)) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _ranked(self, prefix: bytes):
+        """The precomputed top places for `prefix`, or None if it has no ranked entry."""
+        key = _RANKED + prefix
+        i = self._lower_bound(key)
+        if i >= self.count or self._key_at(i, len(key) + 1) != key:
+            return None
+        start = self._entry_start(i)
+        return json.loads(self._mm[start + len(key) + 1:self._mm.find(b"\n", start)])
+
+    def search(self, query: str, limit=5):
+        """
+        Return up to `limit` (<= TOP_N) places whose name starts with `query`,
+        most populated first.
+        """
+        prefix = normalize_key(query).encode().lstrip(_RANKED)
+        if not prefix:
+            return []
+
+        ranked = self._ranked(prefix)
+        if ranked is not None:
+            return ranked[:limit]
+
+        # Fewer than SCAN_LIMIT places match, so the scan sees all of them
+        results = {}
+        i = self._lower_bound(prefix)
+        while i < self.count and len(results) < SCAN_LIMIT:
+            start = self._entry_start(i)
+            end = self._mm.find(b"\n", start)
+            key, _, payload = self._mm[start:end].partition(b"\t")
+            if not key.startswith(prefix):
+                break
+            place = json.loads(payload)
+            results.setdefault(place["place_id"], place)
+            i += 1
+
+        ranked = sorted(results.values(), key=lambda p: p.get("population", 0), reverse=True)
+        return ranked[:limit]
+
+    def close(self):
+        self._mm.close()
+
+
+# --------------------------------------------------------------------
+# Builder
+# --------------------------------------------------------------------
+def _read_admin_names(path):
+    names = {}
+    if not path:
+        return names
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2:
+                names[parts[0]] = parts[1]
+    return names
+
+
+def iter_geonames(path, admin1_path=None, admin2_path=None, country_name="Philippines"):
+    """
+    Yield (keys, payload) pairs from a GeoNames extract (e.g. PH.txt).
+    Optional admin1/admin2 code files are used to build full display names.
+    """
+    admin1 = _read_admin_names(admin1_path)
+    admin2 = _read_admin_names(admin2_path)
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15 or cols[6] not in _FEATURE_CLASSES:
+                continue
+
+            geoname_id, name, ascii_name = cols[0], cols[1], cols[2]
+            country_code = cols[8]
+            state = admin1.get(f"{country_code}.{cols[10]}")
+            county = admin2.get(f"{country_code}.{cols[10]}.{cols[11]}")
+
+            parts = [name]
+            for part in (county, state, country_name):
+                if part and part != parts[-1]:
+                    parts.append(part)
+            display_name = ", ".join(parts)
+
+            address = {"name": name, "country": country_name, "country_code": country_code.lower()}
+            if county:
+                address["county"] = county
+            if state:
+                address["state"] = state
+
+            payload = {
+                "place_id": f"geonames:{geoname_id}",
+                "display_name": display_name,
+                "lat": cols[4],
+                "lon": cols[5],
+                "class": "place" if cols[6] == "P" else "boundary",
+                "type": cols[7].lower(),
+                "population": int(cols[14] or 0),
+                "address": address,
+            }
+            keys = {normalize_key(name), normalize_key(ascii_name), normalize_key(display_name)}
+            keys.discard("")
+            yield keys, payload
+
+
+def ranked_prefixes(keyed, scan_limit=SCAN_LIMIT):
+    """
+    keyed: [(key bytes, place index)] sorted by key.
+    Yield (prefix, {place index}) for every prefix matching more than
+    `scan_limit` places, lengthening prefixes until none does.
+    """
+    groups = [(b"", keyed)]
+    length = 0
+    while groups:
+        length += 1
+        busier = []
+        for _, members in groups:
+            bucket, current = [], None
+            for key, place in members:
+                if len(key) < length:
+                    continue
+                if key[:length] != current:
+                    if len({p for _, p in bucket}) > scan_limit:
+                        busier.append((current, bucket))
+                    bucket, current = [], key[:length]
+                bucket.append((key, place))
+            if len({p for _, p in bucket}) > scan_limit:
+                busier.append((current, bucket))
+        for prefix, members in busier:
+            yield prefix, {place for _, place in members}
+        groups = busier
+
+
+def build_index(places, out_path, scan_limit=SCAN_LIMIT, top_n=TOP_N):
+    """Write (keys, payload) pairs into a sorted, mmap-able index file. Returns the entry count."""
+    blobs, populations, keyed = [], [], []
+    for keys, payload in places:
+        place = len(blobs)
+        blobs.append(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode())
+        populations.append(payload.get("population", 0))
+        keyed.extend((key.encode(), place) for key in keys)
+    keyed.sort()
+
+    entries = [key + b"\t" + blobs[place] + b"\n" for key, place in keyed]
+    for prefix, members in ranked_prefixes(keyed, scan_limit):
+        top = sorted(members, key=lambda place: populations[place], reverse=True)[:top_n]
+        entries.append(_RANKED + prefix + b"\t[" + b",".join(blobs[place] for place in top) + b"]\n")
+    entries.sort()
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(entries)))
+        offset = 0
+        for entry in entries:
+            f.write(_OFFSET.pack(offset))
+            offset += len(entry)
+        for entry in entries:
+            f.write(entry)
+    os.replace(tmp_path, out_path)
+    return len(entries)
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Return the shared index, or None when GAZETTEER_PATH is unset or missing."""
+    global _gazetteer
+    if _gazetteer is not None or not settings.GAZETTEER_PATH:
+        return _gazetteer
+
+    with _gazetteer_lock:
+        if _gazetteer is None and os.path.exists(settings.GAZETTEER_PATH):
+            _gazetteer = Gazetteer(settings.GAZETTEER_PATH)
+    return _gazetteer
@@ -0,0 +1,246 @@
+"""
+Caching, rate-limited proxy in front of Nominatim (used by the address search).
+
+- queries are normalized before they hit the cache or the upstream API
+- results are kept in an in-process LRU+TTL cache and, optionally, in a
+  shared Django cache (e.g. Redis) so every worker benefits
+- identical queries that are already in flight wait for the same upstream call
+- upstream calls go through one pooled requests.Session with timeouts and a
+  token bucket, so we stay within Nominatim's 1 request/second policy. With a
+  shared cache the bucket lives there too and the limit holds across all
+  workers; otherwise it is per process, so run a single worker (or divide
+  NOMINATIM_RATE_PER_SEC by the worker count)
+- the shared cache is best effort: if it errors, lookups behave as a miss
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from .cache import TTLCache
+
+
+class GeocodingError(Exception):
+    """Upstream geocoder failed or returned something unusable."""
+
+
+class RateLimited(GeocodingError):
+    """No upstream slot became available within the allowed wait."""
+
+
+def normalize_query(query: str) -> str:
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"[\s,]+", " ", query)
+    return query.strip(" .,;")
+
+
+# --------------------------------------------------------------------
+# Token bucket
+# --------------------------------------------------------------------
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """Take one token, waiting up to `timeout` seconds for it."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SharedTokenBucket:
+    """
+    Rate limit shared by every worker through a Django cache (e.g. Redis).
+    Time is cut into slots of 1/rate seconds and the first caller to
+    increment a slot's counter owns it. Falls back to a per-process bucket
+    while the cache is unreachable.
+    """
+
+    def __init__(self, cache, rate: float, prefix: str = "geocode:bucket"):
+        self.cache = cache
+        self.rate = rate
+        self.prefix = prefix
+        self.fallback = TokenBucket(rate)
+
+    def _take_slot(self, now):
+        key = f"{self.prefix}:{int(now * self.rate)}"
+        ttl = max(1, int(2 / self.rate))
+        self.cache.add(key, 0, ttl)
+        return self.cache.incr(key) == 1
+
+    def acquire(self, timeout: float = 0.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            try:
+                if self._take_slot(now):
+                    return True
+            except Exception as e:
+                print("⚠️ Shared rate limit unavailable, using the local bucket:", e)
+                return self.fallback.acquire(max(0.0, deadline - time.monotonic()))
+
+            wait = (int(now * self.rate) + 1) / self.rate - now
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+# --------------------------------------------------------------------
+# Request coalescing
+# --------------------------------------------------------------------
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class NominatimProxy:
+    def __init__(self, url, user_agent, rate=1.0, timeout=(3.05, 5.0), max_wait=2.0,
+                 cache_size=2048, cache_ttl=86400, shared_cache=None, limit=5):
+        self.url = url
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.limit = limit
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.shared_cache = shared_cache
+        self.bucket = SharedTokenBucket(shared_cache, rate) if shared_cache is not None else TokenBucket(rate)
+
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": user_agent})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _cache_key(self, query):
+        # Hash the normalized query: raw text can hold spaces/unicode and run past
+        # 250 chars, which memcached rejects
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        return f"geocode:{self.limit}:{digest}"
+
+    def _shared_get(self, key):
+        if self.shared_cache is None:
+            return None
+        try:
+            return self.shared_cache.get(key)
+        except Exception as e:
+            print("⚠️ Shared geocoder cache read failed:", e)
+            return None
+
+    def _shared_set(self, key, value):
+        if self.shared_cache is None:
+            return
+        try:
+            self.shared_cache.set(key, value, self.cache.ttl)
+        except Exception as e:
+            print("⚠️ Shared geocoder cache write failed:", e)
+
+    def search(self, query: str):
+        query = normalize_query(query)
+        key = self._cache_key(query)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        cached = self._shared_get(key)
+        if cached is not None:
+            self.cache.set(key, cached)
+            return cached
+
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+
+        if not leader:
+            if not call.done.wait(self.max_wait + sum(self.timeout)):
+                raise GeocodingError("Timed out waiting for address lookup")
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._fetch(query)
+            self.cache.set(key, call.result)
+            self._shared_set(key, call.result)
+            return call.result
+        except Exception as e:
+            # Followers re-raise this; a non-GeocodingError would otherwise
+            # leave them returning result=None
+            call.error = e if isinstance(e, GeocodingError) else GeocodingError(str(e))
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def _fetch(self, query):
+        if not self.bucket.acquire(self.max_wait):
+            raise RateLimited("Address lookup is busy, try again shortly")
+
+        params = {
+            "q": query,
+            "format": "json",
+            "addressdetails": 1,
+            "limit": self.limit,
+        }
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise GeocodingError(str(e)) from e
+
+
+_proxy = None
+_proxy_lock = threading.Lock()
+
+
+def get_geocoder() -> NominatimProxy:
+    """Build the shared proxy once per process from Django settings."""
+    global _proxy
+    if _proxy is not None:
+        return _proxy
+
+    with _proxy_lock:
+        if _proxy is None:
+            shared_cache = None
+            if settings.GEOCODER_SHARED_CACHE:
+                from django.core.cache import caches
+                shared_cache = caches[settings.GEOCODER_SHARED_CACHE]
+
+            _proxy = NominatimProxy(
+                url=settings.NOMINATIM_URL,
+                user_agent=settings.NOMINATIM_USER_AGENT,
+                rate=settings.NOMINATIM_RATE_PER_SEC,
+                timeout=(settings.NOMINATIM_CONNECT_TIMEOUT, settings.NOMINATIM_READ_TIMEOUT),
+                cache_size=settings.GEOCODER_CACHE_SIZE,
+                cache_ttl=settings.GEOCODER_CACHE_TTL,
+                shared_cache=shared_cache,
+            )
+    return _proxy
@@ -0,0 +1,127 @@
+"""
+Minimal in-process background jobs with progress reporting.
+
+Jobs run on a small thread pool in the worker process that started them.
+Their state lives in memory and, when JOBS_SHARED_CACHE names a Django cache
+shared by all workers (e.g. Redis), is also published there on every change,
+so a status poll that lands on another worker still finds the job. Without a
+shared cache, run a single worker process or route polls back to the same one.
+Finished jobs are forgotten after JOB_RETENTION seconds.
+"""
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+JOB_RETENTION = 3600  # seconds
+
+
+class Job:
+    def __init__(self, kind, total, on_change=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.total = total
+        self.done = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._on_change = on_change
+        self._lock = threading.Lock()
+
+    def advance(self, steps=1):
+        with self._lock:
+            self.done = min(self.total, self.done + steps)
+        self.changed()
+
+    def changed(self):
+        if self._on_change:
+            self._on_change(self)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": {"done": self.done, "total": self.total},
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobRunner:
+    def __init__(self, max_workers=2, shared_cache=""):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plantpal-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._shared_cache = shared_cache  # Django cache alias, resolved on first use
+
+    def submit(self, kind, total, fn, *args):
+        """Run fn(job, *args) in the background; its return value becomes job.result."""
+        job = Job(kind, total, on_change=self._publish)
+        with self._lock:
+            self._forget_finished()
+            self._jobs[job.id] = job
+        job.changed()
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """as_dict() of a job started by any worker, or None if unknown/expired."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.as_dict()
+        cache = self._cache()
+        if cache is None:
+            return None
+        try:
+            return cache.get(f"job:{job_id}")
+        except Exception as e:
+            print("⚠️ Job state lookup failed:", e)
+            return None
+
+    def _cache(self):
+        if not self._shared_cache:
+            return None
+        from django.core.cache import caches
+        return caches[self._shared_cache]
+
+    def _publish(self, job):
+        cache = self._cache()
+        if cache is None:
+            return
+        try:
+            cache.set(f"job:{job.id}", job.as_dict(), JOB_RETENTION)
+        except Exception as e:
+            print(f"⚠️ Could not publish job {job.id}:", e)
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        job.changed()
+        try:
+            job.result = fn(job, *args)
+            job.status = "finished"
+        except Exception as e:
+            print(f"⚠️ Job {job.kind} {job.id} failed:", traceback.format_exc())
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.changed()
+
+    def _forget_finished(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+jobs = JobRunner(shared_cache=settings.JOBS_SHARED_CACHE)
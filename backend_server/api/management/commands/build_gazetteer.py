@@ -0,0 +1,69 @@
+import os
+import tempfile
+import time
+import zipfile
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.gazetteer import build_index, iter_geonames
+
+GEONAMES_BASE = "https://download.geonames.org/export/dump"
+
+
+def _fetch(source, workdir):
+    """Download `source` if it is a URL and unzip it if needed; return a local .txt path."""
+    if source.startswith(("http://", "https://")):
+        local = os.path.join(workdir, os.path.basename(source))
+        with requests.get(source, stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            with open(local, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+        source = local
+
+    if source.endswith(".zip"):
+        with zipfile.ZipFile(source) as archive:
+            member = os.path.splitext(os.path.basename(source))[0] + ".txt"
+            return archive.extract(member, workdir)
+    return source
+
+
+class Command(BaseCommand):
+    help = "Build the offline address autocomplete index from a GeoNames extract."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", nargs="?", default=f"{GEONAMES_BASE}/PH.zip",
+                            help="GeoNames country file (.txt/.zip), local path or URL")
+        parser.add_argument("--admin1", default=f"{GEONAMES_BASE}/admin1CodesASCII.txt",
+                            help="GeoNames admin1 code names (path or URL, '' to skip)")
+        parser.add_argument("--admin2", default=f"{GEONAMES_BASE}/admin2Codes.txt",
+                            help="GeoNames admin2 code names (path or URL, '' to skip)")
+        parser.add_argument("--country-name", default="Philippines")
+        parser.add_argument("--out", default=settings.GAZETTEER_PATH,
+                            help="Index file to write (defaults to GAZETTEER_PATH)")
+
+    def handle(self, *args, **options):
+        out = options["out"]
+        if not out:
+            raise CommandError("Set GAZETTEER_PATH or pass --out")
+
+        start = time.time()
+        with tempfile.TemporaryDirectory() as workdir:
+            try:
+                source = _fetch(options["source"], workdir)
+                admin1 = _fetch(options["admin1"], workdir) if options["admin1"] else None
+                admin2 = _fetch(options["admin2"], workdir) if options["admin2"] else None
+            except (requests.exceptions.RequestException, OSError, KeyError) as e:
+                raise CommandError(f"Could not fetch GeoNames data: {e}")
+
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            places = iter_geonames(source, admin1, admin2, country_name=options["country_name"])
+            count = build_index(places, out)
+
+        size_mb = os.path.getsize(out) / (1 << 20)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {count} entries to {out} ({size_mb:.1f} MB) in {time.time() - start:.1f}s"
+        ))
@@ -0,0 +1,261 @@
+"""
+Per-request latency and Supabase round-trip instrumentation.
+
+RequestMetricsMiddleware times every request and, through httpx event hooks
+on the Supabase PostgREST session, counts the Supabase calls the request made,
+the time spent in them and the bytes sent/received. Aggregates are exposed in
+Prometheus text format by `metrics_view` (/metrics), together with the search
+history recorder's counters. Requests slower than SLOW_REQUEST_MS are logged
+together with their Supabase query sequence. Streaming responses are recorded
+when their body has been sent, so the time and Supabase calls made while
+iterating it are included.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from supabaseclient import supabase
+
+from .search_history import search_recorder
+
+logger = logging.getLogger("plantpal.slow_requests")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar("plantpal_request_stats", default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.calls = []  # (method, target, status, seconds, bytes)
+
+    @property
+    def supabase_seconds(self):
+        return sum(call[3] for call in self.calls)
+
+    @property
+    def supabase_bytes(self):
+        return sum(call[4] for call in self.calls)
+
+
+# --------------------------------------------------------------------
+# Supabase client instrumentation
+# --------------------------------------------------------------------
+def _on_request(request):
+    request.extensions["plantpal_started"] = time.perf_counter()
+
+
+def _on_response(response):
+    stats = _current.get()
+    if stats is None:
+        return
+    response.read()  # postgrest reads the whole body anyway; this lets us size it
+    request = response.request
+    started = request.extensions.get("plantpal_started", time.perf_counter())
+    target = request.url.path + (f"?{request.url.query.decode()}" if request.url.query else "")
+    stats.calls.append((
+        request.method,
+        target,
+        response.status_code,
+        time.perf_counter() - started,
+        len(request.content or b"") + len(response.content),
+    ))
+
+
+def instrument_supabase(client=supabase):
+    """
+    Attach the timing hooks to the client's PostgREST session. Cheap to call
+    repeatedly; supabase-py may rebuild the session on auth changes.
+    """
+    session = client.postgrest.session
+    if getattr(session, "_plantpal_instrumented", False):
+        return
+    session.event_hooks["request"].append(_on_request)
+    session.event_hooks["response"].append(_on_response)
+    session._plantpal_instrumented = True
+
+
+# --------------------------------------------------------------------
+# Aggregation
+# --------------------------------------------------------------------
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)  # (route, method, status) -> count
+        self.durations = defaultdict(lambda: _Histogram(DURATION_BUCKETS))
+        self.supabase_calls = defaultdict(lambda: _Histogram(CALL_COUNT_BUCKETS))
+        self.supabase_seconds = defaultdict(float)
+        self.supabase_bytes = defaultdict(int)
+
+    def observe(self, route, method, status, seconds, stats):
+        key = (route, method)
+        with self._lock:
+            self.requests[(route, method, str(status))] += 1
+            self.durations[key].observe(seconds)
+            self.supabase_calls[key].observe(len(stats.calls))
+            self.supabase_seconds[key] += stats.supabase_seconds
+            self.supabase_bytes[key] += stats.supabase_bytes
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+
+        def labels(**values):
+            escaped = (
+                f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                for k, v in values.items()
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        def histogram(name, help_text, data):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (route, method), hist in sorted(data.items()):
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f"{name}_bucket{labels(route=route, method=method, le=bound)} {count}")
+                lines.append(f'{name}_bucket{labels(route=route, method=method, le="+Inf")} {hist.count}')
+                lines.append(f"{name}_sum{labels(route=route, method=method)} {hist.sum}")
+                lines.append(f"{name}_count{labels(route=route, method=method)} {hist.count}")
+
+        with self._lock:
+            lines.append("# HELP plantpal_http_requests_total Requests handled, by route, method and status.")
+            lines.append("# TYPE plantpal_http_requests_total counter")
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f"plantpal_http_requests_total{labels(route=route, method=method, status=status)} {count}")
+
+            histogram("plantpal_http_request_duration_seconds",
+                      "Total request latency.", self.durations)
+            histogram("plantpal_supabase_calls_per_request",
+                      "Supabase round-trips made by one request.", self.supabase_calls)
+
+            lines.append("# HELP plantpal_supabase_duration_seconds_total Time spent waiting on Supabase.")
+            lines.append("# TYPE plantpal_supabase_duration_seconds_total counter")
+            for (route, method), seconds in sorted(self.supabase_seconds.items()):
+                lines.append(f"plantpal_supabase_duration_seconds_total{labels(route=route, method=method)} {seconds}")
+
+            lines.append("# HELP plantpal_supabase_bytes_total Bytes sent to and received from Supabase.")
+            lines.append("# TYPE plantpal_supabase_bytes_total counter")
+            for (route, method), size in sorted(self.supabase_bytes.items()):
+                lines.append(f"plantpal_supabase_bytes_total{labels(route=route, method=method)} {size}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# --------------------------------------------------------------------
+# Middleware & endpoint
+# --------------------------------------------------------------------
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_supabase()
+
+    def __call__(self, request):
+        instrument_supabase()
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+
+        # Server-Timing goes out with the headers, so for streaming responses
+        # it only covers the view; the registry gets the full time on close
+        response["Server-Timing"] = (
+            f'total;dur={seconds * 1000:.1f}, '
+            f'supabase;dur={stats.supabase_seconds * 1000:.1f};desc="{len(stats.calls)} calls"'
+        )
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = self._stream(
+                response.streaming_content, stats,
+                lambda: self._finish(request, response, stats, time.perf_counter() - started),
+            )
+        else:
+            self._finish(request, response, stats, seconds)
+        return response
+
+    @staticmethod
+    def _stream(content, stats, finish):
+        """
+        Yield `content` with the request's stats active while each chunk is
+        produced, then call finish() once the server closes the response.
+        """
+        try:
+            iterator = iter(content)
+            while True:
+                token = _current.set(stats)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _current.reset(token)
+                yield chunk
+        finally:
+            finish()
+
+    def _finish(self, request, response, stats, seconds):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match else "<unmatched>"
+        registry.observe(route, request.method, response.status_code, seconds, stats)
+
+        slow_ms = settings.SLOW_REQUEST_MS
+        if slow_ms and seconds * 1000 >= slow_ms:
+            queries = "\n".join(
+                f"    {method} {target} -> {status} {secs * 1000:.1f}ms {size}B"
+                for method, target, status, secs, size in stats.calls
+            )
+            logger.warning(
+                "Slow request %s %s (%s) %.1fms, %d Supabase calls, %.1fms in Supabase\n%s",
+                request.method, request.path, route, seconds * 1000,
+                len(stats.calls), stats.supabase_seconds * 1000, queries,
+            )
+
+
+def render_search_history():
+    stats, queued = search_recorder.snapshot()
+    lines = [
+        "# HELP plantpal_search_history_events_total Search history events, by outcome.",
+        "# TYPE plantpal_search_history_events_total counter",
+    ]
+    lines += [f'plantpal_search_history_events_total{{event="{event}"}} {count}' for event, count in sorted(stats.items())]
+    lines += [
+        "# HELP plantpal_search_history_queued Search history events waiting to be flushed.",
+        "# TYPE plantpal_search_history_queued gauge",
+        f"plantpal_search_history_queued {queued}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization", "") != f"Bearer {token}":
+        return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    body = registry.render() + render_search_history()
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -2,7 +2,7 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi_jwt_auth import AuthJWT
 from fastapi_jwt_auth.exceptions import AuthJWTException
 from pydantic import BaseModel
-from backend.plant_model import predict  # your model inference function
+from backend.plant_model import predict, PLANT_NAMES  # model inference + class names from its manifest
 from supabase import create_client, Client
 import base64
 from PIL import Image
@@ -52,12 +52,7 @@ async def scan_plant(payload: ScanRequest, Authorize: AuthJWT = Depends()):
         class_id = predict(image)  # returns numeric class index
 
         # 4️⃣ Map class index to plant name
-        plant_names = [
-            "Tarragon", "Peppermint", "Chocomint", "Spearmint",
-            "Oregano (Plain)", "Oregano (Variegated)", "Sambong",
-            "Acapulco", "Lagundi", "Tsaang Gubat"
-        ]
-        plant_name = plant_names[class_id] if class_id < len(plant_names) else "Unknown"
+        plant_name = PLANT_NAMES[class_id] if class_id < len(PLANT_NAMES) else "Unknown"
 
         # 5️⃣ Insert scan record into Supabase
         supabase.table("plants").insert({
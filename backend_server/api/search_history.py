@@ -0,0 +1,115 @@
+"""
+Write-behind recorder for the search_history table.
+
+search_plants only enqueues an event (no I/O on the request path). A daemon
+thread flushes the queue to Supabase with one bulk insert whenever
+SEARCH_HISTORY_FLUSH_SIZE events are waiting or SEARCH_HISTORY_FLUSH_INTERVAL
+seconds have passed. Repeated queries from the same user within a batch are
+collapsed into their latest occurrence. The queue is bounded: when it is
+full new events are dropped and counted rather than slowing searches down.
+"""
+import atexit
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from django.conf import settings
+
+from supabaseclient import supabase
+
+
+class SearchHistoryRecorder:
+    def __init__(self, flush_size=100, flush_interval=5.0, max_queue=10000, table="search_history"):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.table = table
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.stats = {"recorded": 0, "dropped": 0, "deduplicated": 0, "flushed": 0, "failed": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def snapshot(self):
+        """Counters plus the current queue depth, for /metrics."""
+        with self._lock:
+            stats = dict(self.stats)
+        return stats, self._queue.qsize()
+
+    def record(self, user_email, query):
+        """Enqueue one search; never blocks."""
+        if not user_email or not query:
+            return
+        self._ensure_started()
+        event = (user_email, query, datetime.utcnow().isoformat())
+        try:
+            self._queue.put_nowait(event)
+            self._count("recorded")
+        except queue.Full:
+            self._count("dropped")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="search-history-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]  # sleep until there is work
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        # Keep the latest occurrence of each (user, query) pair
+        latest = {}
+        for user_email, query, timestamp in batch:
+            latest[(user_email, query.strip().casefold())] = {
+                "user_email": user_email,
+                "query": query,
+                "timestamp": timestamp,
+            }
+        rows = list(latest.values())
+        self._count("deduplicated", len(batch) - len(rows))
+
+        with self._flush_lock:
+            try:
+                supabase.table(self.table).insert(rows).execute()
+                self._count("flushed", len(rows))
+            except Exception:
+                print("⚠️ Failed to flush search history:", traceback.format_exc())
+                self._count("failed", len(rows))
+
+    def flush(self):
+        """Synchronously write whatever is queued (used at shutdown)."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(batch), self.flush_size):
+            self._flush(batch[start:start + self.flush_size])
+
+
+search_recorder = SearchHistoryRecorder(
+    flush_size=settings.SEARCH_HISTORY_FLUSH_SIZE,
+    flush_interval=settings.SEARCH_HISTORY_FLUSH_INTERVAL,
+    max_queue=settings.SEARCH_HISTORY_MAX_QUEUE,
+)
+atexit.register(search_recorder.flush)
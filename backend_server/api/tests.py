@@ -1,3 +1,723 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory
+
+from . import gazetteer, metrics, views
+from .geocoding import GeocodingError, NominatimProxy, RateLimited, normalize_query
+from .search_history import SearchHistoryRecorder
+from .utils import apply_keyset, decode_cursor, encode_cursor
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Cold import of the URLconf (and so every view module), measured with -X importtime.
+# Set IMPORT_TIME_CHECK=0 to skip the timing test on a noisy machine.
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.0"))  # seconds
+IMPORT_TIME_CHECK = os.getenv("IMPORT_TIME_CHECK", "1") != "0"
+HEAVY_MODULES = ("torch", "torchvision", "torchaudio", "PIL", "numpy")
+URLCONF_IMPORT = "import django; django.setup(); import api.urls"
+
+
+def run_fresh(statement, *flags):
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": "backend.settings", "PYTHONPATH": str(BASE_DIR)}
+    return subprocess.run(
+        [sys.executable, *flags, "-c", statement],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def loaded_modules(statement):
+    """Top-level modules in sys.modules after running `statement` in a fresh interpreter."""
+    result = run_fresh(f"{statement}; import sys; print(' '.join({{m.split('.')[0] for m in sys.modules}}))")
+    return set(result.stdout.split())
+
+
+def profile_imports(statement):
+    """
+    Run `statement` in a fresh interpreter under -X importtime.
+    Returns {module: cumulative microseconds}.
+    """
+    timings = {}
+    for line in run_fresh(statement, "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        timings[module.strip()] = int(cumulative)
+    return timings
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_urlconf_does_not_import_ml_stack(self):
+        loaded = sorted(loaded_modules(URLCONF_IMPORT) & set(HEAVY_MODULES))
+        self.assertEqual(loaded, [], "ML modules imported at startup; import them lazily via backend.plant_model")
+
+    def test_urlconf_import_time_budget(self):
+        if not IMPORT_TIME_CHECK:
+            self.skipTest("IMPORT_TIME_CHECK=0")
+        timings = profile_imports(URLCONF_IMPORT)
+        seconds = timings["api.urls"] / 1e6
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:10]
+        report = "\n".join(f"{us / 1e6:8.3f}s  {module}" for module, us in slowest)
+        self.assertLess(seconds, IMPORT_TIME_BUDGET, f"api.urls took {seconds:.3f}s to import:\n{report}")
+
+
+class StubNominatim:
+    """Local HTTP server standing in for Nominatim; counts requests."""
+
+    def __init__(self, delay=0.0, status=200):
+        self.delay = delay
+        self.status = status
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                time.sleep(stub.delay)
+                body = json.dumps([{"display_name": "Cebu City", "lat": "10.3", "lon": "123.9"}]).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/search"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class BrokenCache:
+    """A shared cache whose backend is down."""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("cache down")
+        return fail
+
+
+def run_concurrently(fn, count):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+class NominatimProxyTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = StubNominatim()
+        self.addCleanup(self.stub.close)
+
+    def proxy(self, **options):
+        # A slow refill keeps every test inside one rate-limit slot
+        options = {"rate": 0.01, "max_wait": 0.0, **options}
+        return NominatimProxy(self.stub.url, "PlantPal tests", **options)
+
+    def test_identical_queries_share_one_upstream_call(self):
+        self.stub.delay = 0.3
+        proxy = self.proxy()
+        results, errors = run_concurrently(lambda: proxy.search("Cebu City"), 8)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.stub.hits, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_normalized_query_is_served_from_cache(self):
+        proxy = self.proxy()
+        first = proxy.search("Cebu City")
+        self.assertEqual(proxy.search("  cebu,  city. "), first)
+        self.assertEqual(self.stub.hits, 1)
+
+    def test_rate_limit_rejects_without_calling_upstream(self):
+        proxy = self.proxy()
+        proxy.search("Cebu City")
+        with self.assertRaises(RateLimited):
+            proxy.search("Davao City")
+        self.assertEqual(self.stub.hits, 1)
+
+    def test_rate_limit_is_shared_through_the_cache(self):
+        shared = LocMemCache("geocoder-rate-test", {})
+        self.proxy(shared_cache=shared).search("Cebu City")
+        with self.assertRaises(RateLimited):
+            self.proxy(shared_cache=shared).search("Davao City")
+        self.assertEqual(self.stub.hits, 1)
+
+    def test_upstream_error_reaches_every_waiter(self):
+        self.stub.delay, self.stub.status = 0.3, 500
+        proxy = self.proxy()
+        results, errors = run_concurrently(lambda: proxy.search("Cebu City"), 4)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(all(isinstance(e, GeocodingError) for e in errors))
+        self.assertEqual(self.stub.hits, 1)
+
+    def test_unexpected_leader_failure_is_not_a_silent_none(self):
+        proxy = self.proxy()
+
+        def explode(query):
+            time.sleep(0.3)
+            raise KeyError("unexpected")
+
+        proxy._fetch = explode
+        results, errors = run_concurrently(lambda: proxy.search("Cebu City"), 4)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+
+    def test_shared_cache_failure_is_a_miss(self):
+        proxy = self.proxy(shared_cache=BrokenCache())
+        self.assertEqual(proxy.search("Cebu City")[0]["display_name"], "Cebu City")
+        self.assertEqual(self.stub.hits, 1)
+
+    def test_shared_cache_key_is_memcached_safe(self):
+        shared = LocMemCache("geocoder-key-test", {})
+        proxy = self.proxy(shared_cache=shared)
+        query = "Barangay Lahug, Cebu City, Central Visayas " * 10
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            proxy.search(query)
+        key = proxy._cache_key(normalize_query(query))
+        self.assertLessEqual(len(key), 250)
+        self.assertRegex(key, r"^geocode:\d+:[0-9a-f]{40}$")
+        self.assertIsNotNone(shared.get(key))
+
+
+def split_top_level(text):
+    """Split a PostgREST logic tree on commas outside parentheses and quotes."""
+    parts, depth, quoted, escaped, current = [], 0, False, False, ""
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == "\\" and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == "(" and not quoted:
+            depth += 1
+        elif char == ")" and not quoted:
+            depth -= 1
+        elif char == "," and not depth and not quoted:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    return parts + [current]
+
+
+def unquote(value):
+    if value.startswith('"') and value.endswith('"'):
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def like_regex(pattern):
+    """PostgREST (i)like pattern (`*` or `%` any run, `_` one char, `\\` escapes) -> regex."""
+    out, chars = "", iter(pattern)
+    for char in chars:
+        if char == "\\":
+            out += re.escape(next(chars, ""))
+        elif char in "*%":
+            out += ".*"
+        elif char == "_":
+            out += "."
+        else:
+            out += re.escape(char)
+    return re.compile(out + "$", re.IGNORECASE | re.DOTALL)
+
+
+def compare(actual, op, value):
+    if op == "is":
+        return actual is None if value == "null" else str(actual).lower() == value
+    if actual is None:
+        return False
+    if op in ("like", "ilike"):
+        return bool(like_regex(value).match(str(actual)))
+    if isinstance(actual, int):
+        value = int(value)
+    else:
+        actual = str(actual)
+    return {"eq": actual == value, "gt": actual > value, "gte": actual >= value,
+            "lt": actual < value, "lte": actual <= value}[op]
+
+
+def condition(text):
+    """Predicate for one PostgREST condition: `and(...)`, `or(...)` or `column.op.value`."""
+    for junction, combine in (("and(", all), ("or(", any)):
+        if text.startswith(junction):
+            parts = [condition(part) for part in split_top_level(text[len(junction):-1])]
+            return lambda row: combine(part(row) for part in parts)
+    column, op, value = text.split(".", 2)
+    value = unquote(value)
+    return lambda row: compare(row.get(column), op, value)
+
+
+class FakeTable:
+    """
+    The slice of the Supabase table API the views under test use, over a dict
+    of rows. `stale` rows are what select() returns instead, to stand in for a
+    write that happened between the read and the write.
+    """
+
+    def __init__(self, rows=(), stale=None):
+        self.rows = {row["id"]: dict(row) for row in rows}
+        self.stale = stale
+
+    def select(self, *columns, count=None):
+        return FakeQuery(self, "select")
+
+    def upsert(self, rows, on_conflict="id", ignore_duplicates=False):
+        return FakeQuery(self, "upsert", rows, ignore_duplicates)
+
+    def update(self, fields):
+        return FakeQuery(self, "update", fields)
+
+
+class FakeQuery:
+    def __init__(self, table, action, payload=None, ignore_duplicates=False):
+        self.table, self.action, self.payload = table, action, payload
+        self.ignore_duplicates = ignore_duplicates
+        self.filters = []
+        self.ordering = []
+        self.max_rows = None
+
+    def filter(self, column, op, value):
+        self.filters.append(condition(f"{column}.{op}.{value}"))
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def is_(self, column, value):
+        return self.filter(column, "is", value)
+
+    def lt(self, column, value):
+        return self.filter(column, "lt", value)
+
+    def or_(self, text):
+        self.filters.append(condition(f"or({text})"))
+        return self
+
+    def order(self, column, desc=False, nullsfirst=None):
+        # PostgreSQL's default: NULLs sort as if larger than any value
+        nulls_first = desc if nullsfirst is None else nullsfirst
+        self.ordering.append((column, desc, nulls_first))
+        return self
+
+    def limit(self, count):
+        self.max_rows = count
+        return self
+
+    def sorted(self, rows):
+        for column, desc, nulls_first in reversed(self.ordering):
+            present = sorted((r for r in rows if r.get(column) is not None), key=lambda r: r[column], reverse=desc)
+            missing = [r for r in rows if r.get(column) is None]
+            rows = missing + present if nulls_first else present + missing
+        return rows
+
+    def execute(self):
+        if self.action == "upsert":
+            written = []
+            for row in self.payload:
+                if row["id"] in self.table.rows and self.ignore_duplicates:
+                    continue
+                self.table.rows[row["id"]] = {"deleted_at": None, **row}
+                written.append(row)
+            return SimpleNamespace(data=written)
+
+        source = self.table.stale if self.action == "select" and self.table.stale is not None else self.table.rows
+        matched = [row for row in source.values() if all(f(row) for f in self.filters)]
+        if self.action == "update":
+            for row in matched:
+                row.update(self.payload)
+        count = len(matched)
+        matched = self.sorted(matched)[:self.max_rows]
+        return SimpleNamespace(data=[dict(row) for row in matched], count=count)
+
+
+class NotesBatchTests(SimpleTestCase):
+    USER = "gardener@example.com"
+
+    def note(self, **values):
+        return {"id": str(uuid.uuid4()), "user_id": self.USER, "title": "Basil", "content": "",
+                "created_at": "2026-10-01T00:00:00", "deleted_at": None, **values}
+
+    def run_batch(self, table, operations):
+        request = APIRequestFactory().post("/api/notes/batch/", {"operations": operations}, format="json")
+        with mock.patch.object(views, "supabase", SimpleNamespace(table=lambda name: table)), \
+                mock.patch.object(views, "get_user_id_from_request", return_value=(self.USER, None)):
+            response = views.notes_batch(request)
+        self.assertEqual(response.status_code, 200)
+        return [result["status"] for result in response.data["results"]]
+
+    def test_create_then_update_is_one_create_with_merged_fields(self):
+        table, note_id = FakeTable(), str(uuid.uuid4())
+        statuses = self.run_batch(table, [
+            {"op": "create", "id": note_id, "title": "Basil", "content": "water daily"},
+            {"op": "update", "id": note_id, "content": "water every other day"},
+        ])
+        self.assertEqual(statuses, ["created", "created"])
+        self.assertEqual(table.rows[note_id]["content"], "water every other day")
+
+    def test_create_then_delete_writes_nothing(self):
+        table, note_id = FakeTable(), str(uuid.uuid4())
+        statuses = self.run_batch(table, [
+            {"op": "create", "id": note_id, "title": "Basil"},
+            {"op": "delete", "id": note_id},
+        ])
+        self.assertEqual(statuses, ["deleted", "deleted"])
+        self.assertEqual(table.rows, {})
+
+    def test_replayed_create_keeps_the_following_edits(self):
+        row = self.note(content="old")
+        table = FakeTable([row])
+        statuses = self.run_batch(table, [
+            {"op": "create", "id": row["id"], "title": "Basil", "content": "old"},
+            {"op": "update", "id": row["id"], "content": "new"},
+        ])
+        self.assertEqual(statuses, ["exists", "updated"])
+        self.assertEqual(table.rows[row["id"]]["content"], "new")
+
+    def test_replayed_create_of_a_deleted_note_reports_deleted(self):
+        row = self.note(title="", deleted_at="2026-10-02T00:00:00")
+        table = FakeTable([row])
+        statuses = self.run_batch(table, [
+            {"op": "create", "id": row["id"], "title": "Basil"},
+            {"op": "update", "id": row["id"], "title": "Mint"},
+        ])
+        self.assertEqual(statuses, ["deleted", "deleted"])
+        self.assertEqual(table.rows[row["id"]]["title"], "")
+
+    def test_update_does_not_overwrite_a_concurrent_delete(self):
+        row = self.note()
+        tombstone = {**row, "title": "", "deleted_at": "2026-10-02T00:00:00"}
+        table = FakeTable([tombstone], stale={row["id"]: row})  # read saw the live note
+        statuses = self.run_batch(table, [{"op": "update", "id": row["id"], "title": "Mint"}])
+        self.assertEqual(statuses, ["not_found"])
+        self.assertEqual(table.rows[row["id"]], tombstone)
+
+    def test_invalid_operations_do_not_affect_the_rest(self):
+        row = self.note()
+        other = self.note(user_id="someone@example.com")
+        table, new_id = FakeTable([row, other]), str(uuid.uuid4())
+        statuses = self.run_batch(table, [
+            {"op": "create", "id": new_id, "title": 42},
+            {"op": "update", "id": "not-a-uuid", "title": "Mint"},
+            {"op": "update", "id": other["id"], "title": "Mint"},
+            {"op": "create", "id": row["id"], "title": "Basil"},
+            {"op": "delete", "id": row["id"]},
+            {"op": "update", "id": row["id"], "title": "Mint"},
+        ])
+        self.assertEqual(statuses, ["invalid", "invalid", "forbidden", "deleted", "deleted", "invalid"])
+        self.assertNotIn(new_id, table.rows)
+        self.assertEqual(other["title"], table.rows[other["id"]]["title"])
+        self.assertIsNotNone(table.rows[row["id"]]["deleted_at"])
+
+
+class KeysetCursorTests(SimpleTestCase):
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor("2026-10-01T00:00:00+00:00", "a1")
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor), ["2026-10-01T00:00:00+00:00", "a1"])
+        self.assertEqual(decode_cursor(encode_cursor(None, 7)), [None, 7])
+
+    def test_malformed_cursors_raise_value_error(self):
+        for cursor in ("not base64!", encode_cursor("only one"), encode_cursor(1, 2, 3), "e30"):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def walk(self, rows, column, desc, nulls_last, page_size=2):
+        """Page through `rows` with apply_keyset and return the ids in the order served."""
+        table, served, cursor = FakeTable(rows), [], None
+        while True:
+            query = table.select("*")
+            if cursor:
+                value, last_id = decode_cursor(cursor)
+                query = apply_keyset(query, column, value, last_id, desc=desc, nulls_last=nulls_last)
+            page = query.order(column, desc=desc, nullsfirst=False).order("id", desc=desc).limit(page_size + 1)
+            page = page.execute().data
+            served += [row["id"] for row in page[:page_size]]
+            if len(page) <= page_size:
+                return served
+            cursor = encode_cursor(page[page_size - 1][column], page[page_size - 1]["id"])
+
+    def test_keyset_pages_cover_ties_exactly_once(self):
+        rows = [{"id": i, "name": name} for i, name in enumerate(["b", "a", "b", "c", "b", "a"], 1)]
+        for desc in (False, True):
+            expected = [row["id"] for row in sorted(rows, key=lambda r: (r["name"], r["id"]), reverse=desc)]
+            with self.subTest(desc=desc):
+                self.assertEqual(self.walk(rows, "name", desc, nulls_last=False), expected)
+
+    def test_nulls_last_ties_page_through_the_null_block(self):
+        names = ["b", None, "a", None, "b", None, None, "a"]
+        rows = [{"id": i, "name": name} for i, name in enumerate(names, 1)]
+        for desc in (False, True):
+            named = sorted((r for r in rows if r["name"]), key=lambda r: (r["name"], r["id"]), reverse=desc)
+            nulls = sorted((r for r in rows if not r["name"]), key=lambda r: r["id"], reverse=desc)
+            with self.subTest(desc=desc):
+                # Page boundaries fall inside the null block and on the named -> null edge
+                for page_size in (1, 2, 3):
+                    served = self.walk(rows, "name", desc, nulls_last=True, page_size=page_size)
+                    self.assertEqual(served, [row["id"] for row in named + nulls])
+
+
+class GetUsersSearchTests(SimpleTestCase):
+    ROWS = [
+        {"id": 1, "user_name": "Ana", "user_email": "a_b@example.com", "created_at": "2026-10-01"},
+        {"id": 2, "user_name": "Ben", "user_email": "axb@example.com", "created_at": "2026-10-02"},
+        {"id": 3, "user_name": "50% off", "user_email": "deals@example.com", "created_at": "2026-10-03"},
+        {"id": 4, "user_name": "500 Club", "user_email": "club@example.com", "created_at": "2026-10-04"},
+        {"id": 5, "user_name": "O'Neil, (Jr)", "user_email": "oneil@example.com", "created_at": "2026-10-05"},
+    ]
+
+    def search(self, q):
+        request = APIRequestFactory().get("/api/users/", {"q": q})
+        with mock.patch.object(views, "supabase", SimpleNamespace(table=lambda name: FakeTable(self.ROWS))):
+            response = views.get_users(request)
+        self.assertEqual(response.status_code, 200)
+        return sorted(user["id"] for user in response.data["results"])
+
+    def test_like_wildcards_match_literally(self):
+        self.assertEqual(self.search("a_b"), [1])
+        self.assertEqual(self.search("50%"), [3])
+        self.assertEqual(self.search("50"), [3, 4])
+
+    def test_filter_syntax_characters_are_quoted(self):
+        self.assertEqual(self.search("o'neil, (j"), [5])
+        self.assertEqual(self.search('a"b'), [])
+
+
+class NotesSyncTests(SimpleTestCase):
+    USER = "gardener@example.com"
+    HORIZON = "2026-10-19T12:00:00+00:00"
+
+    def note(self, updated_at, **values):
+        return {"id": str(uuid.uuid4()), "user_id": self.USER, "title": "Basil", "content": "",
+                "updated_at": updated_at, "deleted_at": None, **values}
+
+    def sync(self, table, **params):
+        headers = {"HTTP_IF_NONE_MATCH": params.pop("etag")} if "etag" in params else {}
+        request = APIRequestFactory().get("/api/notes/sync/", params, **headers)
+        rpc = mock.Mock(return_value=SimpleNamespace(execute=lambda: SimpleNamespace(data=self.HORIZON)))
+        client = SimpleNamespace(table=lambda name: table, rpc=rpc)
+        with mock.patch.object(views, "supabase", client), \
+                mock.patch.object(views, "get_user_id_from_request", return_value=(self.USER, None)):
+            response = views.notes_sync(request)
+        rpc.assert_called_once_with("notes_sync_horizon", {"lag_seconds": views.NOTES_SYNC_LAG_SECONDS})
+        return response
+
+    def test_cursor_pages_through_equal_timestamps_once(self):
+        same = "2026-10-19T11:00:00+00:00"
+        rows = [self.note(same) for _ in range(3)] + [
+            self.note("2026-10-19T11:30:00+00:00", deleted_at="2026-10-19T11:30:00+00:00"),
+            self.note("2026-10-19T10:00:00+00:00", user_id="someone@example.com"),
+            self.note("2026-10-19T12:00:01+00:00"),  # past the horizon: next sync
+        ]
+        table, since, seen, deleted = FakeTable(rows), "", [], []
+        while True:
+            body = self.sync(table, limit=2, since=since).data
+            seen += [note["id"] for note in body["notes"]]
+            deleted += [note["id"] for note in body["deleted"]]
+            since = body["next_cursor"]
+            if not body["has_more"]:
+                break
+        self.assertEqual(seen, sorted(row["id"] for row in rows[:3]))
+        self.assertEqual(deleted, [rows[3]["id"]])
+        self.assertEqual(decode_cursor(since), [rows[3]["updated_at"], rows[3]["id"]])
+
+        caught_up = self.sync(table, since=since).data
+        self.assertEqual((caught_up["notes"], caught_up["deleted"]), ([], []))
+        self.assertEqual(caught_up["next_cursor"], since)
+
+    def test_unchanged_window_is_not_modified(self):
+        table = FakeTable([self.note("2026-10-19T11:00:00+00:00")])
+        first = self.sync(table)
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+
+        repeat = self.sync(table, etag=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat["ETag"], etag)
+
+        edited = self.note("2026-10-19T11:10:00+00:00")
+        table.rows[edited["id"]] = edited
+        changed = self.sync(table, etag=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(len(changed.data["notes"]), 2)
+
+
+class RequestMetricsTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(metrics, "registry", metrics.MetricsRegistry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_streaming_response_is_recorded_when_closed(self):
+        def chunks():
+            for n in range(3):
+                time.sleep(0.05)
+                # what the Supabase response hook does for each call
+                metrics._current.get().calls.append(("GET", "/rest/v1/plants", 200, 0.01, 100))
+                yield f"row {n}\n"
+
+        with mock.patch.object(metrics, "instrument_supabase"):
+            middleware = metrics.RequestMetricsMiddleware(lambda request: StreamingHttpResponse(chunks()))
+            response = middleware(APIRequestFactory().get("/api/export/"))
+        self.assertEqual(self.registry.requests, {})
+
+        self.assertEqual(b"".join(response.streaming_content), b"row 0\nrow 1\nrow 2\n")
+        response.close()
+        key = ("<unmatched>", "GET")
+        self.assertEqual(self.registry.requests[(*key, "200")], 1)
+        self.assertEqual(self.registry.supabase_calls[key].sum, 3)
+        self.assertEqual(self.registry.supabase_bytes[key], 300)
+        self.assertGreaterEqual(self.registry.durations[key].sum, 0.15)
+
+    def test_metrics_include_search_history_counters(self):
+        recorder = SearchHistoryRecorder(max_queue=1)
+        with mock.patch.object(recorder, "_ensure_started"):
+            recorder.record("gardener@example.com", "lagundi")
+            recorder.record("gardener@example.com", "sambong")
+        with mock.patch.object(metrics, "search_recorder", recorder), \
+                self.settings(METRICS_TOKEN=""):
+            body = metrics.metrics_view(APIRequestFactory().get("/metrics")).content.decode()
+        self.assertIn('plantpal_search_history_events_total{event="recorded"} 1', body)
+        self.assertIn('plantpal_search_history_events_total{event="dropped"} 1', body)
+        self.assertIn("plantpal_search_history_queued 1", body)
+
+
+def geonames_line(geoname_id, name, population, feature_class="P", ascii_name=None):
+    """One row of a GeoNames country extract (19 tab-separated columns)."""
+    cols = [str(geoname_id), name, ascii_name or name, "", "10.0", "123.0", feature_class, "PPL",
+            "PH", "", "07", "", "", "", str(population), "", "", "Asia/Manila", "2026-01-01"]
+    return "\t".join(cols) + "\n"
+
+
+class GazetteerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.workdir = tempfile.TemporaryDirectory()
+        source = os.path.join(cls.workdir.name, "PH.txt")
+        # More "San ..." places than a forward scan looks at, so "san" gets a
+        # ranked entry; the most populated one sorts last by name
+        cls.busy = gazetteer.SCAN_LIMIT + 50
+        with open(source, "w", encoding="utf-8") as f:
+            f.write(geonames_line(1, "Cebu City", 964169))
+            f.write(geonames_line(2, "Cebu", 2938982, feature_class="A"))
+            f.write(geonames_line(3, "Parañaque", 689992, ascii_name="Paranaque"))
+            f.write(geonames_line(4, "Cebu Strait", 0, feature_class="H"))
+            for n in range(cls.busy):
+                f.write(geonames_line(100 + n, f"San Place {n:03d}", 1000 + n))
+            f.write(geonames_line(99, "San Zulu", 5_000_000))
+        cls.path = os.path.join(cls.workdir.name, "gazetteer.idx")
+        call_command("build_gazetteer", source, admin1="", admin2="", out=cls.path, stdout=io.StringIO())
+        cls.index = gazetteer.Gazetteer(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.index.close()
+        cls.workdir.cleanup()
+        super().tearDownClass()
+
+    def names(self, query, limit=5):
+        return [place["address"]["name"] for place in self.index.search(query, limit)]
+
+    def test_index_header(self):
+        with open(self.path, "rb") as f:
+            magic, count = struct.unpack("<8sI", f.read(12))
+        self.assertEqual(magic, b"PPGAZ02\0")
+        self.assertEqual(count, self.index.count)
+
+    def test_exact_lookup(self):
+        self.assertEqual(self.names("Cebu City"), ["Cebu City"])
+        self.assertEqual(self.names("paranaque"), ["Parañaque"])
+        self.assertEqual(self.names("  PARAÑAQUE "), ["Parañaque"])
+        self.assertEqual(self.names("Cebu Strait"), [])  # only admin areas and populated places
+
+    def test_prefix_lookup_ranks_by_population(self):
+        self.assertEqual(self.names("ceb"), ["Cebu", "Cebu City"])
+        self.assertEqual(self.names("san place 01", limit=3), ["San Place 019", "San Place 018", "San Place 017"])
+        self.assertEqual(self.names("nowhere"), [])
+
+    def test_busy_prefix_is_served_from_its_ranked_entry(self):
+        self.assertIsNotNone(self.index._ranked(b"san"))
+        self.assertIsNone(self.index._ranked(b"ceb"))
+        top = [f"San Place {n:03d}" for n in range(self.busy - 1, self.busy - 5, -1)]
+        self.assertEqual(self.names("san"), ["San Zulu", *top])
+        self.assertEqual(self.names("s", limit=2), ["San Zulu", f"San Place {self.busy - 1:03d}"])
+
+    def test_ranked_marker_in_the_query_is_ignored(self):
+        self.assertEqual(self.names("\x01san", limit=1), ["San Zulu"])
+
+
+class SearchPlantsHistoryTests(SimpleTestCase):
+    USER = "gardener@example.com"
+
+    def search(self, tables, **headers):
+        request = APIRequestFactory().get("/api/search_plants/", {"q": "lagundi"}, **headers)
+        client = SimpleNamespace(table=lambda name: tables[name])
+        with mock.patch.object(views, "supabase", client), \
+                mock.patch.object(views, "get_user_id_from_request", return_value=(self.USER, None)), \
+                mock.patch.object(views, "search_recorder") as recorder, \
+                mock.patch.object(views, "trending") as trending:
+            response = views.search_plants(request)
+        return response, recorder, trending
+
+    def test_successful_search_is_recorded_for_the_token_user(self):
+        tables = {
+            "plants": FakeTable([{"id": 1, "plant_name": "Lagundi", "scientific_name": "Vitex negundo"}]),
+            "plant_images": FakeTable(),
+            "plant_ailments": FakeTable(),
+        }
+        response, recorder, trending = self.search(tables, HTTP_AUTHORIZATION="Bearer token")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([plant["plant_name"] for plant in response.data], ["Lagundi"])
+        recorder.record.assert_called_once_with(self.USER, "lagundi")
+        trending.record.assert_called_once_with("lagundi")
+
+    def test_failed_search_is_not_recorded(self):
+        broken = mock.Mock()
+        broken.select.side_effect = RuntimeError("supabase down")
+        response, recorder, trending = self.search({"plants": broken}, HTTP_AUTHORIZATION="Bearer token")
+        self.assertEqual(response.status_code, 500)
+        recorder.record.assert_not_called()
+        trending.record.assert_not_called()
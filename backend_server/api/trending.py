@@ -0,0 +1,289 @@
+"""
+In-memory popular-searches / trending-plants aggregation.
+
+Each tracker counts keys over a sliding time window split into buckets; every
+bucket is a count-min sketch, so memory is fixed no matter how many distinct
+keys arrive. A bounded set of heavy-hitter candidates (kept with a lazy
+min-heap) holds the current top keys, and a ranked snapshot of them is cached
+so reads are a slice. Counts are per worker process.
+
+Search queries are recorded by search_plants. Scans are recorded by the
+scan_plant view, but the mobile app scans through the separate FastAPI
+service (api/scan_plant.py), which only writes a row to the plants table. A
+background thread tails new scan rows every TRENDING_PLANT_REFRESH seconds and
+feeds them to the plant trackers (skipping scans this process already
+recorded); requests never wait on it and always read the in-memory ranking.
+"""
+import hashlib
+import heapq
+import threading
+import time
+import traceback
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from supabaseclient import supabase
+
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        for row, i in zip(self.rows, self._indexes(key)):
+            row[i] += count
+
+    def estimate(self, key):
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+
+    def clear(self):
+        for row in self.rows:
+            for i in range(self.width):
+                row[i] = 0
+
+
+class TrendingTracker:
+    """Approximate top-k counts of keys seen within the last `window` seconds."""
+
+    def __init__(self, window=3600, buckets=12, capacity=200, width=2048, depth=4):
+        self.bucket_span = window / buckets
+        self.capacity = capacity
+        self._sketches = [CountMinSketch(width, depth) for _ in range(buckets)]
+        self._bucket_ids = [None] * buckets
+        self._current = None
+        self._candidates = {}   # key -> estimated count
+        self._heap = []         # (count, key); entries may be stale
+        self._ranked = None     # candidates sorted by count, rebuilt lazily after changes
+        self._lock = threading.Lock()
+
+    def _rotate(self, now):
+        bucket_id = int(now // self.bucket_span)
+        if self._current is not None and bucket_id <= self._current:
+            return  # same bucket, or an older timestamp (backfilled scans)
+        slot = bucket_id % len(self._sketches)
+        if self._bucket_ids[slot] != bucket_id:
+            self._sketches[slot].clear()
+            self._bucket_ids[slot] = bucket_id
+        self._current = bucket_id
+
+        # Old buckets fell out of the window: re-estimate every candidate
+        oldest = bucket_id - len(self._sketches) + 1
+        for i, bid in enumerate(self._bucket_ids):
+            if bid is not None and bid < oldest:
+                self._sketches[i].clear()
+                self._bucket_ids[i] = None
+        self._candidates = {key: self._estimate(key) for key in self._candidates}
+        self._candidates = {key: count for key, count in self._candidates.items() if count > 0}
+        self._heap = [(count, key) for key, count in self._candidates.items()]
+        heapq.heapify(self._heap)
+        self._ranked = None
+
+    def _estimate(self, key):
+        return sum(
+            sketch.estimate(key)
+            for sketch, bid in zip(self._sketches, self._bucket_ids)
+            if bid is not None
+        )
+
+    def _pop_min(self):
+        """Smallest live candidate (skipping stale heap entries)."""
+        while self._heap:
+            count, key = self._heap[0]
+            if self._candidates.get(key) == count:
+                return count, key
+            heapq.heappop(self._heap)
+        return None
+
+    def add(self, key, count=1, now=None):
+        """Count `key` at time `now` (default: now); timestamps older than the window are ignored."""
+        with self._lock:
+            now = time.time() if now is None else now
+            self._rotate(now)
+            bucket_id = min(int(now // self.bucket_span), self._current)
+            if bucket_id <= self._current - len(self._sketches):
+                return
+            slot = bucket_id % len(self._sketches)
+            if self._bucket_ids[slot] != bucket_id:  # unused slot (backfill into an older bucket)
+                self._sketches[slot].clear()
+                self._bucket_ids[slot] = bucket_id
+            self._sketches[slot].add(key, count)
+            estimate = self._estimate(key)
+
+            if key not in self._candidates and len(self._candidates) >= self.capacity:
+                smallest = self._pop_min()
+                if smallest and smallest[0] >= estimate:
+                    return
+                if smallest:
+                    heapq.heappop(self._heap)
+                    del self._candidates[smallest[1]]
+
+            self._candidates[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+            self._ranked = None
+
+            # Stale entries accumulate with every update; rebuild before they dominate
+            if len(self._heap) > 4 * self.capacity:
+                self._heap = [(c, k) for k, c in self._candidates.items()]
+                heapq.heapify(self._heap)
+
+    def top(self, k=10, now=None):
+        """
+        The k highest counts. O(k) while nothing changed since the last read;
+        the first read after an update re-sorts the (at most `capacity`)
+        candidates once.
+        """
+        with self._lock:
+            self._rotate(time.time() if now is None else now)
+            if self._ranked is None:
+                self._ranked = sorted(self._candidates.items(), key=lambda item: item[1], reverse=True)
+            return self._ranked[:k]
+
+
+TRENDING_WINDOWS = {"1h": 3600, "24h": 24 * 3600}
+TRENDING_KINDS = ("query", "plant")
+
+
+class ScanFeed:
+    """
+    Tails scan rows (plants rows with a scanned_at) written by other services
+    and passes (plant_name, timestamp) to `on_scan`. Runs on a daemon thread;
+    the first pass backfills the last `backfill` seconds. Rows are re-read
+    `overlap` seconds back because scanned_at comes from the client and can
+    arrive late; ids already seen are skipped.
+    """
+
+    PAGE_SIZE = 1000  # PostgREST's default max rows per request
+
+    def __init__(self, on_scan, interval=60, backfill=24 * 3600, overlap=300):
+        self.on_scan = on_scan
+        self.interval = interval
+        self.backfill = backfill
+        self.overlap = overlap
+        self._seen = OrderedDict()  # scan id -> scanned_at (epoch), oldest first
+        self._cursor = None         # newest scanned_at seen (epoch)
+        self._started = False
+        self._lock = threading.Lock()
+
+    def skip(self, scan_id):
+        """Mark a scan this process already counted."""
+        with self._lock:
+            self._seen[str(scan_id)] = time.time()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="plantpal-scan-feed", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                print("⚠️ Failed to read new scans for trending:", traceback.format_exc())
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _epoch(value):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return time.time()
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)  # naive values are written with utcnow()
+        return parsed.timestamp()
+
+    def poll(self):
+        """Read scans since the cursor (minus the overlap) and feed the unseen ones."""
+        floor = (self._cursor - self.overlap) if self._cursor else time.time() - self.backfill
+        since = datetime.fromtimestamp(floor, timezone.utc).isoformat()
+        start = 0
+        while True:
+            rows = (
+                supabase.table("plants")
+                .select("id, plant_name, scanned_at")
+                .gte("scanned_at", since)
+                .not_.like("plant_name", "Unknown%")
+                .order("scanned_at")
+                .order("id")
+                .range(start, start + self.PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            for row in rows:
+                scan_id = str(row["id"])
+                stamped = self._epoch(row["scanned_at"])
+                at = min(stamped, time.time())  # future client clocks count as now
+                with self._lock:
+                    if scan_id in self._seen:
+                        continue
+                    self._seen[scan_id] = stamped
+                if row.get("plant_name"):
+                    self.on_scan(row["plant_name"], at)
+                self._cursor = max(self._cursor or at, at)
+            if len(rows) < self.PAGE_SIZE:
+                break
+            start += self.PAGE_SIZE
+
+        # Ids older than the re-read window can't come back; forget them
+        with self._lock:
+            horizon = (self._cursor or time.time()) - self.overlap
+            for scan_id in [i for i, at in self._seen.items() if at < horizon]:
+                del self._seen[scan_id]
+
+
+class TrendingEngine:
+    def __init__(self, capacity=200, plant_refresh=60):
+        self.trackers = {
+            kind: {
+                name: TrendingTracker(window=seconds, buckets=12, capacity=capacity)
+                for name, seconds in TRENDING_WINDOWS.items()
+            }
+            for kind in TRENDING_KINDS
+        }
+        self.scans = ScanFeed(self._add_plant, interval=plant_refresh,
+                              backfill=max(TRENDING_WINDOWS.values()))
+
+    @staticmethod
+    def normalize(key):
+        return " ".join(key.casefold().split())
+
+    def record(self, key):
+        """Count one search query."""
+        key = self.normalize(key or "")
+        if not key:
+            return
+        for tracker in self.trackers["query"].values():
+            tracker.add(key)
+
+    def _add_plant(self, plant_name, now=None):
+        for tracker in self.trackers["plant"].values():
+            tracker.add(plant_name, now=now)
+
+    def record_scan(self, plant_name, scan_id=None):
+        """Count one scan made in this process. "Unknown" results are not plants."""
+        if not plant_name or plant_name.startswith("Unknown"):
+            return
+        if scan_id is not None:
+            self.scans.skip(scan_id)  # the feed will see its row too
+        self._add_plant(plant_name)
+
+    def top(self, kind, window="24h", k=10):
+        if kind == "plant":
+            self.scans.start()
+        ranked = self.trackers[kind][window].top(k)
+        return [{"key": key, "count": count} for key, count in ranked]
+
+
+trending = TrendingEngine(plant_refresh=settings.TRENDING_PLANT_REFRESH)
@@ -18,6 +18,7 @@ urlpatterns = [
     path("search_plants/", views.search_plants, name="search_plants"),
     # path("predict_plant/", views.predict_plant, name="predict_plant"),
     path("get_search_history/", views.get_search_history, name="get_search_history"),  
+    path("trending/", views.trending_searches, name="trending_searches"),
     path("update_plant/<uuid:plant_id>/", views.update_plant, name="update_plant"),
     path("delete_plant/<uuid:plant_id>/", views.delete_plant, name="delete_plant"),
 
@@ -26,13 +27,22 @@ urlpatterns = [
     path("get_terms_conditions/", views.get_terms_conditions, name="get_terms_conditions"),
     path("update-admin-profile/", views.update_admin_profile, name='update-admin-profile'),
     path("get_latest_terms_conditions/", views.get_latest_terms_conditions, name="get_latest_terms_conditions"),
+    path("get_terms_version/", views.get_terms_version, name="get_terms_version"),
+    path("accept_terms_conditions/", views.accept_terms_conditions, name="accept_terms_conditions"),
+    path("check_terms_acceptance/", views.check_terms_acceptance, name="check_terms_acceptance"),
+    path("terms_acceptance/", views.terms_acceptance, name="terms_acceptance"),
 
     #User Managemen Admin  
     path("get_users/", views.get_users, name="get_users"),
     path("delete_user/<str:user_id>/", views.delete_user, name="delete_user"),
+    path("users/bulk_delete/", views.bulk_delete_users, name="bulk_delete_users"),
+    path("users/bulk_delete/<uuid:job_id>/", views.bulk_delete_status, name="bulk_delete_status"),
+    path("export/<str:dataset>/", views.export_data, name="export_data"),
 
     #Journal Notes Endpoints
     path("notes/", views.notes_list_create, name="notes_list_create"),  
+    path("notes/sync/", views.notes_sync, name="notes_sync"),
+    path("notes/batch/", views.notes_batch, name="notes_batch"),
     path("notes/<uuid:note_id>/", views.note_detail, name="note_detail"),
     
     
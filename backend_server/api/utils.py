@@ -29,3 +29,62 @@ def verify_jwt_token(request):
         return None, Response({"error": "Token has expired"}, status=status.HTTP_401_UNAUTHORIZED)
     except jwt.InvalidTokenError:
         return None, Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+
+def etag_matches(request, etag: str) -> bool:
+    """True if the request's If-None-Match header already covers `etag`."""
+    header = request.headers.get("If-None-Match", "")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as the spec asks for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+# --------------------------------------------------------------------
+# Keyset pagination helpers
+# --------------------------------------------------------------------
+def encode_cursor(*values) -> str:
+    """Opaque, URL-safe cursor for the (sort value, id) of the last row on a page."""
+    import base64, json
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int = 2) -> list:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    import base64, binascii, json
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Malformed cursor")
+    return values
+
+def quote_filter_value(value) -> str:
+    return '"%s"' % str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def like_prefix_pattern(text: str) -> str:
+    """
+    Quoted PostgREST (i)like value matching strings that start with `text`.
+    LIKE wildcards in `text` are escaped so they match literally; `*` is
+    dropped, since PostgREST always reads it as a wildcard.
+    """
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "")
+    return quote_filter_value(escaped + "*")
+
+def apply_keyset(query, column, value, last_id, desc=False, nulls_last=False):
+    """
+    Restrict a PostgREST query to rows after (value, last_id) in
+    `ORDER BY column, id` (both descending when desc=True).
+    For a nullable column pass nulls_last=True and order with
+    nullsfirst=False: NULLs then form the final block, ordered by id.
+    """
+    op = "lt" if desc else "gt"
+    if nulls_last and value is None:
+        return query.is_(column, "null").filter("id", op, str(last_id))
+    value, last_id = quote_filter_value(value), quote_filter_value(last_id)
+    after = f"{column}.{op}.{value},and({column}.eq.{value},id.{op}.{last_id})"
+    if nulls_last:
+        after += f",{column}.is.null"
+    return query.or_(after)
@@ -14,26 +14,33 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 
 # Utilities
-from .utils import hash_password_sha256, verify_jwt_token
+from .utils import (
+    hash_password_sha256, verify_jwt_token, etag_matches,
+    encode_cursor, decode_cursor, apply_keyset, quote_filter_value, like_prefix_pattern,
+)
+from .geocoding import get_geocoder, GeocodingError, RateLimited
+from .gazetteer import get_gazetteer
+from .cache import TTLCache
+from .acceptance import acceptance_index
+from .exports import EXPORT_CONTENT_TYPES, iter_rows, streaming_export
+from .jobs import jobs
+from .bulk_delete import BULK_DELETE_MAX_USERS, delete_users, total_steps
+from .search_history import search_recorder
+from .trending import trending, TRENDING_KINDS, TRENDING_WINDOWS
 
 # External / other libraries
 from supabaseclient import supabase
-import requests
 import traceback
 import random
 import uuid
+import hashlib
 from datetime import datetime, timedelta
+import base64
+import io
 
-import os
-os.environ["CUDA_VISIBLE_DEVICES"] = ""  # Disable GPU
-import torch
-
-
-
-"""import base64
-import ioa
-from PIL import Image
-from torchvision import transforms"""
+# NOTE: the ML stack (torch, torchvision, PIL) is only imported inside
+# scan_plant via backend.plant_model, so workers that never classify an
+# image don't pay for it at startup.
 
 
 # --------------------------------------------------------------------
@@ -45,22 +52,18 @@ def search_address(request):
     if not query:
         return Response({"error": "Missing query"}, status=400)
 
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {
-        "q": query,
-        "format": "json",
-        "addressdetails": 1,
-        "limit": 5,
-    }
-    headers = {
-        "User-Agent": "PlantPal/1.0 (barulotrishaanne@gmail.com)"
-    }
+    # Local index first; only misses go out to Nominatim
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        places = gazetteer.search(query)
+        if places:
+            return Response(places)
 
     try:
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        return Response(response.json())
-    except requests.exceptions.RequestException as e:
+        return Response(get_geocoder().search(query))
+    except RateLimited as e:
+        return Response({"error": str(e)}, status=429, headers={"Retry-After": "1"})
+    except GeocodingError as e:
         return Response({"error": str(e)}, status=500)
 
 # --------------------------------------------------------------------
@@ -237,6 +240,25 @@ def create_profile(request):
 # --------------------------------------------------------------------
 # Fetch profile
 # --------------------------------------------------------------------
+# email -> (user_id, response body); update_profile and user deletion invalidate entries
+_profile_cache = TTLCache(maxsize=4096, ttl=settings.PROFILE_CACHE_TTL)
+
+
+def forget_profiles(emails):
+    """Drop cached profiles of deleted users (the cache is keyed by email)."""
+    for email in emails:
+        if email:
+            _profile_cache.delete(email.lower())
+
+
+def embedded_profile(user_row):
+    """profiles(...) embeds come back as an object or a one-item list."""
+    profile = user_row.get("profiles")
+    if isinstance(profile, list):
+        profile = profile[0] if profile else None
+    return profile or {}
+
+
 @api_view(['GET'])
 def profile(request):
     try:
@@ -245,39 +267,32 @@ def profile(request):
             return Response({"error": "Email required"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # --- Get user ---
+        cached = _profile_cache.get(email)
+        if cached is not None:
+            return Response(cached[1], status=status.HTTP_200_OK)
+
+        # --- User and optional profile in one embedded select ---
         user = (
             supabase.table("users")
-            .select("id, user_email, user_name")
+            .select("id, user_email, user_name, profiles(city, interests, avatar_url, is_premium)")
             .eq("user_email", email)
-            .single()
+            .maybe_single()
             .execute()
         )
 
-        if not user.data:
+        # ✅ Guard against None
+        if not user or not user.data:
             return Response({"error": "User not found"},
                             status=status.HTTP_404_NOT_FOUND)
 
-        # --- Get optional profile ---
-        profile_result = (
-            supabase.table("profiles")
-            .select("city, interests, avatar_url, is_premium")
-            .eq("user_id", user.data["id"])
-            .maybe_single()
-            .execute()
-        )
-
-        # ✅ Guard against None
-        profile_data = profile_result.data if profile_result and profile_result.data else {}
+        body = {
+            "email": user.data["user_email"],
+            "username": user.data["user_name"],
+            "profile": embedded_profile(user.data)
+        }
+        _profile_cache.set(email, (user.data["id"], body))
 
-        return Response(
-            {
-                "email": user.data["user_email"],
-                "username": user.data["user_name"],
-                "profile": profile_data
-            },
-            status=status.HTTP_200_OK
-        )
+        return Response(body, status=status.HTTP_200_OK)
 
     except Exception as e:
         print(traceback.format_exc())
@@ -301,32 +316,47 @@ def update_profile(request):
         if not email:
             return Response({"error": "Email required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # --- find user id ---
-        user = (
-            supabase.table("users")
-            .select("id")
-            .eq("user_email", email)
-            .single()
-            .execute()
-        )
-        if not user.data:
-            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        user_id = user.data["id"]
-
-        # --- update username in users table if requested ---
+        new_username = None
         if "user_name" in updates:
-            new_username = updates.pop("user_name").strip()
-            taken = (
+            new_username = updates.pop("user_name")
+            if not isinstance(new_username, str) or not new_username.strip():
+                return Response({"error": "user_name cannot be empty"}, status=status.HTTP_400_BAD_REQUEST)
+            new_username = new_username.strip()
+        cached = _profile_cache.get(email)
+        user_id = cached[0] if cached else None
+
+        # --- find user id and check the new username in one query ---
+        if new_username:
+            rows = (
                 supabase.table("users")
-                .select("id")
-                .eq("user_name", new_username)
+                .select("id, user_email, user_name")
+                .or_(f"user_email.eq.{quote_filter_value(email)},"
+                     f"user_name.eq.{quote_filter_value(new_username)}")
                 .execute()
-            )
-            if taken.data:
+            ).data or []
+            me = next((row for row in rows if row["user_email"] == email), None)
+            if not me:
+                return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+            user_id = me["id"]
+            if any(row["user_name"] == new_username and row["id"] != user_id for row in rows):
                 return Response({"error": "Username already taken"},
                                 status=status.HTTP_400_BAD_REQUEST)
+        elif user_id is None:
+            user = (
+                supabase.table("users")
+                .select("id")
+                .eq("user_email", email)
+                .maybe_single()
+                .execute()
+            )
+            if not user or not user.data:
+                return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+            user_id = user.data["id"]
+
+        # --- update username in users table if requested ---
+        if new_username:
             supabase.table("users").update({"user_name": new_username}).eq("id", user_id).execute()
+            updates["user_name"] = new_username  # profiles keeps a copy (see signup)
 
         # --- upsert profile row ---
         if updates:
@@ -336,7 +366,9 @@ def update_profile(request):
             supabase.table("profiles").upsert({
                 "user_id": user_id,
                 **updates
-            }, on_conflict=["user_id"]).execute()
+            }, on_conflict="user_id").execute()
+
+        _profile_cache.delete(email)
 
         return Response(
             {"message": "Profile updated successfully!", "updates": updates},
@@ -716,36 +748,72 @@ def search_plants(request):
             plant["image"] = plant["images"][0] if plant["images"] else None
 
             ailments_resp = (
-            supabase.table("plant_ailments")
-            .select("*")
-            .eq("plant_id", plant_id)
-            .execute()
-        )
+                supabase.table("plant_ailments")
+                .select("*")
+                .eq("plant_id", plant_id)
+                .execute()
+            )
 
-        ailments_resp = (
-            supabase.table("plant_ailments")
-            .select("*")
-            .eq("plant_id", plant_id)
-            .execute()
-        )
+            ailments = ailments_resp.data or []
+
+            ailments_by_disease = {}
+            for ailment in ailments:
+                disease_type = ailment.get("disease_type", "Other")
+                ailments_by_disease.setdefault(disease_type, []).append({
+                    "ailment": ailment.get("ailment"),
+                    "herbalBenefit": ailment.get("herbal_benefit"),
+                })
 
-        ailments = ailments_resp.data or []
+            plant["ailments"] = ailments_by_disease
 
-        ailments_by_disease = {}
-        for ailment in ailments:
-            disease_type = ailment.get("disease_type", "Other")
-            ailments_by_disease.setdefault(disease_type, []).append({
-                "ailment": ailment.get("ailment"),
-                "herbalBenefit": ailment.get("herbal_benefit"),
-            })
+        # Only searches that succeeded count. Queue the search for
+        # search_history (flushed in bulk off the request path); the user comes
+        # from the JWT the app sends, or an explicit email param
+        email = request.GET.get("email", "").strip().lower()
+        if not email and request.headers.get("Authorization", "").startswith("Bearer "):
+            email, _ = get_user_id_from_request(request)
+        search_recorder.record(email, query)
+        trending.record(query)
 
-        plant["ailments"] = ailments_by_disease
+        return Response(plants, status=200)
 
     except Exception as e:
         print("❌ Error in search_plants:", traceback.format_exc())
         return Response({"error": str(e)}, status=500)
 
 
+# =====================================================================
+# ✅ TRENDING SEARCHES / PLANTS (answered from memory)
+# =====================================================================
+@api_view(["GET"])
+def trending_searches(request):
+    """
+    Popular search queries (kind=query) or most scanned plants (kind=plant)
+    over the last hour or day (window=1h|24h), top k (default 10, max 50).
+    """
+    try:
+        kind = request.GET.get("kind", "query")
+        window = request.GET.get("window", "24h")
+        if kind not in TRENDING_KINDS:
+            return Response({"error": f"kind must be one of {list(TRENDING_KINDS)}"}, status=400)
+        if window not in TRENDING_WINDOWS:
+            return Response({"error": f"window must be one of {list(TRENDING_WINDOWS)}"}, status=400)
+        try:
+            k = max(1, min(int(request.GET.get("k", 10)), 50))
+        except ValueError:
+            return Response({"error": "k must be an integer"}, status=400)
+
+        return Response({
+            "kind": kind,
+            "window": window,
+            "results": trending.top(kind, window=window, k=k),
+        }, status=200)
+
+    except Exception as e:
+        print("⚠️ Error in trending_searches:", traceback.format_exc())
+        return Response({"error": str(e)}, status=500)
+
+
 # =====================================================================
 # ✅ GET SEARCH HISTORY (from Supabase, by user email)
 # =====================================================================
@@ -957,6 +1025,7 @@ def add_terms_conditions(request):
             })
             .execute()
         )
+        _terms_cache.clear()
 
         return Response({
             "message": "New terms and conditions version added successfully!",
@@ -982,27 +1051,20 @@ def accept_terms_conditions(request):
             return Response({"error": "user_id and terms_id are required"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if already accepted
-        existing = (
-            supabase.table("user_acceptance")
-            .select("*")
-            .eq("user_id", user_id)
-            .eq("terms_id", terms_id)
-            .execute()
-        )
-        if existing.data:
-            return Response({"message": "User already accepted this version."},
-                            status=status.HTTP_200_OK)
-
-        # Insert new acceptance record
+        # Idempotent insert: a duplicate (user_id, terms_id) is ignored and returns no row
         acceptance = (
             supabase.table("user_acceptance")
-            .insert({
+            .upsert({
                 "user_id": user_id,
                 "terms_id": terms_id
-            })
+            }, on_conflict="user_id,terms_id", ignore_duplicates=True)
             .execute()
         )
+        acceptance_index.record(terms_id, user_id)
+
+        if not acceptance.data:
+            return Response({"message": "User already accepted this version."},
+                            status=status.HTTP_200_OK)
 
         return Response({
             "message": "Terms and Conditions accepted successfully!",
@@ -1014,6 +1076,121 @@ def accept_terms_conditions(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
 
+# ✅ Bulk acceptance check (e.g. before showing the terms screen to many users)
+@api_view(['POST'])
+def check_terms_acceptance(request):
+    """
+    Admin. Body: {"user_ids": [...], "terms_id": optional, defaults to the active version}
+    Returns {"terms_id": ..., "accepted": {user_id: bool}} from the acceptance index.
+    """
+    try:
+        admin_id, err = get_admin_id_from_request(request)
+        if err:
+            return err
+
+        user_ids = request.data.get("user_ids")
+        if not isinstance(user_ids, list) or not user_ids:
+            return Response({"error": "user_ids must be a non-empty list"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        terms_id = request.data.get("terms_id") or get_active_terms().get("id")
+        if not terms_id:
+            return Response({"error": "No active terms found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "terms_id": terms_id,
+            "accepted": acceptance_index.check(terms_id, user_ids),
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        print(traceback.format_exc())
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ✅ Who has / hasn't accepted a version (for admin compliance reports)
+TERMS_ACCEPTANCE_PAGE_SIZE = 50
+TERMS_ACCEPTANCE_MAX_PAGE_SIZE = 500
+# status=pending reads at most this many pages of users per request; when
+# nearly everyone has accepted, the caller continues from next_cursor.
+TERMS_ACCEPTANCE_MAX_SCAN_PAGES = 5
+
+
+@api_view(['GET'])
+def terms_acceptance(request):
+    """
+    Admin: page through users that accepted (status=accepted) or have not yet
+    accepted (status=pending) a terms version, in user id order.
+    Query params: terms_id (defaults to active), status, after (cursor), limit.
+    A pending page may hold fewer than `limit` users while next_cursor is set.
+    """
+    try:
+        admin_id, err = get_admin_id_from_request(request)
+        if err:
+            return err
+
+        terms_id = request.GET.get("terms_id") or get_active_terms().get("id")
+        if not terms_id:
+            return Response({"error": "No active terms found"}, status=status.HTTP_404_NOT_FOUND)
+
+        acceptance_status = request.GET.get("status", "accepted")
+        if acceptance_status not in ("accepted", "pending"):
+            return Response({"error": "status must be accepted or pending"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(int(request.GET.get("limit", TERMS_ACCEPTANCE_PAGE_SIZE)), TERMS_ACCEPTANCE_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "limit must be a positive integer"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        after = request.GET.get("after") or None
+
+        if acceptance_status == "accepted":
+            page_ids, next_cursor = acceptance_index.accepted_page(terms_id, after=after, limit=limit)
+            users = []
+            if page_ids:
+                users = (
+                    supabase.table("users")
+                    .select("id, user_name, user_email")
+                    .in_("id", page_ids)
+                    .order("id")
+                    .execute()
+                ).data or []
+        else:
+            # Walk users in id order and keep those missing from the index
+            users, cursor, more, pages = [], after, True, 0
+            while more and len(users) < limit and pages < TERMS_ACCEPTANCE_MAX_SCAN_PAGES:
+                pages += 1
+                query = supabase.table("users").select("id, user_name, user_email").order("id")
+                if cursor:
+                    query = query.gt("id", cursor)
+                rows = query.limit(limit).execute().data or []
+                more = len(rows) == limit
+
+                accepted = acceptance_index.check(terms_id, [row["id"] for row in rows])
+                for i, row in enumerate(rows):
+                    cursor = row["id"]
+                    if not accepted[str(row["id"])]:
+                        users.append(row)
+                        if len(users) == limit:
+                            more = more or i < len(rows) - 1
+                            break
+            next_cursor = cursor if more else None
+
+        return Response({
+            "terms_id": terms_id,
+            "status": acceptance_status,
+            "accepted_count": acceptance_index.count(terms_id),
+            "results": users,
+            "next_cursor": next_cursor,
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        print(traceback.format_exc())
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # ✅ Get all Terms & Conditions versions (for admin dashboard)
 @api_view(['GET'])
 def get_terms_conditions(request):
@@ -1110,37 +1287,17 @@ def scan_plant(request):
         if not image_base64:
             return Response({"error": "No image provided"}, status=400)
         
+        from PIL import Image
+        from backend.plant_model import predict, PLANT_NAMES  # loads torch on first scan
+
         image_data = base64.b64decode(image_base64)
         image = Image.open(io.BytesIO(image_data)).convert("RGB")
+
+        # 3️⃣ Predict (model is loaded once per process and cached)
+        class_id = predict(image)
+        plant_name = PLANT_NAMES[class_id] if class_id < len(PLANT_NAMES) else "Unknown"
         
-        # 3️⃣ Preprocess image
-        transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                 std=[0.229, 0.224, 0.225]),
-        ])
-        input_tensor = transform(image).unsqueeze(0)  # batch of 1
-        
-        # 4️⃣ Load model
-        model = torch.load("models/plant_classifier.pth", map_location=torch.device("cpu"))
-        model.eval()
-        
-        # 5️⃣ Predict
-        with torch.no_grad():
-            outputs = model(input_tensor)
-            _, predicted = torch.max(outputs, 1)
-        
-        # You need a mapping from class index to plant name
-        class_to_name = {
-            0: "Tarragon",
-            1: "Peppermint",
-            2: "Chocomint",
-            # add all classes here...
-        }
-        plant_name = class_to_name.get(predicted.item(), "Unknown")
-        
-        # 6️⃣ Insert into Supabase
+        # 4️⃣ Insert into Supabase
         scan_data = {
             "plant_name": plant_name,
             "user_id": str(user_id),
@@ -1148,6 +1305,7 @@ def scan_plant(request):
         }
         inserted = supabase.table("plants").insert(scan_data).execute()
         plant_id = inserted.data[0]["id"] if inserted.data else None
+        trending.record_scan(plant_name, plant_id)
         
         return Response({"plant_id": plant_id, "plant_name": plant_name}, status=201)
     
@@ -1157,47 +1315,95 @@ def scan_plant(request):
 
 
 
+USERS_PAGE_SIZE = 50
+USERS_MAX_PAGE_SIZE = 200
+USERS_SORT_FIELDS = {"created_at", "user_name", "user_email"}
+
+
+def format_user(u):
+    """Projection used by the admin user table. Maps profiles.city → address."""
+    profile = embedded_profile(u)
+
+    return {
+        "id": u.get("id"),
+        "full_name": u.get("user_name", "Unknown"),
+        "email": u.get("user_email", ""),
+        "date_joined": u.get("created_at", ""),
+        # 👇 map city → address
+        "address": profile.get("city"),
+    }
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def get_users(request):
     """
-    Fetch all registered users.
-    Maps profiles.city → address for frontend.
+    Fetch one page of registered users.
+    Query params:
+      limit   page size (default 50, max 200)
+      cursor  next_cursor from the previous page
+      q       prefix match on email or username
+      city    exact profile city
+      sort    created_at | user_name | user_email, prefix with - for descending
+              (default -created_at)
+      count   "true" to include the total number of matching users
     """
     try:
-        print("Fetching users from Supabase...")
-
-        response = supabase.table("users").select(
-            """
-            id,
-            user_name,
-            user_email,
-            created_at,
-            profiles (
-                city
-            )
-            """
-        ).execute()
-
-        users = response.data
-
-        if not users:
-            return Response([], status=200)
+        params = request.GET
+        try:
+            limit = min(int(params.get("limit", USERS_PAGE_SIZE)), USERS_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "limit must be a positive integer"}, status=400)
+
+        sort = params.get("sort", "-created_at")
+        desc = sort.startswith("-")
+        sort_field = sort.lstrip("-")
+        if sort_field not in USERS_SORT_FIELDS:
+            return Response({"error": f"sort must be one of {sorted(USERS_SORT_FIELDS)}"}, status=400)
+
+        city = params.get("city", "").strip()
+        # Only inner-join profiles when filtering on them
+        profiles_embed = "profiles!inner(city)" if city else "profiles(city)"
+        columns = f"id, user_name, user_email, created_at, {profiles_embed}"
+        with_count = params.get("count", "").lower() in ("1", "true", "yes")
+
+        query = supabase.table("users").select(columns, count="exact" if with_count else None)
+
+        q = params.get("q", "").strip().lower()
+        if q:
+            pattern = like_prefix_pattern(q)
+            query = query.or_(f"user_email.ilike.{pattern},user_name.ilike.{pattern}")
+        if city:
+            query = query.eq("profiles.city", city)
+
+        cursor = params.get("cursor", "").strip()
+        if cursor:
+            try:
+                last_value, last_id = decode_cursor(cursor)
+            except ValueError:
+                return Response({"error": "Invalid cursor"}, status=400)
+            query = apply_keyset(query, sort_field, last_value, last_id, desc=desc, nulls_last=True)
 
-        formatted_users = []
-        for u in users:
-            profile = u.get("profiles")
+        response = (
+            query.order(sort_field, desc=desc, nullsfirst=False)  # users without a name come last
+            .order("id", desc=desc)
+            .limit(limit + 1)
+            .execute()
+        )
+        rows = response.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
-            formatted_users.append({
-                "id": u.get("id"),
-                "full_name": u.get("user_name", "Unknown"),
-                "email": u.get("user_email", ""),
-                "date_joined": u.get("created_at", ""),
-                # 👇 map city → address
-                "address": profile.get("city") if profile else None,
-            })
+        body = {
+            "results": [format_user(u) for u in rows],
+            "next_cursor": encode_cursor(rows[-1][sort_field], rows[-1]["id"]) if has_more else None,
+        }
+        if with_count:
+            body["count"] = response.count
 
-        return Response(formatted_users, status=200)
+        return Response(body, status=200)
 
     except Exception as e:
         import traceback
@@ -1208,6 +1414,89 @@ def get_users(request):
         )
 
 
+# --------------------------------------------------------------------
+# Helper: decode admin JWT and get admin_id
+# --------------------------------------------------------------------
+def get_admin_id_from_request(request):
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None, Response({"error": "No valid authorization header"}, status=401)
+    token_string = auth_header.split(" ")[1]
+    try:
+        access_token = AccessToken(token_string)
+        admin_id = access_token.get("admin_id")
+        if not admin_id:
+            return None, Response({"error": "Admin ID not found in token"}, status=401)
+        return str(admin_id), None
+    except Exception as e:
+        return None, Response({"error": f"Invalid token: {str(e)}"}, status=401)
+
+
+# ============================================================================
+# ✅ STREAMING EXPORTS (users, scans, search history) for admins
+# ============================================================================
+EXPORT_DATASETS = {
+    "users": {
+        "table": "users",
+        "columns": "id, user_name, user_email, created_at, profiles(city)",
+        "order_column": "created_at",
+        "filters": (),
+        "formatter": format_user,
+        "fieldnames": ["id", "full_name", "email", "date_joined", "address"],
+    },
+    # Scan records are the plants rows written by scan_plant (they carry scanned_at)
+    "scans": {
+        "table": "plants",
+        "columns": "id, plant_name, user_id, scanned_at",
+        "order_column": "scanned_at",
+        "filters": (lambda q: q.not_.is_("scanned_at", "null"),),
+        "formatter": None,
+        "fieldnames": ["id", "plant_name", "user_id", "scanned_at"],
+    },
+    "search_history": {
+        "table": "search_history",
+        "columns": "id, user_email, query, timestamp",
+        "order_column": "timestamp",
+        "filters": (),
+        "formatter": None,
+        "fieldnames": ["id", "user_email", "query", "timestamp"],
+    },
+}
+
+
+@api_view(["GET"])
+def export_data(request, dataset):
+    """
+    Admin: stream a full export.
+    Query params: output=csv|ndjson (default csv), gzip=1 to compress on the fly.
+    """
+    try:
+        admin_id, err = get_admin_id_from_request(request)
+        if err:
+            return err
+
+        spec = EXPORT_DATASETS.get(dataset)
+        if spec is None:
+            return Response({"error": f"Unknown export '{dataset}'"}, status=404)
+
+        output = request.GET.get("output", "csv")
+        if output not in EXPORT_CONTENT_TYPES:
+            return Response({"error": "output must be csv or ndjson"}, status=400)
+        compress = request.GET.get("gzip", "").lower() in ("1", "true", "yes")
+
+        rows = iter_rows(spec["table"], spec["columns"], spec["order_column"], spec["filters"])
+        if spec["formatter"]:
+            rows = map(spec["formatter"], rows)
+
+        filename = f"plantpal_{dataset}_{datetime.utcnow():%Y%m%d_%H%M%S}"
+        return streaming_export(rows, filename, output=output,
+                                fieldnames=spec["fieldnames"], compress=compress)
+
+    except Exception as e:
+        print("❌ Exception in export_data:", traceback.format_exc())
+        return Response({"error": f"Server error: {str(e)}"}, status=500)
+
+
 @api_view(["DELETE"])
 @permission_classes([AllowAny])  # replace with custom admin check later
 def delete_user(request, user_id):
@@ -1222,6 +1511,7 @@ def delete_user(request, user_id):
         if not response.data or len(response.data) == 0:
             return Response({"error": "User not found"}, status=404)
 
+        forget_profiles(row.get("user_email") for row in response.data)
         return Response({"message": "User deleted successfully"}, status=200)
 
     except Exception as e:
@@ -1229,9 +1519,70 @@ def delete_user(request, user_id):
         print("❌ Exception in delete_user:", traceback.format_exc())
         return Response({"error": f"Server error: {str(e)}"}, status=500)
 
-@api_view(['GET'])
-def get_latest_terms_conditions(request):
+# ============================================================================
+# ✅ BULK DELETE USERS (background job, cascades to dependent tables)
+# ============================================================================
+@api_view(["POST"])
+def bulk_delete_users(request):
+    """
+    Admin: start deleting many users and their profiles, notes, scans,
+    search history and terms acceptances.
+    Body: {"user_ids": [...]}. Returns 202 with a job to poll.
+    """
     try:
+        admin_id, err = get_admin_id_from_request(request)
+        if err:
+            return err
+
+        user_ids = request.data.get("user_ids")
+        if not isinstance(user_ids, list) or not user_ids:
+            return Response({"error": "user_ids must be a non-empty list"}, status=400)
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        if len(user_ids) > BULK_DELETE_MAX_USERS:
+            return Response({"error": f"At most {BULK_DELETE_MAX_USERS} users per request"}, status=400)
+
+        valid, invalid = [], []
+        for user_id in user_ids:
+            try:
+                valid.append(str(uuid.UUID(user_id)))
+            except ValueError:
+                invalid.append(user_id)
+        if not valid:
+            return Response({"error": "No valid user ids", "invalid": invalid}, status=400)
+        valid = list(dict.fromkeys(valid))
+
+        job = jobs.submit("bulk_delete_users", total_steps(len(valid)), delete_users, valid, invalid,
+                          forget_profiles)
+        return Response({**job.as_dict(), "invalid": invalid}, status=202)
+
+    except Exception as e:
+        print("❌ Exception in bulk_delete_users:", traceback.format_exc())
+        return Response({"error": f"Server error: {str(e)}"}, status=500)
+
+
+@api_view(["GET"])
+def bulk_delete_status(request, job_id):
+    """Admin: progress and, once finished, per-user outcome of a bulk delete."""
+    admin_id, err = get_admin_id_from_request(request)
+    if err:
+        return err
+
+    job = jobs.status(str(job_id))
+    if job is None or job["kind"] != "bulk_delete_users":
+        return Response({"error": "Job not found"}, status=404)
+    return Response(job, status=200)
+
+
+# --------------------------------------------------------------------
+# Active terms cache (invalidated by add_terms_conditions)
+# --------------------------------------------------------------------
+_terms_cache = TTLCache(maxsize=1, ttl=settings.TERMS_CACHE_TTL)
+
+
+def get_active_terms():
+    """Active terms_conditions row ({} if none), served from the process cache."""
+    terms = _terms_cache.get("active")
+    if terms is None:
         response = (
             supabase.table("terms_conditions")
             .select("*")
@@ -1240,12 +1591,51 @@ def get_latest_terms_conditions(request):
             .limit(1)
             .execute()
         )
+        terms = response.data[0] if response.data else {}
+        _terms_cache.set("active", terms)
+    return terms
 
-        if not response.data:
-            return Response({"content": "No terms found."}, status=200)
 
-        latest_terms = response.data[0]
-        return Response({"content": latest_terms["content"]}, status=200)
+def terms_response(request, terms, body):
+    """Attach the version ETag, answering 304 if the client already has it."""
+    etag = f'"terms-{terms.get("id", "none")}-{terms.get("version", "")}"'
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status=304, headers=headers)
+    return Response(body, status=200, headers=headers)
+
+
+@api_view(['GET'])
+def get_latest_terms_conditions(request):
+    try:
+        terms = get_active_terms()
+        if not terms:
+            return terms_response(request, terms, {"content": "No terms found."})
+
+        return terms_response(request, terms, {
+            "id": terms.get("id"),
+            "version": terms.get("version"),
+            "effective_date": terms.get("effective_date"),
+            "content": terms["content"],
+        })
+
+    except Exception as e:
+        print(traceback.format_exc())
+        return Response({"error": str(e)}, status=500)
+
+
+@api_view(['GET'])
+def get_terms_version(request):
+    """
+    Lightweight check for the mobile app: version info only, no legal text.
+    """
+    try:
+        terms = get_active_terms()
+        return terms_response(request, terms, {
+            "id": terms.get("id"),
+            "version": terms.get("version"),
+            "effective_date": terms.get("effective_date"),
+        })
 
     except Exception as e:
         print(traceback.format_exc())
@@ -1267,6 +1657,7 @@ def notes_list_create(request):
                 supabase.table("notes")
                 .select("*")
                 .eq("user_id", user_id)
+                .is_("deleted_at", "null")
                 .order("created_at", desc=True)
                 .execute()
             )
@@ -1275,8 +1666,10 @@ def notes_list_create(request):
 
         elif request.method == "POST":
             data = request.data
-            title = data.get("title", "").strip()
-            content = data.get("content", "").strip()
+            if not all(isinstance(data.get(key) or "", str) for key in ("title", "content")):
+                return Response({"error": "title and content must be strings"}, status=400)
+            title = (data.get("title") or "").strip()
+            content = (data.get("content") or "").strip()
 
             if not title:
                 return Response({"error": "Title is required"}, status=400)
@@ -1286,8 +1679,8 @@ def notes_list_create(request):
                 "user_id": user_id,
                 "title": title,
                 "content": content,
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
+                "created_at": datetime.utcnow().isoformat(),
+            }).execute()  # updated_at is set by the notes_set_updated_at trigger
 
             return Response({"message": "Note created", "note": note.data[0]}, status=201)
 
@@ -1312,6 +1705,26 @@ def get_user_id_from_request(request):
     except Exception as e:
         return None, Response({"error": f"Invalid token: {str(e)}"}, status=401)
     
+# -------------------------------
+# Helper: explain why a note query matched nothing
+# -------------------------------
+def note_miss_response(note_id):
+    """
+    Only runs after a filtered read/write matched no row.
+    Tells a missing (or deleted) note apart from someone else's note
+    by looking at its owner only, never its content.
+    """
+    response = (
+        supabase.table("notes")
+        .select("user_id, deleted_at")
+        .eq("id", note_id)
+        .limit(1)
+        .execute()
+    )
+    if not response.data or response.data[0].get("deleted_at"):
+        return Response({"error": "Note not found"}, status=404)
+    return Response({"error": "Unauthorized"}, status=403)
+
 # ============================
 # Note Detail: GET/PUT/PATCH/DELETE
 # ============================
@@ -1323,34 +1736,349 @@ def note_detail(request, note_id):
         if err:
             return err
 
-        # Fetch note
-        response = supabase.table("notes").select("*").eq("id", str(note_id)).single().execute()
-        note = response.data
-        if not note:
-            return Response({"error": "Note not found"}, status=404)
-
-        # Ensure the user owns the note
-        if note["user_id"] != user_id:
-            return Response({"error": "Unauthorized"}, status=403)
+        note_id = str(note_id)
 
+        # Every query is filtered on both id and user_id, so ownership is
+        # enforced by the same round-trip that reads or writes the note.
         if request.method == "GET":
-            return Response(note, status=200)
+            response = (
+                supabase.table("notes")
+                .select("*")
+                .eq("id", note_id)
+                .eq("user_id", user_id)
+                .is_("deleted_at", "null")
+                .limit(1)
+                .execute()
+            )
+            if not response.data:
+                return note_miss_response(note_id)
+            return Response(response.data[0], status=200)
 
         elif request.method in ["PUT", "PATCH"]:
             updates = {}
-            if "title" in request.data:
-                updates["title"] = request.data.get("title").strip()
-            if "content" in request.data:
-                updates["content"] = request.data.get("content").strip()
-            updates["updated_at"] = datetime.utcnow().isoformat()
+            for key in ("title", "content"):
+                if key not in request.data:
+                    continue
+                value = request.data.get(key) or ""
+                if not isinstance(value, str):
+                    return Response({"error": f"{key} must be a string"}, status=400)
+                updates[key] = value.strip()
+            if not updates:
+                return Response({"error": "Nothing to update"}, status=400)
 
-            supabase.table("notes").update(updates).eq("id", str(note_id)).execute()
-            return Response({"message": "Note updated", "updates": updates}, status=200)
+            response = (
+                supabase.table("notes")
+                .update(updates)
+                .eq("id", note_id)
+                .eq("user_id", user_id)
+                .is_("deleted_at", "null")
+                .execute()
+            )
+            if not response.data:
+                return note_miss_response(note_id)
+            return Response({"message": "Note updated", "updates": updates, "note": response.data[0]}, status=200)
 
         elif request.method == "DELETE":
-            supabase.table("notes").delete().eq("id", str(note_id)).execute()
+            # Keep a tombstone so notes/sync/ can report the deletion
+            response = (
+                supabase.table("notes")
+                .update({
+                    "title": "",
+                    "content": "",
+                    "deleted_at": datetime.utcnow().isoformat(),
+                })
+                .eq("id", note_id)
+                .eq("user_id", user_id)
+                .is_("deleted_at", "null")
+                .execute()
+            )
+            if not response.data:
+                return note_miss_response(note_id)
             return Response({"message": "Note deleted"}, status=200)
 
     except Exception as e:
         print("⚠️ Error in note_detail:", traceback.format_exc())
-        return Response({"error": str(e)}, status=500)
\ No newline at end of file
+        return Response({"error": str(e)}, status=500)
+
+
+# ============================
+# Notes Batch (offline queue flush)
+# ============================
+NOTES_BATCH_MAX_OPERATIONS = 100
+
+
+@api_view(["POST"])
+@permission_classes([AllowAny])  # We handle JWT manually
+def notes_batch(request):
+    """
+    Apply many created/updated/deleted notes in one request.
+    Body: {"operations": [{"op": "create"|"update"|"delete", "id": <client uuid>,
+                           "title": ..., "content": ...}, ...]}
+    Client-generated ids make replays idempotent. Operations on the same id
+    are coalesced in order (create + update -> create with the merged fields,
+    anything + delete -> delete). Every operation gets a status in the
+    response, in request order.
+    """
+    try:
+        user_id, err = get_user_id_from_request(request)
+        if err:
+            return err
+
+        operations = request.data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return Response({"error": "operations must be a non-empty list"}, status=400)
+        if len(operations) > NOTES_BATCH_MAX_OPERATIONS:
+            return Response({"error": f"At most {NOTES_BATCH_MAX_OPERATIONS} operations per batch"}, status=400)
+
+        results = []
+        pending = {}  # note id -> {"op", "fields", "results"}, operations on one id coalesced in order
+        for op in operations:
+            result = {"id": op.get("id") if isinstance(op, dict) else None,
+                      "op": op.get("op") if isinstance(op, dict) else None}
+            results.append(result)
+
+            if not isinstance(op, dict) or op.get("op") not in ("create", "update", "delete"):
+                result.update(status="invalid", error="op must be create, update or delete")
+                continue
+            try:
+                note_id = str(uuid.UUID(str(op.get("id"))))
+            except ValueError:
+                result.update(status="invalid", error="id must be a UUID")
+                continue
+            bad = next((key for key in ("title", "content")
+                        if op.get(key) is not None and not isinstance(op[key], str)), None)
+            if bad:
+                result.update(status="invalid", error=f"{bad} must be a string")
+                continue
+            fields = {key: (op[key] or "").strip() for key in ("title", "content") if key in op}
+            result["id"] = note_id
+
+            entry = pending.get(note_id)
+            if op["op"] == "create" and entry:
+                result.update(status="invalid", error="create must be the first operation for an id")
+                continue
+            if op["op"] == "update" and entry and entry["op"] == "delete":
+                result.update(status="invalid", error="Note is deleted earlier in this batch")
+                continue
+            merged = {**entry["fields"], **fields} if entry and op["op"] == "update" else fields
+            if op["op"] != "delete" and (entry["op"] if entry else op["op"]) == "create" and not merged.get("title"):
+                result.update(status="invalid", error="Title is required")
+                continue
+
+            if not entry:
+                pending[note_id] = {"op": op["op"], "fields": merged, "results": [result]}
+            elif op["op"] == "delete":
+                created = entry["op"] == "create" or entry.get("created_in_batch", False)
+                entry.update(op="delete", fields={}, created_in_batch=created)
+                entry["results"].append(result)
+            else:
+                entry["fields"] = merged  # update folded into the earlier create/update
+                entry["edits"] = {**entry.get("edits", {}), **fields}
+                entry["results"].append(result)
+
+        if not pending:
+            return Response({"results": results}, status=200)
+
+        # One read for ownership/existence of every note in the batch
+        existing_resp = (
+            supabase.table("notes")
+            .select("id, user_id, title, content, created_at, deleted_at")
+            .in_("id", list(pending))
+            .execute()
+        )
+        existing = {row["id"]: row for row in existing_resp.data or []}
+
+        now = datetime.utcnow().isoformat()
+        inserts, insert_entries = [], []
+        updates = []  # (note id, fields, results reported as "updated")
+        deletes, delete_results = [], []
+
+        def settle(results, status):
+            for result in results:
+                result["status"] = status
+
+        for note_id, entry in pending.items():
+            row = existing.get(note_id)
+            fields = entry["fields"]
+
+            if row and row["user_id"] != user_id:
+                settle(entry["results"], "forbidden")
+                continue
+
+            if entry["op"] == "create":
+                if not row:
+                    inserts.append({
+                        "id": note_id,
+                        "user_id": user_id,
+                        "title": fields["title"],
+                        "content": fields.get("content", ""),
+                        "created_at": now,
+                    })
+                    insert_entries.append(entry)
+                elif row.get("deleted_at"):
+                    settle(entry["results"], "deleted")  # replayed create of a note deleted since
+                else:
+                    # Replayed create, already applied: keep the edits that followed it
+                    settle(entry["results"][:1], "exists")
+                    if entry.get("edits"):
+                        updates.append((note_id, entry["edits"], entry["results"][1:]))
+
+            elif entry["op"] == "update":
+                if not row or row.get("deleted_at"):
+                    settle(entry["results"], "not_found")
+                    continue
+                updates.append((note_id, fields, entry["results"]))
+
+            else:
+                if not row:
+                    # created and deleted within this batch: nothing to write
+                    settle(entry["results"], "deleted" if entry.get("created_in_batch") else "not_found")
+                elif row.get("deleted_at"):
+                    settle(entry["results"], "deleted")  # replayed delete, already applied
+                else:
+                    deletes.append(note_id)
+                    settle(entry["results"], "deleted")
+                    delete_results.extend(entry["results"])
+
+        if inserts:
+            try:
+                # Never overwrites: an id inserted concurrently is reported as "exists"
+                inserted = supabase.table("notes").upsert(
+                    inserts, on_conflict="id", ignore_duplicates=True
+                ).execute().data or []
+                inserted_ids = {row["id"] for row in inserted}
+                for note, entry in zip(inserts, insert_entries):
+                    settle(entry["results"], "created" if note["id"] in inserted_ids else "exists")
+            except Exception as e:
+                print("⚠️ Batch insert failed:", e)
+                for entry in insert_entries:
+                    for result in entry["results"]:
+                        result.update(status="error", error=str(e))
+
+        # Conditional per-note updates, so a note deleted since the read above
+        # keeps its tombstone instead of being overwritten
+        for note_id, fields, update_results in updates:
+            if not fields:
+                settle(update_results, "updated")  # nothing to change
+                continue
+            try:
+                updated = (
+                    supabase.table("notes")
+                    .update(fields)
+                    .eq("id", note_id)
+                    .eq("user_id", user_id)
+                    .is_("deleted_at", "null")
+                    .execute()
+                ).data
+                settle(update_results, "updated" if updated else "not_found")
+            except Exception as e:
+                print("⚠️ Batch update failed:", e)
+                for result in update_results:
+                    result.update(status="error", error=str(e))
+
+        if deletes:
+            try:
+                supabase.table("notes").update({
+                    "title": "",
+                    "content": "",
+                    "deleted_at": now,
+                }).in_("id", deletes).eq("user_id", user_id).execute()
+            except Exception as e:
+                print("⚠️ Batch delete failed:", e)
+                for result in delete_results:
+                    result.update(status="error", error=str(e))
+
+        return Response({"results": results}, status=200)
+
+    except Exception as e:
+        print("⚠️ Error in notes_batch:", traceback.format_exc())
+        return Response({"error": str(e)}, status=500)
+
+
+# ============================
+# Notes Delta Sync
+# ============================
+NOTES_SYNC_PAGE_SIZE = 200
+NOTES_SYNC_MAX_PAGE_SIZE = 500
+# Rows newer than this are left for the next sync: a transaction that started
+# earlier may still commit a smaller updated_at behind the returned cursor.
+# The horizon is computed by the database (notes_sync_horizon), on the same
+# clock as updated_at, so API server clock drift can't skip rows.
+NOTES_SYNC_LAG_SECONDS = 5
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])  # We handle JWT manually
+def notes_sync(request):
+    """
+    Incremental journal sync.
+    Returns notes changed after the `since` cursor (ordered by updated_at, id),
+    plus tombstones for notes deleted since then, and the cursor to send next.
+    Only rows older than NOTES_SYNC_LAG_SECONDS (by the database clock) are returned.
+    Honors If-None-Match: the ETag comes from a count + max(updated_at) probe,
+    so an unchanged journal costs a 304 without reading any note bodies.
+    """
+    try:
+        user_id, err = get_user_id_from_request(request)
+        if err:
+            return err
+
+        since = request.GET.get("since", "").strip()
+        try:
+            limit = min(int(request.GET.get("limit", NOTES_SYNC_PAGE_SIZE)), NOTES_SYNC_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "limit must be a positive integer"}, status=400)
+
+        if since:
+            try:
+                since_ts, since_id = decode_cursor(since)
+            except ValueError:
+                return Response({"error": "Invalid since cursor"}, status=400)
+        horizon = supabase.rpc("notes_sync_horizon", {"lag_seconds": NOTES_SYNC_LAG_SECONDS}).execute().data
+
+        def window(columns, **options):
+            query = (
+                supabase.table("notes")
+                .select(columns, **options)
+                .eq("user_id", user_id)
+                .lt("updated_at", horizon)
+            )
+            return apply_keyset(query, "updated_at", since_ts, since_id) if since else query
+
+        # Cheap version probe: how many rows are in the window and the newest change
+        probe = window("updated_at", count="exact").order("updated_at", desc=True).limit(1).execute()
+        newest = probe.data[0]["updated_at"] if probe.data else ""
+        etag = '"notes-%s"' % hashlib.sha1(
+            f"{user_id}|{since}|{limit}|{probe.count}|{newest}".encode()
+        ).hexdigest()
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if etag_matches(request, etag):
+            return Response(status=304, headers=headers)
+
+        if not probe.count:
+            rows = []
+        else:
+            rows = window("*").order("updated_at").order("id").limit(limit + 1).execute().data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["updated_at"], rows[-1]["id"]) if rows else since
+
+        notes = [row for row in rows if not row.get("deleted_at")]
+        deleted = [
+            {"id": row["id"], "deleted_at": row["deleted_at"]}
+            for row in rows if row.get("deleted_at")
+        ]
+
+        return Response({
+            "notes": notes,
+            "deleted": deleted,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }, status=200, headers=headers)
+
+    except Exception as e:
+        print("⚠️ Error in notes_sync:", traceback.format_exc())
+        return Response({"error": str(e)}, status=500)
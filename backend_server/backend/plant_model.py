@@ -1,63 +1,269 @@
+import json
 import os
 import sys
 import time
+
+# Inference runs on CPU; this module is the only place the ML stack is imported
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
 from PIL import Image
 import torch
 import torchvision.transforms as transforms
 from torchvision import models
 
-_PLANT_NAMES = [
-    "Tarragon", "Peppermint", "Chocomint", "Spearmint",
-    "Oregano (Plain)", "Oregano (Variegated)", "Sambong",
-    "Acapulco", "Lagundi", "Tsaang Gubat",
-    "Unknown Plant 11", "Unknown Plant 12", "Unknown Plant 13",
-    "Unknown Plant 14", "Unknown Plant 15",
-]
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Which checkpoint to serve, e.g. PLANT_MODEL_PATH=models/plant_classifier_student.pth
+# for a distilled student (relative paths are resolved against backend_server/).
+# Its manifest picks the architecture.
+MODEL_PATH = os.path.join(BASE_DIR, os.getenv("PLANT_MODEL_PATH", os.path.join("models", "plant_classifier.pth")))
 
-_model = None
+# Used only when the checkpoint has no manifest (models trained before
+# train_resnet.py started writing one)
+_DEFAULT_MANIFEST = {
+    "architecture": "resnet18",
+    "classes": [
+        "Tarragon", "Peppermint", "Chocomint", "Spearmint",
+        "Oregano (Plain)", "Oregano (Variegated)", "Sambong",
+        "Acapulco", "Lagundi", "Tsaang Gubat",
+        "Unknown Plant 11", "Unknown Plant 12", "Unknown Plant 13",
+        "Unknown Plant 14", "Unknown Plant 15",
+    ],
+    "input_size": 224,
+    "mean": [0.485, 0.456, 0.406],
+    "std": [0.229, 0.224, 0.225],
+}
 
-def _load_model():
-    """Load and initialize model once globally"""
-    global _model
-    if _model is not None:
-        return _model
 
-    # Model path
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    MODEL_PATH = os.path.join(BASE_DIR, "models", "plant_classifier.pth")
+def manifest_path(checkpoint_path):
+    """plant_classifier.pth -> plant_classifier.json (written by train_resnet.py)."""
+    return os.path.splitext(checkpoint_path)[0] + ".json"
+
+
+def load_manifest(checkpoint_path):
+    path = manifest_path(checkpoint_path)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        print(f"⚠️ No model manifest at {path}; using built-in defaults")
+        return dict(_DEFAULT_MANIFEST)
+
+    missing = [key for key in _DEFAULT_MANIFEST if key not in manifest]
+    if missing:
+        raise ValueError(f"Model manifest {path} is missing {', '.join(missing)}")
+    return manifest
 
-    print(f"🔍 Loading model from: {MODEL_PATH}")
-    state_dict = torch.load(MODEL_PATH, map_location="cpu")
 
-    # Build ResNet18 architecture
-    model = models.resnet18(weights=None)
-    num_classes = len(_PLANT_NAMES)
+def _build_resnet18(num_classes, weights=None):
+    model = models.resnet18(weights=weights)
     model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+    return model
+
+
+def _build_mobilenet_v3(builder):
+    def build(num_classes, weights=None):
+        model = builder(weights=weights)
+        model.classifier[-1] = torch.nn.Linear(model.classifier[-1].in_features, num_classes)
+        return model
+    return build
+
+
+def _build_shufflenet_v2(num_classes, weights=None):
+    model = models.shufflenet_v2_x1_0(weights=weights)
+    model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+    return model
+
+
+# manifest "architecture" -> builder(num_classes, weights=None); students come from
+# plantpal_dataset/distill.py, which passes weights="DEFAULT" to start from ImageNet
+ARCHITECTURES = {
+    "resnet18": _build_resnet18,
+    "mobilenet_v3_small": _build_mobilenet_v3(models.mobilenet_v3_small),
+    "mobilenet_v3_large": _build_mobilenet_v3(models.mobilenet_v3_large),
+    "shufflenet_v2_x1_0": _build_shufflenet_v2,
+}
+
+
+def build_transform(manifest):
+    size = manifest["input_size"]
+    return transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=manifest["mean"], std=manifest["std"]),
+    ])
+
+
+MANIFEST = load_manifest(MODEL_PATH)
+PLANT_NAMES = list(MANIFEST["classes"])
+transform = build_transform(MANIFEST)
+
+# How the checkpoint is run: "fp32", "int8-fc" or "torchscript" (PLANT_MODEL_PATH
+# is a torch.jit file with its manifest). "int8-fc" is dynamic int8 quantization,
+# which only covers nn.Linear: the classifier head, so the convolutions that
+# dominate inference stay fp32 and it saves little. For an int8 model end to
+# end, export one with export_static_int8() and serve it as "torchscript".
+BACKENDS = ("fp32", "int8-fc", "torchscript")
+MODEL_BACKEND = os.getenv("PLANT_MODEL_BACKEND", "fp32")
+
+_model = None
+
+
+def load_backend(checkpoint_path=None, backend=None, manifest=None):
+    """
+    Eval-mode CPU model for a checkpoint, built from its manifest.
+    Defaults (MODEL_PATH, MODEL_BACKEND) are read at call time.
+    """
+    checkpoint_path = checkpoint_path or MODEL_PATH
+    backend = backend or MODEL_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}' (known: {', '.join(BACKENDS)})")
+    manifest = manifest or load_manifest(checkpoint_path)
 
-    model.load_state_dict(state_dict)
+    if backend == "torchscript":
+        model = torch.jit.load(checkpoint_path, map_location="cpu")
+        model.eval()
+        return model
+
+    architecture = manifest["architecture"]
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"Unknown model architecture '{architecture}' (known: {', '.join(ARCHITECTURES)})")
+    model = ARCHITECTURES[architecture](len(manifest["classes"]))
+
+    state_dict = torch.load(checkpoint_path, map_location="cpu")
+    try:
+        model.load_state_dict(state_dict)
+    except RuntimeError as e:
+        raise RuntimeError(
+            f"Checkpoint {checkpoint_path} does not match its manifest "
+            f"({architecture}, {len(manifest['classes'])} classes): {e}"
+        ) from e
     model.eval()  # IMPORTANT
     model.cpu()
+
+    if backend == "int8-fc":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def export_torchscript(checkpoint_path, output_path):
+    """Trace an fp32 checkpoint to TorchScript and copy its manifest alongside."""
+    manifest = load_manifest(checkpoint_path)
+    model = load_backend(checkpoint_path, "fp32", manifest)
+    size = manifest["input_size"]
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(1, 3, size, size))
+    traced.save(output_path)
+    with open(manifest_path(output_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return output_path
+
+
+def export_static_int8(checkpoint_path, output_path, calibration_batches):
+    """
+    Post-training static quantization (FX graph mode) of an fp32 checkpoint:
+    convolutions and linear layers run in int8, with activation ranges
+    observed on `calibration_batches` (preprocessed [n, 3, H, W] tensors, a
+    few hundred images from a training or validation split). The result is
+    saved as TorchScript with its manifest, for the "torchscript" backend.
+    Uses the current quantized engine (x86 or qnnpack), so export on the
+    same kind of CPU that serves the model.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    manifest = load_manifest(checkpoint_path)
+    model = load_backend(checkpoint_path, "fp32", manifest)
+    size = manifest["input_size"]
+    example = torch.zeros(1, 3, size, size)
+    qconfig = get_default_qconfig_mapping(torch.backends.quantized.engine)
+
+    with torch.no_grad():
+        prepared = prepare_fx(model, qconfig, example_inputs=(example,))
+        calibrated = 0
+        for batch in calibration_batches:
+            prepared(batch)
+            calibrated += len(batch)
+        if not calibrated:
+            raise ValueError("Static quantization needs at least one calibration batch")
+        traced = torch.jit.trace(convert_fx(prepared), example)
+    traced.save(output_path)
+    with open(manifest_path(output_path), "w") as f:
+        json.dump({**manifest, "quantization": f"static-int8 ({calibrated} calibration images)"}, f, indent=2)
+    return output_path
+
+
+def _load_model():
+    """Load and initialize model once globally"""
+    global _model
+    if _model is not None:
+        return _model
+
+    print(f"🔍 Loading model from: {MODEL_PATH} ({MODEL_BACKEND})")
+    model = load_backend(MODEL_PATH, MODEL_BACKEND, MANIFEST)
     torch.set_grad_enabled(False)
 
     _model = model
-    print("✅ Model loaded successfully!\n")
+    print(f"✅ Model loaded successfully! ({MANIFEST['architecture']}, {len(PLANT_NAMES)} classes, {MANIFEST['input_size']}px)\n")
     return _model
 
 
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
-    )
-])
+# ==========================================================
+# Test-time augmentation
+# ==========================================================
+# When the plain pass is less confident than PLANT_TTA_THRESHOLD (0 = off),
+# flips and crops of the image run as one extra batch and the logits are
+# averaged. The batch is sized so the whole request stays within
+# PLANT_TTA_BUDGET_MS, using a running estimate of the per-view cost.
+TTA_THRESHOLD = float(os.getenv("PLANT_TTA_THRESHOLD", "0"))
+TTA_BUDGET_MS = float(os.getenv("PLANT_TTA_BUDGET_MS", "250"))
+TTA_MAX_VIEWS = int(os.getenv("PLANT_TTA_MAX_VIEWS", "6"))
+TTA_CROP_SCALE = 1.15  # crops are taken from an image resized this much larger
+
+_tta_ms_per_view = None  # EMA of the batched cost (preparation + model) of one extra view
+
+
+def _tta_batch(image, plain, count):
+    """Up to `count` augmented views, most useful first: flip, then crops of a larger resize."""
+    views = [torch.flip(plain, dims=[3])]
+    if count > 1:
+        size = MANIFEST["input_size"]
+        large = build_transform({**MANIFEST, "input_size": round(size * TTA_CROP_SCALE)})(image)
+        edge = large.shape[-1] - size
+        center = large[:, edge // 2:edge // 2 + size, edge // 2:edge // 2 + size]
+        corners = [large[:, y:y + size, x:x + size] for y in (0, edge) for x in (0, edge)]
+        views += [c.unsqueeze(0) for c in [center, *corners, torch.flip(center, dims=[2])]]
+    return torch.cat(views[:count])
+
+
+def _tta_logits(model, image, plain, plain_logits, started):
+    """Averaged logits over the plain pass plus as many views as the budget allows."""
+    global _tta_ms_per_view
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    per_view = _tta_ms_per_view or elapsed_ms  # until measured, assume one view ~ one plain pass
+    count = min(TTA_MAX_VIEWS, int((TTA_BUDGET_MS - elapsed_ms) // max(per_view, 0.1)))
+    if count < 1:
+        return plain_logits, 0
+
+    # The per-view cost covers building the batch (the larger resize and the
+    # crops) as well as the model, since both come out of the budget
+    tta_start = time.perf_counter()
+    batch = _tta_batch(image, plain, count)
+    if (time.perf_counter() - started) * 1000 < TTA_BUDGET_MS:
+        logits = model(batch)
+    else:
+        logits = None  # preparing the views already used up the budget
+    cost = (time.perf_counter() - tta_start) * 1000 / len(batch)
+    _tta_ms_per_view = cost if _tta_ms_per_view is None else 0.8 * _tta_ms_per_view + 0.2 * cost
+
+    if logits is None:
+        return plain_logits, 0
+    return torch.cat([plain_logits, logits]).mean(dim=0, keepdim=True), len(batch)
 
 
 @torch.no_grad()
 def predict(image: Image.Image) -> int:
     model = _load_model()
-    start = time.time()
+    start = time.perf_counter()
 
     # Ensure RGB
     image = image.convert("RGB")
@@ -67,10 +273,14 @@ def predict(image: Image.Image) -> int:
 
     # Run inference
     outputs = model(input_tensor)
+    confidence = outputs.softmax(dim=1).max().item()
+
+    # Hard image: spend the remaining latency budget on augmented views
+    tta_views = 0
+    if confidence < TTA_THRESHOLD:
+        outputs, tta_views = _tta_logits(model, image, input_tensor, outputs, start)
     result = outputs.argmax(dim=1).item()
 
-    print(f"🌿 Predicted: {result} ({_PLANT_NAMES[result]}) | ⏱ {time.time() - start:.2f}s\n")
+    tta_note = f" | TTA {tta_views} views (plain conf {confidence:.2f})" if tta_views else ""
+    print(f"🌿 Predicted: {result} ({PLANT_NAMES[result]}) | ⏱ {time.perf_counter() - start:.2f}s{tta_note}\n")
     return result
-
-
-PLANT_NAMES = _PLANT_NAMES
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 # Middleware
 # ==========================================================
 MIDDLEWARE = [
+    "api.metrics.RequestMetricsMiddleware",  # first, so it times the whole request
     "corsheaders.middleware.CorsMiddleware",  # must be near top
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -134,3 +135,67 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+
+# ==========================================================
+# Address search (Nominatim proxy)
+# ==========================================================
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", "PlantPal/1.0 (barulotrishaanne@gmail.com)")
+NOMINATIM_RATE_PER_SEC = float(os.getenv("NOMINATIM_RATE_PER_SEC", "1"))  # Nominatim usage policy
+NOMINATIM_CONNECT_TIMEOUT = float(os.getenv("NOMINATIM_CONNECT_TIMEOUT", "3.05"))
+NOMINATIM_READ_TIMEOUT = float(os.getenv("NOMINATIM_READ_TIMEOUT", "5"))
+GEOCODER_CACHE_SIZE = int(os.getenv("GEOCODER_CACHE_SIZE", "2048"))
+GEOCODER_CACHE_TTL = int(os.getenv("GEOCODER_CACHE_TTL", str(24 * 3600)))  # seconds
+# Name of a Django cache (see CACHES) shared by all workers, e.g. "default" backed by Redis.
+# Leave empty to only use the in-process cache.
+GEOCODER_SHARED_CACHE = os.getenv("GEOCODER_SHARED_CACHE", "")
+# Optional offline index built with `python manage.py build_gazetteer`.
+# When the file exists it answers address suggestions before Nominatim is asked.
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", str(BASE_DIR / "data" / "gazetteer_ph.idx"))
+
+# ==========================================================
+# Terms & Conditions
+# ==========================================================
+# add_terms_conditions clears the cache in its own process; the TTL bounds
+# how long other workers may keep serving the previous version.
+TERMS_CACHE_TTL = int(os.getenv("TERMS_CACHE_TTL", "300"))  # seconds
+# How often the in-memory "who accepted version X" index pulls new acceptances.
+ACCEPTANCE_INDEX_REFRESH = int(os.getenv("ACCEPTANCE_INDEX_REFRESH", "60"))  # seconds
+# Each refresh re-reads acceptances this far behind the newest one seen, to
+# catch rows whose transaction committed after later-stamped rows were read.
+ACCEPTANCE_INDEX_OVERLAP = int(os.getenv("ACCEPTANCE_INDEX_OVERLAP", "30"))  # seconds
+
+# ==========================================================
+# Profiles
+# ==========================================================
+# Short per-user cache for the profile endpoint; update_profile invalidates it.
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "30"))  # seconds
+
+# ==========================================================
+# Search history (write-behind recorder)
+# ==========================================================
+SEARCH_HISTORY_FLUSH_SIZE = int(os.getenv("SEARCH_HISTORY_FLUSH_SIZE", "100"))
+SEARCH_HISTORY_FLUSH_INTERVAL = float(os.getenv("SEARCH_HISTORY_FLUSH_INTERVAL", "5"))  # seconds
+SEARCH_HISTORY_MAX_QUEUE = int(os.getenv("SEARCH_HISTORY_MAX_QUEUE", "10000"))  # overflow is dropped
+
+# ==========================================================
+# Background jobs (bulk user deletion)
+# ==========================================================
+# Name of a Django cache shared by all workers where job progress is published,
+# so status polls work on any worker. Leave empty when running a single worker.
+JOBS_SHARED_CACHE = os.getenv("JOBS_SHARED_CACHE", "")
+
+# ==========================================================
+# Trending
+# ==========================================================
+# How often each worker's background feed reads new scan rows (scans made by
+# the FastAPI service) into the in-memory plant trends.
+TRENDING_PLANT_REFRESH = int(os.getenv("TRENDING_PLANT_REFRESH", "60"))  # seconds
+
+# ==========================================================
+# Metrics
+# ==========================================================
+# Requests slower than this are logged with their Supabase query sequence (0 disables)
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+# If set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from api import views   # ✅ import views from the api app
+from api.metrics import metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -9,6 +10,7 @@ from rest_framework_simplejwt.views import (
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),  # ✅ keep all API routes here
+    path("metrics", metrics_view, name="metrics"),  # Prometheus scrape endpoint
 
     # JWT Authentication endpoints
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
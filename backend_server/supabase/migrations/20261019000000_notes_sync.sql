@@ -0,0 +1,13 @@
+-- Delta sync for journal notes (notes/sync/).
+-- Deleted notes are kept as tombstones (deleted_at set, content cleared) so
+-- clients can be told about deletions since their last cursor.
+
+alter table notes add column if not exists updated_at timestamptz;
+alter table notes add column if not exists deleted_at timestamptz;
+
+update notes set updated_at = coalesce(updated_at, created_at, now()) where updated_at is null;
+alter table notes alter column updated_at set default now();
+alter table notes alter column updated_at set not null;
+
+-- keyset scans for notes/sync/?since=<updated_at, id>
+create index if not exists notes_user_updated_idx on notes (user_id, updated_at, id);
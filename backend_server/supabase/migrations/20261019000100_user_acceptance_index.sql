@@ -0,0 +1,18 @@
+-- One acceptance per (user, terms version), so accepting can be a single
+-- idempotent upsert, plus the keyset index used by the acceptance index.
+
+alter table user_acceptance add column if not exists accepted_at timestamptz not null default now();
+
+-- Earlier code could insert the same acceptance twice; keep the earliest row
+-- of each (user, terms version) so the unique index below can be built.
+delete from user_acceptance later
+    using user_acceptance earlier
+    where later.user_id = earlier.user_id
+      and later.terms_id = earlier.terms_id
+      and (later.accepted_at, later.ctid) > (earlier.accepted_at, earlier.ctid);
+
+create unique index if not exists user_acceptance_user_terms_key
+    on user_acceptance (user_id, terms_id);
+
+create index if not exists user_acceptance_terms_accepted_idx
+    on user_acceptance (terms_id, accepted_at, user_id);
@@ -0,0 +1,16 @@
+-- notes.updated_at is the notes/sync/ cursor, so it must come from one clock.
+-- Set it in the database on every insert/update (including upserts) and
+-- ignore whatever the client or API server sent.
+
+create or replace function notes_set_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists notes_set_updated_at on notes;
+create trigger notes_set_updated_at
+    before insert or update on notes
+    for each row execute function notes_set_updated_at();
@@ -0,0 +1,8 @@
+-- notes/sync/ only returns rows whose updated_at is older than a lag behind
+-- "now". updated_at comes from the database clock (see the updated_at
+-- trigger), so "now" must too: the API server's clock can drift from it.
+
+create or replace function notes_sync_horizon(lag_seconds double precision) returns timestamptz
+language sql volatile as $$
+    select clock_timestamp() - make_interval(secs => lag_seconds);
+$$;
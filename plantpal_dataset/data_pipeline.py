@@ -0,0 +1,309 @@
+"""
+Data loading for train_resnet.py.
+
+- make_loader(): DataLoader with worker processes, persistent workers,
+  pinned memory and prefetching, falling back to the plain single-process
+  options when num_workers=0 (those arguments are invalid there).
+- load_split(): ImageFolder (or split-manifest) + PIL decoding, or with cache_dir set, a one-time
+  decode of every image to a resized uint8 tensor saved as a .pt file. Later
+  runs only load that file and normalize, so workers never touch a JPEG.
+- ShardDataset: memory-mapped uint8 shards written by pack_shards.py.
+- write_manifest(): the model manifest saved next to each checkpoint.
+- benchmark_loader() / benchmark_train_step(): images/sec for the loader alone
+  and for the full forward/backward step.
+"""
+import csv
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import datasets, transforms
+
+from training import train_step
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+SHARD_INDEX = "index.json"
+
+
+# ===== MODEL MANIFEST =====
+# Written next to every checkpoint; backend/plant_model.py builds its class
+# list, preprocessing and architecture from it.
+def manifest_path(checkpoint_path):
+    return os.path.splitext(checkpoint_path)[0] + ".json"
+
+
+def write_manifest(checkpoint_path, classes, image_size, architecture="resnet18"):
+    manifest = {
+        "architecture": architecture,
+        "classes": list(classes),  # ImageFolder order == output index order
+        "input_size": image_size,
+        "mean": IMAGENET_MEAN,
+        "std": IMAGENET_STD,
+    }
+    path = manifest_path(checkpoint_path)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def build_transform(image_size):
+    return transforms.Compose([
+        transforms.Resize((image_size, image_size)),
+        transforms.ToTensor(),
+        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
+    ])
+
+
+# ===== PRE-DECODED CACHE =====
+class _DecodeDataset(Dataset):
+    """ImageFolder samples -> resized uint8 CHW tensors (used once, to build the cache)."""
+
+    def __init__(self, samples, image_size):
+        self.samples = samples
+        self.image_size = image_size
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index):
+        path, label = self.samples[index]
+        with Image.open(path) as img:
+            img = img.convert("RGB").resize((self.image_size, self.image_size), Image.BILINEAR)
+            array = np.asarray(img, dtype=np.uint8).copy()
+        return torch.from_numpy(array).permute(2, 0, 1), label
+
+
+_MEAN = torch.tensor(IMAGENET_MEAN).view(3, 1, 1)
+_STD = torch.tensor(IMAGENET_STD).view(3, 1, 1)
+
+
+def normalize_uint8(image):
+    """uint8 CHW tensor -> normalized float tensor (same result as ToTensor + Normalize)."""
+    return (image.float().div_(255) - _MEAN) / _STD
+
+
+class DecodedTensorDataset(Dataset):
+    """Serves normalized float tensors from a uint8 [N, 3, H, W] tensor."""
+
+    def __init__(self, images, labels, classes):
+        self.images = images
+        self.labels = labels
+        self.classes = classes
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        return normalize_uint8(self.images[index]), int(self.labels[index])
+
+
+def _cache_key(samples, image_size):
+    digest = hashlib.sha1(str(image_size).encode())
+    for path, label in samples:
+        stat = os.stat(path)
+        digest.update(f"{path}\0{label}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def iter_decoded(samples, image_size, num_workers=0, batch_size=64):
+    """Yields (uint8 [B, 3, H, W], int64 [B]) batches in sample order."""
+    yield from DataLoader(
+        _DecodeDataset(samples, image_size),
+        batch_size=batch_size,
+        num_workers=num_workers,
+    )
+
+
+def build_decoded_cache(samples, classes, image_size, cache_path, num_workers=0):
+    images = torch.empty((len(samples), 3, image_size, image_size), dtype=torch.uint8)
+    labels = torch.empty(len(samples), dtype=torch.int64)
+    start = 0
+    for batch, batch_labels in iter_decoded(samples, image_size, num_workers):
+        images[start:start + len(batch)] = batch
+        labels[start:start + len(batch)] = batch_labels
+        start += len(batch)
+
+    tmp_path = cache_path + ".tmp"
+    torch.save({"images": images, "labels": labels, "classes": classes}, tmp_path)
+    os.replace(tmp_path, cache_path)
+    return images, labels
+
+
+# ===== SPLIT MANIFESTS =====
+def read_split_manifest(manifest_path, split, root):
+    """
+    (samples, classes) for one split of a split_dataset.py manifest, ordered
+    like ImageFolder would (classes sorted across all splits, so label indices
+    agree between train/val/test).
+    """
+    with open(manifest_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    classes = sorted({row["label"] for row in rows})
+    class_index = {plant: i for i, plant in enumerate(classes)}
+    samples = sorted(
+        (os.path.join(root, row["path"]), class_index[row["label"]])
+        for row in rows if row["split"] == split
+    )
+    return samples, classes
+
+
+class ManifestDataset(Dataset):
+    """ImageFolder equivalent for images listed in a split manifest."""
+
+    def __init__(self, samples, classes, transform):
+        self.samples = samples
+        self.classes = classes
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index):
+        path, label = self.samples[index]
+        with Image.open(path) as img:
+            return self.transform(img.convert("RGB")), label
+
+
+def load_split(data_dir, split, image_size, cache_dir=None, num_workers=0, manifest=None):
+    """
+    Dataset for one split (train/val/test): the <data_dir>/<split> folder, or
+    with `manifest` the rows of that split, relative to data_dir. With
+    cache_dir set, images are decoded once and reused until a file is added,
+    removed or modified.
+    """
+    if manifest:
+        samples, classes = read_split_manifest(manifest, split, data_dir)
+        if not cache_dir:
+            return ManifestDataset(samples, classes, build_transform(image_size))
+    else:
+        split_dir = os.path.join(data_dir, split)
+        if not cache_dir:
+            return datasets.ImageFolder(split_dir, build_transform(image_size))
+        folder = datasets.ImageFolder(split_dir)
+        samples, classes = folder.samples, folder.classes
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{split}_{image_size}_{_cache_key(samples, image_size)}.pt")
+
+    if os.path.exists(cache_path):
+        cached = torch.load(cache_path)
+        images, labels = cached["images"], cached["labels"]
+        print(f"✅ Loaded decoded {split} cache ({len(labels)} images) from {cache_path}")
+    else:
+        print(f"⏳ Decoding {len(samples)} {split} images into {cache_path} ...")
+        images, labels = build_decoded_cache(samples, classes, image_size, cache_path, num_workers=num_workers)
+    return DecodedTensorDataset(images, labels, classes)
+
+
+# ===== MEMORY-MAPPED SHARDS =====
+def read_shard_index(shard_dir):
+    with open(os.path.join(shard_dir, SHARD_INDEX)) as f:
+        return json.load(f)
+
+
+class ShardDataset(Dataset):
+    """
+    Reads a split written by pack_shards.py. Each shard is a uint8
+    [n, 3, H, W] .npy file mapped copy-on-write, so items are zero-copy views
+    of the page cache; nothing is decoded or resized. With raw=True items stay
+    uint8 (for evaluation tooling and quantization calibration).
+    """
+
+    def __init__(self, shard_dir, split, raw=False):
+        index = read_shard_index(shard_dir)
+        if split not in index["splits"]:
+            raise FileNotFoundError(f"Split '{split}' is not in {shard_dir}; packed: {sorted(index['splits'])}")
+        info = index["splits"][split]
+
+        self.classes = index["classes"]
+        self.image_size = index["image_size"]
+        self.raw = raw
+        self.paths = [os.path.join(shard_dir, split, shard["file"]) for shard in info["shards"]]
+        self.offsets = np.cumsum([0] + [shard["count"] for shard in info["shards"]])
+        self.labels = np.load(os.path.join(shard_dir, split, "labels.npy"))
+        self._shards = None  # opened lazily so each DataLoader worker maps its own
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def __getitem__(self, index):
+        if self._shards is None:
+            self._shards = [np.load(path, mmap_mode="c") for path in self.paths]
+        if index < 0:
+            index += len(self)
+        shard = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        image = torch.from_numpy(self._shards[shard][index - self.offsets[shard]])
+        label = int(self.labels[index])
+        return (image if self.raw else normalize_uint8(image)), label
+
+
+# ===== LOADERS =====
+def make_loader(dataset, batch_size, shuffle, num_workers=0, pin_memory=False,
+                persistent_workers=True, prefetch_factor=2, drop_last=False):
+    options = dict(
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        drop_last=drop_last,
+    )
+    if num_workers > 0:
+        options.update(persistent_workers=persistent_workers, prefetch_factor=prefetch_factor)
+    return DataLoader(dataset, **options)
+
+
+def default_num_workers():
+    return min(8, os.cpu_count() or 1)
+
+
+# ===== BENCHMARKS =====
+def _timed_batches(loader, batches, step=None):
+    """Images/sec over `batches` batches, not counting the first (worker start-up)."""
+    iterator = iter(loader)
+    inputs, labels = next(iterator)
+    if step:
+        step(inputs, labels)
+
+    images = 0
+    started = time.perf_counter()
+    for _ in range(batches):
+        try:
+            inputs, labels = next(iterator)
+        except StopIteration:
+            iterator = iter(loader)
+            inputs, labels = next(iterator)
+        if step:
+            step(inputs, labels)
+        images += inputs.size(0)
+    return images / (time.perf_counter() - started)
+
+
+def benchmark_loader(loader, batches=50):
+    return _timed_batches(loader, batches)
+
+
+def benchmark_train_step(model, loader, criterion, optimizer, device, batches=50,
+                         precision="fp32", channels_last=False):
+    """
+    Full forward/backward throughput. Pass the same (resolved) precision and
+    channels_last as training, with the model already in that memory format.
+    """
+    model.train()
+
+    def step(inputs, labels):
+        train_step(model, inputs, labels, criterion, optimizer, device, precision, channels_last)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+
+    return _timed_batches(loader, batches, step)
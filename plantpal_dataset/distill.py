@@ -0,0 +1,278 @@
+"""
+Distil the production ResNet18 (plant_classifier.pth) into a smaller student.
+
+The student starts from ImageNet weights and learns from a mix of the
+teacher's softened logits (KL divergence at --temperature) and the true
+labels. Its backbone is unfrozen progressively: the classifier trains alone
+first and every --unfreeze-every epochs another slice of blocks (from the top)
+joins at a lower learning rate.
+
+At the end the teacher and the student are compared on validation accuracy
+and single-image CPU latency. The student is saved with a manifest, so it can
+be served by pointing PLANT_MODEL_PATH at it:
+
+    python distill.py --data-dir D:\\Plantpal_dataset --student mobilenet_v3_small
+    PLANT_MODEL_PATH=models/plant_classifier_student.pth python manage.py runserver
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from tqdm import tqdm
+
+from data_pipeline import ShardDataset, default_num_workers, load_split, make_loader, manifest_path, write_manifest
+from training import (
+    configure_threads,
+    evaluate,
+    load_checkpoint,
+    log_epoch,
+    resolve_precision,
+    save_checkpoint,
+    train_one_epoch,
+)
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend_server")
+sys.path.insert(0, BACKEND_DIR)
+from backend.plant_model import ARCHITECTURES  # noqa: E402
+
+DEFAULT_TEACHER = os.path.join(BACKEND_DIR, "models", "plant_classifier.pth")
+
+
+# ===== ARCHITECTURES =====
+# Models come from the ARCHITECTURES registry the server loads them with;
+# this table only says how to split a built model into the classifier head
+# and its backbone blocks (input to output) for progressive unfreezing.
+PARTS = {
+    "resnet18": lambda m: (m.fc, [nn.Sequential(m.conv1, m.bn1), m.layer1, m.layer2, m.layer3, m.layer4]),
+    "mobilenet_v3_small": lambda m: (m.classifier, list(m.features)),
+    "mobilenet_v3_large": lambda m: (m.classifier, list(m.features)),
+    "shufflenet_v2_x1_0": lambda m: (m.fc, [m.conv1, m.stage2, m.stage3, m.stage4, m.conv5]),
+}
+STUDENTS = sorted(name for name in ARCHITECTURES if name in PARTS and name != "resnet18")
+
+
+def build_student(architecture, num_classes, pretrained=True):
+    """(model, head, backbone blocks) for a registry architecture."""
+    model = ARCHITECTURES[architecture](num_classes, weights="DEFAULT" if pretrained else None)
+    head, blocks = PARTS[architecture](model)
+    return model, head, blocks
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Distil plant_classifier.pth into a smaller student model.")
+    parser.add_argument("--data-dir", default=r"C:\Users\Trisha\Documents\Plantpal_dataset")
+    parser.add_argument("--manifest", help="Split manifest (paths relative to --data-dir)")
+    parser.add_argument("--shards", help="Memory-mapped shards from pack_shards.py")
+    parser.add_argument("--teacher", default=DEFAULT_TEACHER, help="ResNet18 checkpoint used as teacher")
+    parser.add_argument("--student", choices=STUDENTS, default="mobilenet_v3_small")
+    parser.add_argument("--output", default="plant_classifier_student.pth")
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--epochs", type=int, default=12)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--backbone-lr-scale", type=float, default=0.1,
+                        help="Learning rate multiplier for unfrozen backbone blocks")
+    parser.add_argument("--unfreeze-every", type=int, default=3,
+                        help="Epochs per unfreezing stage (0 = train everything from the start)")
+    parser.add_argument("--stages", type=int, default=4, help="Slices the backbone is unfrozen in")
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--alpha", type=float, default=0.7, help="Weight of the distillation term")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=default_num_workers())
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--precision", choices=("auto", "fp32", "bf16"), default="auto")
+    parser.add_argument("--checkpoint-dir", default=os.path.join("checkpoints", "distill"),
+                        help="last.pt, best.pt and distill_log.jsonl are written here every epoch")
+    parser.add_argument("--resume", nargs="?", const="last", metavar="CHECKPOINT",
+                        help="Continue from a checkpoint (default: <checkpoint-dir>/last.pt)")
+    parser.add_argument("--latency-runs", type=int, default=50)
+    return parser.parse_args()
+
+
+# ===== DISTILLATION =====
+def distillation_loss(teacher, temperature, alpha):
+    def loss_fn(student_logits, inputs, labels):
+        with torch.no_grad():
+            teacher_logits = teacher(inputs)
+        soft = F.kl_div(
+            F.log_softmax(student_logits.float() / temperature, dim=1),
+            F.softmax(teacher_logits.float() / temperature, dim=1),
+            reduction="batchmean",
+        ) * temperature ** 2
+        return alpha * soft + (1 - alpha) * F.cross_entropy(student_logits.float(), labels)
+    return loss_fn
+
+
+def unfreeze_stage(model, head, blocks, stage, stages, lr, backbone_lr_scale):
+    """
+    Freeze all but the head and the top `stage` slices of blocks.
+    Returns a fresh optimizer and the blocks that stay frozen.
+    """
+    for param in model.parameters():
+        param.requires_grad = False
+    for param in head.parameters():
+        param.requires_grad = True
+
+    per_slice = -(-len(blocks) // stages)
+    unfrozen = blocks[len(blocks) - min(stage * per_slice, len(blocks)):] if stage else []
+    backbone = [p for block in unfrozen for p in block.parameters()]
+    for param in backbone:
+        param.requires_grad = True
+
+    groups = [{"params": list(head.parameters()), "lr": lr}]
+    if backbone:
+        groups.append({"params": backbone, "lr": lr * backbone_lr_scale})
+    return torch.optim.AdamW(groups, weight_decay=1e-4), blocks[:len(blocks) - len(unfrozen)]
+
+
+# ===== REPORTING =====
+@torch.no_grad()
+def cpu_latency_ms(model, image_size, runs=50, warmup=10):
+    """Median single-image CPU latency in milliseconds (fp32, like production)."""
+    model = copy.deepcopy(model).float().cpu().eval()
+    sample = torch.randn(1, 3, image_size, image_size)
+    for _ in range(warmup):
+        model(sample)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model(sample)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def parameter_count(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+if __name__ == "__main__":
+    # ===== CONFIGURATION =====
+    args = parse_args()
+    threads, _ = configure_threads(args.threads)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    precision = resolve_precision(device, args.precision)
+
+    # ===== DATA =====
+    if args.shards:
+        image_datasets = {x: ShardDataset(args.shards, x) for x in ['train', 'val']}
+        args.image_size = image_datasets['train'].image_size
+    else:
+        image_datasets = {
+            x: load_split(args.data_dir, x, args.image_size, num_workers=args.workers, manifest=args.manifest)
+            for x in ['train', 'val']
+        }
+    dataloaders = {
+        x: make_loader(image_datasets[x], args.batch_size, shuffle=(x == 'train'),
+                       num_workers=args.workers, pin_memory=device.type == "cuda")
+        for x in ['train', 'val']
+    }
+    classes = image_datasets['train'].classes
+
+    # ===== TEACHER =====
+    teacher_manifest = manifest_path(args.teacher)
+    if os.path.exists(teacher_manifest):
+        with open(teacher_manifest) as f:
+            teacher_classes = json.load(f)["classes"]
+        if teacher_classes != list(classes):
+            raise SystemExit(f"❌ Teacher classes {teacher_classes} do not match the dataset's {list(classes)}")
+    teacher = ARCHITECTURES["resnet18"](len(classes))
+    teacher.load_state_dict(torch.load(args.teacher, map_location="cpu"))
+    teacher = teacher.to(device).eval()
+    for param in teacher.parameters():
+        param.requires_grad = False
+    print(f"✅ Teacher loaded from {args.teacher}")
+
+    # ===== STUDENT =====
+    student, head, blocks = build_student(args.student, len(classes), pretrained=not args.resume)
+    student = student.to(device)
+    loss_fn = distillation_loss(teacher, args.temperature, args.alpha)
+    log_path = os.path.join(args.checkpoint_dir, "distill_log.jsonl")
+    last_path = os.path.join(args.checkpoint_dir, "last.pt")
+    best_path = os.path.join(args.checkpoint_dir, "best.pt")
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    def stage_for(epoch):
+        return args.stages if not args.unfreeze_every else min(epoch // args.unfreeze_every, args.stages)
+
+    # ===== RESUME =====
+    start_epoch, stage = 0, None
+    best_acc, best_state = -1.0, None
+    if args.resume:
+        resume_path = last_path if args.resume == "last" else args.resume
+        saved = torch.load(resume_path, map_location="cpu")
+        if saved.get("student") != args.student:
+            raise SystemExit(f"❌ {resume_path} is a {saved.get('student')} student, not {args.student}")
+        # The optimizer's parameter groups depend on the stage, so rebuild it first
+        stage = saved["stage"]
+        optimizer, frozen = unfreeze_stage(student, head, blocks, stage, args.stages,
+                                           args.lr, args.backbone_lr_scale)
+        start_epoch, state = load_checkpoint(resume_path, student, optimizer, classes)
+        best_acc = state["best_acc"]
+        best_state = torch.load(best_path, map_location="cpu") if os.path.exists(best_path) else None
+        print(f"✅ Resumed from {resume_path} at epoch {start_epoch + 1}/{args.epochs} (stage {stage})")
+
+    for epoch in tqdm(range(start_epoch, args.epochs), desc="Epochs", unit="epoch", ascii=True,
+                      initial=start_epoch, total=args.epochs):
+        if stage_for(epoch) != stage:
+            stage = stage_for(epoch)
+            optimizer, frozen = unfreeze_stage(student, head, blocks, stage, args.stages,
+                                               args.lr, args.backbone_lr_scale)
+            tqdm.write(f"🔓 Stage {stage}: head + top {len(blocks) - len(frozen)}/{len(blocks)} "
+                       f"backbone blocks trainable")
+
+        loss, train_rate = train_one_epoch(student, dataloaders['train'], None, optimizer, device,
+                                           precision, loss_fn=loss_fn, frozen=frozen)
+        val_acc, _ = evaluate(student, dataloaders['val'], device, precision)
+        if val_acc > best_acc:
+            best_acc, best_state = val_acc, copy.deepcopy(student.state_dict())
+            torch.save(best_state, best_path)
+
+        save_checkpoint(last_path, student, optimizer, epoch, classes,
+                        extra={"student": args.student, "stage": stage, "best_acc": best_acc})
+        log_epoch(log_path, epoch=epoch + 1, stage=stage, loss=loss, val_acc=val_acc,
+                  train_images_per_sec=train_rate)
+        tqdm.write(f"📊 Epoch {epoch + 1}/{args.epochs}: loss={loss:.4f} val_acc={val_acc:.4f} "
+                   f"train={train_rate:.1f} img/s")
+
+    # ===== REPORT =====
+    if best_state is not None:
+        student.load_state_dict(best_state)
+    teacher_acc, _ = evaluate(teacher, dataloaders['val'], device)
+    student_acc, _ = evaluate(student, dataloaders['val'], device)
+    report = {
+        "image_size": args.image_size,
+        "cpu_threads": threads,
+        "teacher": {
+            "architecture": "resnet18",
+            "val_acc": teacher_acc,
+            "cpu_latency_ms": cpu_latency_ms(teacher, args.image_size, args.latency_runs),
+            "parameters": parameter_count(teacher),
+        },
+        "student": {
+            "architecture": args.student,
+            "val_acc": student_acc,
+            "cpu_latency_ms": cpu_latency_ms(student, args.image_size, args.latency_runs),
+            "parameters": parameter_count(student),
+        },
+    }
+    with open(os.path.join(args.checkpoint_dir, "distill_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'':10} {'val_acc':>8} {'CPU ms':>8} {'params':>10}")
+    for name in ("teacher", "student"):
+        row = report[name]
+        print(f"{name:10} {row['val_acc']:8.4f} {row['cpu_latency_ms']:8.2f} {row['parameters']:10,}")
+    speedup = report["teacher"]["cpu_latency_ms"] / report["student"]["cpu_latency_ms"]
+    print(f"📊 Student is {speedup:.1f}x faster, accuracy {student_acc - teacher_acc:+.4f}")
+
+    # ===== EXPORT =====
+    torch.save({k: v.cpu() for k, v in student.state_dict().items()}, args.output)
+    manifest = write_manifest(args.output, classes, args.image_size, architecture=args.student)
+    print(f"✅ Student saved as {args.output} with manifest {manifest}")
+    print("   Serve it by copying both to backend_server/models/ and setting PLANT_MODEL_PATH")
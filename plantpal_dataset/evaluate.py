@@ -0,0 +1,222 @@
+"""
+Offline evaluation of a deployable checkpoint, exactly as plant_model serves it.
+
+The model is loaded through backend/plant_model.py (fp32, int8-fc or
+TorchScript backend) and its manifest supplies the class order and the
+preprocessing. Logits for the whole split are collected first and every
+metric is computed with a handful of tensor ops:
+
+- top-1 / top-k accuracy and negative log-likelihood
+- confusion matrix (one bincount), per-class precision, recall, F1, support
+- expected calibration error over --bins confidence bins, plus the
+  reliability table
+
+Results (including every prediction) go to a JSON report. Pass --compare with
+an earlier report to see how many predictions changed, e.g. before and after
+static int8 quantization (calibrated on --calibration-split, then served
+with the torchscript backend):
+
+    python evaluate.py --data-dir D:\\Plantpal_dataset --output fp32.json
+    python evaluate.py --data-dir D:\\Plantpal_dataset --export-int8 models/plant_int8.pt --output int8.json --compare fp32.json
+
+--backend int8-fc only quantizes the classifier head (dynamic int8 Linear).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import torch
+import torch.nn.functional as F
+from tqdm import tqdm
+
+from data_pipeline import (
+    ManifestDataset,
+    ShardDataset,
+    default_num_workers,
+    make_loader,
+    read_split_manifest,
+)
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend_server")
+sys.path.insert(0, BACKEND_DIR)
+from backend import plant_model  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate a plant_model checkpoint on a dataset split.")
+    parser.add_argument("--checkpoint", default=plant_model.MODEL_PATH)
+    parser.add_argument("--backend", choices=plant_model.BACKENDS, default="fp32")
+    parser.add_argument("--export-torchscript", metavar="PATH",
+                        help="Trace the fp32 checkpoint to PATH first and evaluate the traced model")
+    parser.add_argument("--export-int8", metavar="PATH",
+                        help="Statically quantize the fp32 checkpoint (convs + linear) to PATH first "
+                             "and evaluate the int8 TorchScript model")
+    parser.add_argument("--calibration-split", default="val",
+                        help="Split whose images calibrate --export-int8 activation ranges")
+    parser.add_argument("--calibration-batches", type=int, default=4)
+    parser.add_argument("--data-dir", default=r"C:\Users\Trisha\Documents\Plantpal_dataset")
+    parser.add_argument("--manifest", help="Split manifest (paths relative to --data-dir)")
+    parser.add_argument("--shards", help="Memory-mapped shards from pack_shards.py")
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=default_num_workers())
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--bins", type=int, default=15, help="Confidence bins for ECE")
+    parser.add_argument("--output", default="eval_report.json")
+    parser.add_argument("--compare", help="Earlier report to compare predictions against")
+    return parser.parse_args()
+
+
+def load_dataset(args, model_manifest, split):
+    transform = plant_model.build_transform(model_manifest)
+    if args.shards:
+        dataset = ShardDataset(args.shards, split)
+        if dataset.image_size != model_manifest["input_size"]:
+            raise SystemExit(f"❌ Shards are {dataset.image_size}px, the model expects "
+                             f"{model_manifest['input_size']}px; repack or use --data-dir")
+        return dataset
+    if args.manifest:
+        samples, classes = read_split_manifest(args.manifest, split, args.data_dir)
+    else:
+        from torchvision import datasets
+        folder = datasets.ImageFolder(os.path.join(args.data_dir, split))
+        samples, classes = folder.samples, folder.classes
+    return ManifestDataset(samples, classes, transform)
+
+
+@torch.no_grad()
+def collect_logits(model, loader, num_samples, num_classes):
+    logits = torch.empty((num_samples, num_classes))
+    labels = torch.empty(num_samples, dtype=torch.int64)
+    start = 0
+    started = time.perf_counter()
+    for inputs, batch_labels in tqdm(loader, desc="Evaluating", unit="batch", ascii=True):
+        end = start + len(batch_labels)
+        logits[start:end] = model(inputs).float()
+        labels[start:end] = batch_labels
+        start = end
+    return logits, labels, num_samples / (time.perf_counter() - started)
+
+
+def compute_metrics(logits, labels, classes, top_k=(1, 3, 5), bins=15):
+    num_classes = len(classes)
+    probs = logits.softmax(dim=1)
+    confidence, preds = probs.max(dim=1)
+    correct = preds == labels
+
+    confusion = torch.bincount(labels * num_classes + preds, minlength=num_classes ** 2)
+    confusion = confusion.view(num_classes, num_classes)  # rows: true class, columns: predicted
+    true_positives = confusion.diag().double()
+    support = confusion.sum(dim=1).double()
+    predicted = confusion.sum(dim=0).double()
+    precision = torch.where(predicted > 0, true_positives / predicted.clamp(min=1), torch.zeros_like(predicted))
+    recall = torch.where(support > 0, true_positives / support.clamp(min=1), torch.zeros_like(support))
+    f1 = torch.where(precision + recall > 0, 2 * precision * recall / (precision + recall).clamp(min=1e-12),
+                     torch.zeros_like(precision))
+
+    ks = sorted({min(k, num_classes) for k in top_k if k >= 1}) or [1]  # k > classes is plain accuracy
+    top = logits.topk(max(ks), dim=1).indices
+    hits = (top == labels.unsqueeze(1)).cumsum(dim=1).clamp(max=1).float()  # hit within first j+1
+
+    bin_index = (confidence * bins).long().clamp(max=bins - 1)
+    bin_count = torch.bincount(bin_index, minlength=bins).double()
+    bin_confidence = torch.bincount(bin_index, weights=confidence.double(), minlength=bins)
+    bin_accuracy = torch.bincount(bin_index, weights=correct.double(), minlength=bins)
+    ece = (bin_accuracy - bin_confidence).abs().sum() / len(labels)
+    nonempty = bin_count > 0
+
+    return {
+        "count": len(labels),
+        "top1": correct.float().mean().item(),
+        "top_k": {str(k): hits[:, k - 1].mean().item() for k in ks},
+        "nll": F.cross_entropy(logits, labels).item(),
+        "ece": ece.item(),
+        "macro_f1": f1.mean().item(),
+        "per_class": [
+            {"class": name, "precision": p, "recall": r, "f1": f, "support": int(s)}
+            for name, p, r, f, s in zip(classes, precision.tolist(), recall.tolist(), f1.tolist(), support.tolist())
+        ],
+        "confusion_matrix": confusion.tolist(),
+        "reliability": [
+            {
+                "bin": [i / bins, (i + 1) / bins],
+                "count": int(bin_count[i]),
+                "confidence": (bin_confidence[i] / bin_count[i]).item(),
+                "accuracy": (bin_accuracy[i] / bin_count[i]).item(),
+            }
+            for i in nonempty.nonzero().flatten().tolist()
+        ],
+        "predictions": preds.tolist(),
+    }
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if any(k < 1 for k in args.top_k):
+        raise SystemExit(f"❌ --top-k values must be positive, got {args.top_k}")
+
+    # ===== MODEL =====
+    checkpoint, backend = args.checkpoint, args.backend
+    if args.export_torchscript and args.export_int8:
+        raise SystemExit("❌ Pass either --export-torchscript or --export-int8, not both")
+    if args.export_torchscript:
+        checkpoint = plant_model.export_torchscript(args.checkpoint, args.export_torchscript)
+        backend = "torchscript"
+        print(f"✅ Exported TorchScript model to {checkpoint}")
+    if args.export_int8:
+        calibration = load_dataset(args, plant_model.load_manifest(args.checkpoint), args.calibration_split)
+        calibration_loader = make_loader(calibration, args.batch_size, shuffle=True, num_workers=args.workers,
+                                         persistent_workers=False)
+        batches = (inputs for inputs, _ in islice(calibration_loader, args.calibration_batches))
+        checkpoint = plant_model.export_static_int8(args.checkpoint, args.export_int8, batches)
+        backend = "torchscript"
+        print(f"✅ Exported static int8 model to {checkpoint} (calibrated on {args.calibration_split})")
+    model_manifest = plant_model.load_manifest(checkpoint)
+    model = plant_model.load_backend(checkpoint, backend, model_manifest)
+    classes = list(model_manifest["classes"])
+
+    # ===== DATA =====
+    dataset = load_dataset(args, model_manifest, args.split)
+    if list(dataset.classes) != classes:
+        raise SystemExit(f"❌ Dataset classes {list(dataset.classes)} do not match the model's {classes}")
+    loader = make_loader(dataset, args.batch_size, shuffle=False, num_workers=args.workers,
+                         persistent_workers=False)
+
+    # ===== EVALUATE =====
+    logits, labels, rate = collect_logits(model, loader, len(dataset), len(classes))
+    report = {
+        "checkpoint": os.path.abspath(checkpoint),
+        "backend": backend,
+        "architecture": model_manifest["architecture"],
+        "split": args.split,
+        "images_per_sec": rate,
+        **compute_metrics(logits, labels, classes, args.top_k, args.bins),
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if len(baseline.get("predictions", [])) == report["count"]:
+            changed = sum(a != b for a, b in zip(baseline["predictions"], report["predictions"]))
+            report["compared_to"] = {"report": args.compare, "changed_predictions": changed,
+                                     "top1_delta": report["top1"] - baseline["top1"]}
+        else:
+            print(f"⚠️ {args.compare} covers a different number of images; not compared")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    # ===== SUMMARY =====
+    print(f"📊 {report['architecture']} ({backend}) on {args.split}: {report['count']} images, {rate:.1f} img/s")
+    print(f"   top1={report['top1']:.4f} " + " ".join(f"top{k}={v:.4f}" for k, v in report["top_k"].items() if k != "1")
+          + f" ece={report['ece']:.4f} nll={report['nll']:.4f} macro_f1={report['macro_f1']:.4f}")
+    for row in report["per_class"]:
+        print(f"   {row['class']:24} P={row['precision']:.3f} R={row['recall']:.3f} n={row['support']}")
+    if "compared_to" in report:
+        diff = report["compared_to"]
+        print(f"   vs {args.compare}: {diff['changed_predictions']} prediction(s) changed, "
+              f"top1 {diff['top1_delta']:+.4f}")
+    print(f"✅ Report written to {args.output}")
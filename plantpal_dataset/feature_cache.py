@@ -0,0 +1,158 @@
+"""
+Frozen-backbone feature caching for train_resnet.py --feature-cache.
+
+With the backbone frozen only model.fc learns, so the 512-d penultimate
+features of an image never change between epochs. They are extracted once
+into memory-mapped .npy files and the linear head is then trained on those
+features alone (no images, no backbone forward), which takes seconds per
+hundred epochs.
+
+With views > 1 the train split is cached as `views` feature sets: view 0 is
+the plain image, the others are random crops/flips. Each head epoch picks one
+cached view per image, which keeps some augmentation without re-running the
+backbone.
+
+Layout of <cache_dir>/<split>/:
+    meta.json       classes, image_size, views, count, source
+    features.npy    float32 [views, N, 512]
+    labels.npy      int64 [N]
+"""
+import json
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import Dataset
+from torchvision import transforms
+from tqdm import tqdm
+
+from data_pipeline import make_loader
+
+
+class AugmentedView(Dataset):
+    """Random crop + flip on top of any dataset that yields normalized CHW tensors."""
+
+    def __init__(self, dataset, image_size):
+        self.dataset = dataset
+        self.augment = transforms.Compose([
+            transforms.RandomResizedCrop(image_size, scale=(0.7, 1.0), antialias=True),
+            transforms.RandomHorizontalFlip(),
+        ])
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        image, label = self.dataset[index]
+        return self.augment(image), label
+
+
+def _read_meta(split_dir):
+    try:
+        with open(os.path.join(split_dir, "meta.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+@torch.no_grad()
+def extract_features(model, dataset, split_dir, views, image_size, loader_options, device):
+    """Run the frozen backbone over `dataset` (`views` times) into features.npy."""
+    os.makedirs(split_dir, exist_ok=True)
+    head, model.fc = model.fc, nn.Identity()
+    model.eval()
+    try:
+        features = np.lib.format.open_memmap(
+            os.path.join(split_dir, "features.npy.tmp"), mode="w+", dtype=np.float32,
+            shape=(views, len(dataset), head.in_features),
+        )
+        labels = np.empty(len(dataset), dtype=np.int64)
+
+        for view in range(views):
+            source = dataset if view == 0 else AugmentedView(dataset, image_size)
+            loader = make_loader(source, shuffle=False, **loader_options)
+            start = 0
+            for inputs, batch_labels in tqdm(loader, desc=f"Features (view {view + 1}/{views})",
+                                             unit="batch", leave=False, ascii=True):
+                outputs = model(inputs.to(device, non_blocking=True))
+                features[view, start:start + len(outputs)] = outputs.float().cpu().numpy()
+                labels[start:start + len(outputs)] = batch_labels.numpy()
+                start += len(outputs)
+
+        features.flush()
+        del features
+    finally:
+        model.fc = head
+
+    os.replace(os.path.join(split_dir, "features.npy.tmp"), os.path.join(split_dir, "features.npy"))
+    np.save(os.path.join(split_dir, "labels.npy"), labels)
+
+
+def cached_features(model, dataset, cache_dir, split, views, image_size, source,
+                    loader_options, device, refresh=False):
+    """
+    (features [views, N, D], labels [N]) for one split, extracting them first
+    if the cache is missing, stale or `refresh` is set. `source` identifies
+    where the images came from (data dir or shard dir) and is part of the
+    cache key; pass refresh=True after changing the images themselves.
+    """
+    split_dir = os.path.join(cache_dir, split)
+    meta = {
+        "classes": list(dataset.classes),
+        "image_size": image_size,
+        "views": views,
+        "count": len(dataset),
+        "source": os.path.abspath(source),
+    }
+
+    if refresh or _read_meta(split_dir) != meta:
+        print(f"⏳ Extracting {split} features ({len(dataset)} images x {views} view(s)) ...")
+        extract_features(model, dataset, split_dir, views, image_size, loader_options, device)
+        with open(os.path.join(split_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+    else:
+        print(f"✅ Using cached {split} features from {split_dir}")
+
+    features = np.load(os.path.join(split_dir, "features.npy"), mmap_mode="c")
+    labels = np.load(os.path.join(split_dir, "labels.npy"))
+    return torch.from_numpy(features), torch.from_numpy(labels)
+
+
+def train_head(head, train_features, train_labels, val_features, val_labels,
+               epochs, lr, batch_size=256, device="cpu"):
+    """Train the linear head on cached features. Returns the final validation accuracy."""
+    head = head.to(device)
+    train_features = train_features.to(device)  # [views, N, D]; small enough to keep in memory
+    train_labels = train_labels.to(device)
+    val_features = val_features[0].to(device)
+    val_labels = val_labels.to(device)
+
+    views, count, _ = train_features.shape
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(head.parameters(), lr=lr)
+    rows = torch.arange(count, device=device)
+
+    val_acc = 0.0
+    epoch_bar = tqdm(range(epochs), desc="Head epochs", unit="epoch", ascii=True)
+    for _ in epoch_bar:
+        head.train()
+        # One cached view per image this epoch
+        chosen = train_features[torch.randint(views, (count,), device=device), rows]
+        order = torch.randperm(count, device=device)
+        running_loss = 0.0
+        for start in range(0, count, batch_size):
+            batch = order[start:start + batch_size]
+            optimizer.zero_grad()
+            loss = criterion(head(chosen[batch]), train_labels[batch])
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * len(batch)
+
+        head.eval()
+        with torch.no_grad():
+            preds = head(val_features).argmax(dim=1)
+            val_acc = (preds == val_labels).float().mean().item()
+        epoch_bar.set_postfix(loss=f"{running_loss / count:.4f}", val_acc=f"{val_acc:.4f}")
+
+    return val_acc
@@ -0,0 +1,306 @@
+"""
+Incremental dataset ingestion with duplicate detection.
+
+Keeps a SQLite index (<source>/.plantpal_index.sqlite by default) of every
+image under <source>/<class>/ holding its size, mtime, SHA-256 and 64-bit
+dHash. On each run only new or modified files (by size + mtime) are hashed,
+so rerunning over an unchanged dataset only costs a directory scan.
+
+- Exact duplicates (same SHA-256) are left out of the manifest; the
+  first path in sort order is kept.
+- Near-duplicates (dHash Hamming distance <= --threshold) within a class are
+  grouped, and every group lands in a single split, so the same photo (re-sized,
+  re-encoded, burst shots) can't be in both train and test. Groups are stored
+  in the index; later runs only compare new files against the rest.
+- Splits are sticky: images keep the split stored in the index, and only new
+  groups are assigned, to whichever split is furthest below its ratio.
+  --reshuffle reassigns everything with split_dataset.py's seeded split.
+
+The result is written as a split manifest (path, label, split) and can
+optionally be materialized as train/val/test folders like split_dataset.py.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from split_dataset import SPLITS, list_images, materialize, stratified_split, write_manifest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index, deduplicate and split <source>/<class>/ images.")
+    parser.add_argument("--source", default=r"C:\Users\Trisha\Documents\Plantpal_dataset")
+    parser.add_argument("--index", help="SQLite index path (default: <source>/.plantpal_index.sqlite)")
+    parser.add_argument("--out", help="Where the manifest and split folders go (default: --source)")
+    parser.add_argument("--manifest", help="Manifest CSV path (default: <out>/split_manifest.csv)")
+    parser.add_argument("--ratios", type=float, nargs=3, default=(0.7, 0.2, 0.1),
+                        metavar=("TRAIN", "VAL", "TEST"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threshold", type=int, default=6,
+                        help="Max dHash Hamming distance (of 64 bits) for near-duplicates")
+    parser.add_argument("--reshuffle", action="store_true", help="Ignore stored splits and split again")
+    parser.add_argument("--mode", choices=("manifest", "hardlink", "symlink", "copy"), default="manifest")
+    parser.add_argument("--workers", type=int, default=16)
+    return parser.parse_args()
+
+
+# ====== HASHING ======
+def dhash(path, size=8):
+    """64-bit difference hash: brighter-than-right-neighbour bits of a 9x8 grayscale thumbnail."""
+    with Image.open(path) as img:
+        img.draft("L", (size * 8, size * 8))  # JPEG: decode at reduced scale
+        pixels = list(img.convert("L").resize((size + 1, size), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            value = (value << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return value
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    try:
+        perceptual = f"{dhash(path):016x}"
+    except Exception as e:
+        print(f"⚠️ Could not decode {path}: {e}")
+        perceptual = None
+    return digest.hexdigest(), perceptual
+
+
+# ====== INDEX ======
+def open_index(path):
+    db = sqlite3.connect(path)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS images (
+            path TEXT PRIMARY KEY,
+            label TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            dhash TEXT,
+            grp TEXT,
+            split TEXT
+        )
+    """)
+    return db
+
+
+def refresh_index(db, source, workers):
+    """Bring the index in line with the files on disk. Returns counts of what changed."""
+    indexed = {
+        path: (size, mtime_ns)
+        for path, size, mtime_ns in db.execute("SELECT path, size, mtime_ns FROM images")
+    }
+
+    on_disk = {}
+    for plant, paths in list_images(source).items():
+        for path in paths:
+            stat = os.stat(os.path.join(source, path))
+            on_disk[path] = (plant, stat.st_size, stat.st_mtime_ns)
+
+    changed = [path for path, (_, size, mtime) in on_disk.items() if indexed.get(path) != (size, mtime)]
+    removed = [path for path in indexed if path not in on_disk]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = pool.map(lambda path: hash_file(os.path.join(source, path)), changed)
+        rows = [
+            (path, on_disk[path][0], on_disk[path][1], on_disk[path][2], sha, perceptual)
+            for path, (sha, perceptual) in zip(changed, hashes)
+        ]
+
+    with db:
+        db.executemany("DELETE FROM images WHERE path = ?", [(p,) for p in removed])
+        # Modified files keep their stored split but are re-grouped
+        db.executemany("""
+            INSERT INTO images (path, label, size, mtime_ns, sha256, dhash) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                label = excluded.label, size = excluded.size, mtime_ns = excluded.mtime_ns,
+                sha256 = excluded.sha256, dhash = excluded.dhash, grp = NULL
+        """, rows)
+
+    return {
+        "new": sum(1 for path in changed if path not in indexed),
+        "modified": sum(1 for path in changed if path in indexed),
+        "unchanged": len(on_disk) - len(changed),
+        "removed": len(removed),
+    }
+
+
+# ====== DUPLICATES ======
+class UnionFind:
+    def __init__(self, items):
+        self.parent = {item: item for item in items}
+
+    def find(self, item):
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+def _bands(threshold):
+    """(shift, mask) for threshold + 1 bands covering 64 bits: two hashes within
+    `threshold` bits of each other must agree on at least one band."""
+    count = threshold + 1
+    bands, shift = [], 0
+    for i in range(count):
+        width = 64 // count + (1 if i < 64 % count else 0)
+        bands.append((shift, (1 << width) - 1))
+        shift += width
+    return bands
+
+
+def near_duplicate_groups(images, threshold, stored_groups):
+    """
+    images: {path: (label, dhash int)}; stored_groups: {path: group root from
+    the previous run, or None for new/modified files}.
+    Returns (groups_by_class, {path: group root}, new cross-class pairs).
+
+    Previous groups are restored as-is and only pairs involving a new file
+    are compared, using banded lookups (a candidate must share a band) rather
+    than all pairs, so an unchanged dataset does no comparisons at all.
+    """
+    paths = sorted(images)
+    groups = UnionFind(paths)
+    members_by_root = {}
+    for path in paths:
+        root = stored_groups.get(path)
+        if root is not None:
+            groups.union(path, members_by_root.setdefault(root, path))
+
+    fresh = [path for path in paths if stored_groups.get(path) is None]
+    cross_class = set()
+    if fresh:
+        fresh_set = set(fresh)
+        for shift, mask in _bands(threshold):
+            buckets = {}
+            for path in paths:
+                buckets.setdefault((images[path][1] >> shift) & mask, []).append(path)
+            for a in fresh:
+                for b in buckets[(images[a][1] >> shift) & mask]:
+                    if b == a or (b in fresh_set and b < a):  # each fresh pair once per band
+                        continue
+                    if bin(images[a][1] ^ images[b][1]).count("1") > threshold:
+                        continue
+                    if images[a][0] == images[b][0]:
+                        groups.union(a, b)
+                    else:
+                        cross_class.add(tuple(sorted((a, b))))  # pairs repeat across bands
+
+    roots = {path: groups.find(path) for path in paths}
+    by_root = {}
+    for path in paths:
+        by_root.setdefault(roots[path], []).append(path)
+    groups_by_class = {}
+    for members in by_root.values():
+        groups_by_class.setdefault(images[members[0]][0], []).append(members)
+    return groups_by_class, roots, len(cross_class)
+
+
+# ====== SPLITTING ======
+def sticky_split(groups_by_class, stored, ratios, seed):
+    """
+    Keep each group in its stored split (the majority one if its members
+    disagree) and spread new groups over the splits furthest below their
+    ratio. Returns [(path, class, split)] and how many images changed split.
+    """
+    rows = []
+    moved = 0
+    for plant, groups in sorted(groups_by_class.items()):
+        total = sum(len(group) for group in groups)
+        counts = dict.fromkeys(SPLITS, 0)
+        new_groups = []
+
+        for group in sorted(groups):
+            splits = [stored[path] for path in group if stored.get(path)]
+            if not splits:
+                new_groups.append(group)
+                continue
+            split = max(SPLITS, key=splits.count)
+            moved += sum(1 for path in group if stored.get(path) not in (None, split))
+            counts[split] += len(group)
+            rows.extend((path, plant, split) for path in group)
+
+        random.Random(f"{seed}:{plant}").shuffle(new_groups)
+        for group in new_groups:
+            split = max(SPLITS, key=lambda s: total * ratios[SPLITS.index(s)] - counts[s])
+            counts[split] += len(group)
+            rows.extend((path, plant, split) for path in group)
+    return rows, moved
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not 0 <= args.threshold < 16:
+        raise SystemExit("❌ --threshold must be between 0 and 15")
+    out = args.out or args.source
+    manifest = args.manifest or os.path.join(out, "split_manifest.csv")
+    started = time.perf_counter()
+
+    # ====== INDEX ======
+    db = open_index(args.index or os.path.join(args.source, ".plantpal_index.sqlite"))
+    counts = refresh_index(db, args.source, args.workers)
+    print(f"✅ Index updated in {time.perf_counter() - started:.1f}s: {counts}")
+
+    # ====== DEDUPLICATE ======
+    kept = {}
+    exact_duplicates = undecodable = 0
+    for path, label, sha, perceptual in db.execute(
+        "SELECT path, label, sha256, dhash FROM images ORDER BY path"
+    ):
+        if perceptual is None:
+            undecodable += 1
+        elif sha in kept:
+            exact_duplicates += 1
+        else:
+            kept[sha] = (path, label, int(perceptual, 16))
+    images = {path: (label, value) for path, label, value in kept.values()}
+
+    stored_groups = dict(db.execute("SELECT path, grp FROM images"))
+    groups_by_class, roots, cross_class = near_duplicate_groups(images, args.threshold, stored_groups)
+    grouped = sum(len(g) for groups in groups_by_class.values() for g in groups if len(g) > 1)
+    print(f"   {exact_duplicates} exact duplicate(s) skipped, {undecodable} unreadable file(s) skipped")
+    print(f"   {grouped} image(s) in near-duplicate groups kept within one split")
+    if cross_class:
+        print(f"⚠️ {cross_class} new near-duplicate pair(s) have different labels; check those folders")
+
+    # ====== SPLIT ======
+    if args.reshuffle:
+        rows, moved = stratified_split(groups_by_class, args.ratios, args.seed), None
+    else:
+        stored = dict(db.execute("SELECT path, split FROM images WHERE split IS NOT NULL"))
+        rows, moved = sticky_split(groups_by_class, stored, args.ratios, args.seed)
+
+    with db:
+        db.execute("UPDATE images SET split = NULL, grp = NULL")
+        db.executemany(
+            "UPDATE images SET split = ?, grp = ? WHERE path = ?",
+            [(split, roots[path], path) for path, _, split in rows],
+        )
+    db.close()
+
+    os.makedirs(out, exist_ok=True)
+    write_manifest(rows, manifest)
+    for split in SPLITS:
+        print(f"   {split}: {sum(1 for row in rows if row[2] == split)} images")
+    if moved:
+        print(f"⚠️ {moved} image(s) changed split because their near-duplicate group was merged")
+    print(f"✅ Manifest written to {manifest} in {time.perf_counter() - started:.1f}s")
+
+    if args.mode != "manifest":
+        placed = materialize(rows, args.source, out, args.mode, args.workers)
+        print("✅ Split folders updated:", placed)
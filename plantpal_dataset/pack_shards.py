@@ -0,0 +1,95 @@
+"""
+Pack the train/val/test ImageFolder splits into memory-mapped uint8 shards.
+
+Every image is decoded and resized once; ShardDataset (data_pipeline.py) then
+reads the shards zero-copy, so training, evaluation and quantization
+calibration never decode JPEGs again.
+
+Layout:
+    <out>/index.json                 classes, image_size, per-split shard list
+    <out>/<split>/shard-00000.npy    uint8 [n, 3, H, W]
+    <out>/<split>/labels.npy         int64 [N] for the whole split
+
+    python pack_shards.py --data-dir D:\\Plantpal_dataset --out D:\\Plantpal_shards
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from torchvision import datasets
+
+from data_pipeline import SHARD_INDEX, default_num_workers, iter_decoded
+
+
+def pack_split(split_dir, out_dir, image_size, shard_size, num_workers):
+    folder = datasets.ImageFolder(split_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    labels = np.asarray([label for _, label in folder.samples], dtype=np.int64)
+    np.save(os.path.join(out_dir, "labels.npy"), labels)
+
+    shards = []
+    shard = None
+    written = 0
+    for batch, _ in iter_decoded(folder.samples, image_size, num_workers):
+        batch = batch.numpy()
+        start = 0
+        while start < len(batch):
+            if shard is None:
+                count = min(shard_size, len(labels) - written)
+                name = f"shard-{len(shards):05d}.npy"
+                shard = np.lib.format.open_memmap(
+                    os.path.join(out_dir, name), mode="w+", dtype=np.uint8,
+                    shape=(count, 3, image_size, image_size),
+                )
+                shards.append({"file": name, "count": count})
+                filled = 0
+
+            take = min(len(batch) - start, len(shard) - filled)
+            shard[filled:filled + take] = batch[start:start + take]
+            filled += take
+            written += take
+            start += take
+            if filled == len(shard):
+                shard.flush()
+                shard = None
+
+    print(f"✅ {os.path.basename(split_dir)}: {written} images in {len(shards)} shard(s)")
+    return folder.classes, {"count": written, "shards": shards}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack ImageFolder splits into memory-mapped uint8 shards.")
+    parser.add_argument("--data-dir", required=True, help="Folder containing train/, val/ and test/")
+    parser.add_argument("--out", required=True, help="Output folder for the shards")
+    parser.add_argument("--image-size", type=int, default=128)
+    parser.add_argument("--shard-size", type=int, default=4096, help="Images per shard file")
+    parser.add_argument("--splits", nargs="+", default=["train", "val", "test"])
+    parser.add_argument("--workers", type=int, default=default_num_workers())
+    args = parser.parse_args()
+
+    index = {"image_size": args.image_size, "classes": None, "splits": {}}
+    for split in args.splits:
+        split_dir = os.path.join(args.data_dir, split)
+        if not os.path.isdir(split_dir):
+            print(f"⚠️ Skipping {split}: {split_dir} not found")
+            continue
+
+        classes, info = pack_split(
+            split_dir, os.path.join(args.out, split), args.image_size, args.shard_size, args.workers,
+        )
+        if index["classes"] is None:
+            index["classes"] = classes
+        elif classes != index["classes"]:
+            raise SystemExit(f"❌ {split} has classes {classes}, expected {index['classes']}")
+        index["splits"][split] = info
+
+    # Written last: a folder without index.json is an incomplete pack
+    with open(os.path.join(args.out, SHARD_INDEX), "w") as f:
+        json.dump(index, f, indent=2)
+    print(f"✅ Wrote {os.path.join(args.out, SHARD_INDEX)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,167 @@
+import argparse
+import csv
 import os
-import shutil
 import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+SPLITS = ("train", "val", "test")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Split <source>/<class>/ images into train/val/test (stratified, seeded)."
+    )
+    parser.add_argument("--source", default=r"C:\Users\Trisha\Documents\Plantpal_dataset",
+                        help="Folder with one sub-folder per class")
+    parser.add_argument("--out", help="Where train/ val/ test/ are created (default: --source)")
+    parser.add_argument("--ratios", type=float, nargs=3, default=(0.7, 0.2, 0.1),
+                        metavar=("TRAIN", "VAL", "TEST"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=("hardlink", "symlink", "copy", "manifest"), default="hardlink",
+                        help="How images are placed; 'manifest' only writes the CSV")
+    parser.add_argument("--manifest", help="Manifest CSV path (default: <out>/split_manifest.csv)")
+    parser.add_argument("--workers", type=int, default=16, help="Threads for file operations")
+    parser.add_argument("--clean", action="store_true",
+                        help="Delete existing train/ val/ test/ folders under --out and rebuild them")
+    return parser.parse_args()
+
+
+# ====== SPLITTING ======
+def list_images(source):
+    """{class: [relative paths]} for every class folder directly under `source`."""
+    classes = {}
+    for plant in sorted(os.listdir(source)):
+        plant_path = os.path.join(source, plant)
+        if not os.path.isdir(plant_path) or plant in SPLITS:
+            continue
+        classes[plant] = sorted(
+            f"{plant}/{name}" for name in os.listdir(plant_path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    return classes
+
+
+def stratified_split(groups_by_class, ratios, seed):
+    """
+    groups_by_class: {class: [[path, ...], ...]}, where each inner list is a
+    group that must stay in one split (a single image, or a set of
+    near-duplicates). Returns [(path, class, split)].
+
+    Every class is shuffled with its own seeded RNG, so the result depends only
+    on the seed and that class's files. Adding a class, or images to another
+    class, leaves it unchanged.
+    """
+    train_ratio, val_ratio, _ = ratios
+    rows = []
+    for plant, groups in sorted(groups_by_class.items()):
+        groups = sorted(sorted(group) for group in groups)
+        random.Random(f"{seed}:{plant}").shuffle(groups)
+
+        total = sum(len(group) for group in groups)
+        train_end = round(total * train_ratio)
+        val_end = round(total * (train_ratio + val_ratio))
+
+        taken = 0
+        for group in groups:
+            split = "train" if taken < train_end else "val" if taken < val_end else "test"
+            rows.extend((path, plant, split) for path in group)
+            taken += len(group)
+    return rows
+
+
+def write_manifest(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "label", "split"])
+        writer.writerows(rows)
+
+
+# ====== MATERIALIZING ======
+def place(src, dst, mode):
+    """Link or copy one file. Returns the mode actually used ('skipped' if dst exists)."""
+    if os.path.lexists(dst):
+        return "skipped"
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass  # different drive/filesystem, or links not supported: copy instead
+    elif mode == "symlink":
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return "symlink"
+        except OSError:
+            pass  # Windows without Developer Mode / admin rights
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def prune_stale(rows, out):
+    """
+    Delete files under <out>/<split>/ that the new assignment doesn't put
+    there. Without this, a rerun with another seed or ratios would leave the
+    old placements behind and the same image would sit in two splits.
+    """
+    expected = {os.path.normcase(os.path.join(out, split, path)) for path, _, split in rows}
+    removed = 0
+    for split in SPLITS:
+        for folder, _, names in os.walk(os.path.join(out, split)):
+            for name in names:
+                path = os.path.join(folder, name)
+                if os.path.normcase(path) not in expected:
+                    os.remove(path)
+                    removed += 1
+    return removed
+
+
+def materialize(rows, source, out, mode, workers):
+    """Place every row under <out>/<split>/<class>/, removing stale files first."""
+    removed = prune_stale(rows, out)
+    for split in SPLITS:
+        for plant in {plant for _, plant, _ in rows}:
+            os.makedirs(os.path.join(out, split, plant), exist_ok=True)
+
+    jobs = [
+        (os.path.join(source, path), os.path.join(out, split, path), mode)
+        for path, _, split in rows
+    ]
+    counts = {"removed": removed} if removed else {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for used in pool.map(lambda job: place(*job), jobs):
+            counts[used] = counts.get(used, 0) + 1
+    return counts
+
+
+if __name__ == "__main__":
+    # ====== CONFIGURATION ======
+    args = parse_args()
+    out = args.out or args.source
+    manifest = args.manifest or os.path.join(out, "split_manifest.csv")
+    if abs(sum(args.ratios) - 1) > 1e-6:
+        raise SystemExit(f"❌ Ratios must add up to 1, got {sum(args.ratios)}")
+
+    # ====== SPLIT ======
+    images = list_images(args.source)
+    rows = stratified_split({plant: [[p] for p in paths] for plant, paths in images.items()},
+                            args.ratios, args.seed)
+
+    os.makedirs(out, exist_ok=True)
+    write_manifest(rows, manifest)
+    for split in SPLITS:
+        print(f"   {split}: {sum(1 for row in rows if row[2] == split)} images")
+    print(f"✅ Manifest written to {manifest} ({len(images)} classes, seed {args.seed})")
 
-# ====== CONFIGURATION ======
-SOURCE = r"C:\Users\Trisha\Documents\Plantpal_dataset"  # Change to your folder path
-TRAIN = os.path.join(SOURCE, "train")
-VAL = os.path.join(SOURCE, "val")
-TEST = os.path.join(SOURCE, "test")
-
-# Split ratios
-train_ratio = 0.7
-val_ratio = 0.2
-test_ratio = 0.1
-
-# ====== CREATE FOLDERS ======
-os.makedirs(TRAIN, exist_ok=True)
-os.makedirs(VAL, exist_ok=True)
-os.makedirs(TEST, exist_ok=True)
-
-# ====== PROCESS EACH CLASS ======
-for plant in os.listdir(SOURCE):
-    plant_path = os.path.join(SOURCE, plant)
-
-    # Skip non-folders and already created folders
-    if not os.path.isdir(plant_path):
-        continue
-    if plant in ["train", "val", "test"]:
-        continue
-
-    images = os.listdir(plant_path)
-    random.shuffle(images)
-
-    total_images = len(images)
-    train_split = int(total_images * train_ratio)
-    val_split = int(total_images * (train_ratio + val_ratio))
-
-    train_images = images[:train_split]
-    val_images = images[train_split:val_split]
-    test_images = images[val_split:]
-
-    # Create class folders inside train/val/test
-    os.makedirs(os.path.join(TRAIN, plant), exist_ok=True)
-    os.makedirs(os.path.join(VAL, plant), exist_ok=True)
-    os.makedirs(os.path.join(TEST, plant), exist_ok=True)
-
-    # Copy images
-    for img in train_images:
-        shutil.copy(os.path.join(plant_path, img), os.path.join(TRAIN, plant, img))
-    for img in val_images:
-        shutil.copy(os.path.join(plant_path, img), os.path.join(VAL, plant, img))
-    for img in test_images:
-        shutil.copy(os.path.join(plant_path, img), os.path.join(TEST, plant, img))
-
-print("✅ Dataset split completed: train / val / test created!")
+    # ====== CREATE FOLDERS ======
+    if args.mode != "manifest":
+        if args.clean:
+            for split in SPLITS:
+                shutil.rmtree(os.path.join(out, split), ignore_errors=True)
+        counts = materialize(rows, args.source, out, args.mode, args.workers)
+        print("✅ Dataset split completed: train / val / test created!", counts)
+        if args.mode in ("hardlink", "symlink") and counts.get("copy"):
+            print(f"⚠️ {counts['copy']} file(s) were copied because {args.mode}s were not possible")
+        if counts.get("removed"):
+            print(f"⚠️ Removed {counts['removed']} file(s) from a previous split that are no longer assigned there")
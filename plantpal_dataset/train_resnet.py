@@ -1,52 +1,129 @@
+import argparse
 import os
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torchvision import datasets, transforms, models
-from torch.utils.data import DataLoader
+from torchvision import models
 from tqdm import tqdm
+
+from data_pipeline import (
+    ShardDataset,
+    benchmark_loader,
+    benchmark_train_step,
+    default_num_workers,
+    load_split,
+    make_loader,
+    write_manifest,
+)
+from feature_cache import cached_features, train_head
+from training import (
+    configure_threads,
+    evaluate,
+    load_checkpoint,
+    log_epoch,
+    resolve_precision,
+    save_checkpoint,
+    train_one_epoch,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the PlantPal ResNet18 classifier.")
+    parser.add_argument("--data-dir", default=r"C:\Users\Trisha\Documents\Plantpal_dataset",
+                        help="Folder containing train/ and val/ ImageFolder splits")
+    parser.add_argument("--manifest",
+                        help="Split manifest from split_dataset.py --mode manifest (paths relative to --data-dir)")
+    parser.add_argument("--output", default="plantpal_resnet18.pth")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--image-size", type=int, default=128)
+
+    loading = parser.add_argument_group("data loading")
+    loading.add_argument("--batch-size", type=int, default=32)
+    loading.add_argument("--workers", type=int, default=default_num_workers(),
+                         help="DataLoader worker processes (0 = load in the main process)")
+    loading.add_argument("--prefetch-factor", type=int, default=4,
+                         help="Batches each worker loads ahead")
+    loading.add_argument("--no-persistent-workers", dest="persistent_workers", action="store_false",
+                         help="Restart workers every epoch")
+    loading.add_argument("--pin-memory", action=argparse.BooleanOptionalAction, default=None,
+                         help="Page-locked batches for faster host->GPU copies (default: on with CUDA)")
+    source = loading.add_mutually_exclusive_group()
+    source.add_argument("--cache-dir",
+                        help="Decode and resize every image once into uint8 tensors stored here")
+    source.add_argument("--shards",
+                        help="Read memory-mapped shards written by pack_shards.py instead of --data-dir")
+
+    head = parser.add_argument_group("cached-feature head training")
+    head.add_argument("--feature-cache",
+                      help="Run the frozen backbone once, cache its features here and train only the head on them")
+    head.add_argument("--views", type=int, default=1,
+                      help="Cached views per training image (view 0 plain, the rest random crop/flip)")
+    head.add_argument("--head-batch-size", type=int, default=256)
+    head.add_argument("--refresh-features", action="store_true",
+                      help="Re-extract features even if the cache looks current")
+
+    compute = parser.add_argument_group("compute & checkpoints")
+    compute.add_argument("--device", choices=("auto", "cpu", "cuda"), default="auto")
+    compute.add_argument("--threads", type=int, help="Intra-op threads (default: torch's choice)")
+    compute.add_argument("--interop-threads", type=int, help="Inter-op threads")
+    compute.add_argument("--precision", choices=("auto", "fp32", "bf16"), default="auto",
+                         help="bf16 autocast; 'auto' uses it on CPUs with native bfloat16 support")
+    compute.add_argument("--channels-last", action=argparse.BooleanOptionalAction, default=None,
+                         help="NHWC memory format (default: on for CPU)")
+    compute.add_argument("--checkpoint-dir", default="checkpoints",
+                         help="last.pt (model + optimizer) and train_log.jsonl are written here every epoch")
+    compute.add_argument("--resume", nargs="?", const="last", metavar="CHECKPOINT",
+                         help="Continue from a checkpoint (default: <checkpoint-dir>/last.pt)")
+
+    parser.add_argument("--benchmark", type=int, metavar="BATCHES", default=0,
+                        help="Report images/sec for the loader and the train step over BATCHES batches, then exit")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
     # ===== CONFIGURATION =====
-    data_dir = r"C:\Users\Trisha\Documents\Plantpal_dataset"
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    num_classes = 7
-    batch_size = 2
-    num_epochs = 5
-    learning_rate = 0.001
-
-    # ===== DATA TRANSFORMS =====
-    data_transforms = {
-        'train': transforms.Compose([
-            transforms.Resize((128, 128)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406],
-                                 [0.229, 0.224, 0.225])
-        ]),
-        'val': transforms.Compose([
-            transforms.Resize((128, 128)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406],
-                                 [0.229, 0.224, 0.225])
-        ])
-    }
+    args = parse_args()
+    intra_op, inter_op = configure_threads(args.threads, args.interop_threads)
+    if args.device == "auto":
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    else:
+        device = torch.device(args.device)
+    pin_memory = device.type == "cuda" if args.pin_memory is None else args.pin_memory
+    precision = resolve_precision(device, args.precision)
+    channels_last = device.type == "cpu" if args.channels_last is None else args.channels_last
 
     # ===== DATASET & DATALOADERS =====
-    image_datasets = {x: datasets.ImageFolder(os.path.join(data_dir, x),
-                                              data_transforms[x])
-                      for x in ['train', 'val']}
+    if args.shards:
+        image_datasets = {x: ShardDataset(args.shards, x) for x in ['train', 'val']}
+        args.image_size = image_datasets['train'].image_size
+    else:
+        image_datasets = {
+            x: load_split(args.data_dir, x, args.image_size, cache_dir=args.cache_dir,
+                          num_workers=args.workers, manifest=args.manifest)
+            for x in ['train', 'val']
+        }
 
     dataloaders = {
-        x: DataLoader(
+        x: make_loader(
             image_datasets[x],
-            batch_size=batch_size,
-            shuffle=True,
-            num_workers=0  # safe for Windows
+            batch_size=args.batch_size,
+            shuffle=(x == 'train'),
+            num_workers=args.workers,
+            pin_memory=pin_memory,
+            persistent_workers=args.persistent_workers,
+            prefetch_factor=args.prefetch_factor,
         )
         for x in ['train', 'val']
     }
 
+    classes = image_datasets['train'].classes
+    num_classes = len(classes)
     print(f"✅ Loaded datasets. Training: {len(image_datasets['train'])}, Validation: {len(image_datasets['val'])}")
+    print(f"   batch_size={args.batch_size} workers={args.workers} pin_memory={pin_memory} "
+          f"source={args.shards or args.cache_dir and 'decoded cache' or 'images'}")
+    print(f"   device={device} precision={precision} channels_last={channels_last} "
+          f"threads={intra_op}/{inter_op} (intra/inter-op)")
 
     # ===== LOAD RESNET18 =====
     model = models.resnet18(weights=models.ResNet18_Weights.DEFAULT)
@@ -55,48 +132,87 @@ if __name__ == "__main__":
         param.requires_grad = False
 
     model.fc = nn.Linear(model.fc.in_features, num_classes)
-    model = model.to(device)
+    model = model.to(device, memory_format=torch.channels_last if channels_last else torch.contiguous_format)
 
     criterion = nn.CrossEntropyLoss()
-    optimizer = optim.Adam(model.fc.parameters(), lr=learning_rate)
+    optimizer = optim.Adam(model.fc.parameters(), lr=args.lr)
+
+    # ===== BENCHMARK =====
+    if args.benchmark:
+        loader_rate = benchmark_loader(dataloaders['train'], args.benchmark)
+        step_rate = benchmark_train_step(model, dataloaders['train'], criterion, optimizer, device, args.benchmark,
+                                         precision=precision, channels_last=channels_last)
+        print(f"📊 Loader only:      {loader_rate:8.1f} images/sec")
+        print(f"📊 Full train step:  {step_rate:8.1f} images/sec")
+        if step_rate >= 0.9 * loader_rate:
+            print("   Training is input-bound: add workers or use --cache-dir / --shards")
+        raise SystemExit(0)
+
+    # ===== CACHED-FEATURE HEAD TRAINING =====
+    if args.feature_cache:
+        loader_options = dict(
+            batch_size=args.batch_size,
+            num_workers=args.workers,
+            pin_memory=pin_memory,
+            persistent_workers=False,  # each split/view is read once
+            prefetch_factor=args.prefetch_factor,
+        )
+        features = {
+            x: cached_features(
+                model, image_datasets[x], args.feature_cache, x,
+                views=args.views if x == 'train' else 1,
+                image_size=args.image_size,
+                source=args.shards or args.data_dir,
+                loader_options=loader_options,
+                device=device,
+                refresh=args.refresh_features,
+            )
+            for x in ['train', 'val']
+        }
+        val_acc = train_head(
+            model.fc, *features['train'], *features['val'],
+            epochs=args.epochs, lr=args.lr, batch_size=args.head_batch_size, device=device,
+        )
+        torch.save(model.state_dict(), args.output)
+        manifest = write_manifest(args.output, classes, args.image_size)
+        print(f"✅ Head trained on cached features (val_acc={val_acc:.4f}). Model saved as {args.output}")
+        print(f"✅ Manifest saved as {manifest}")
+        print("Classes:", classes)
+        raise SystemExit(0)
+
+    # ===== RESUME =====
+    start_epoch = 0
+    best_acc = 0.0
+    last_path = os.path.join(args.checkpoint_dir, "last.pt")
+    if args.resume:
+        resume_path = last_path if args.resume == "last" else args.resume
+        start_epoch, state = load_checkpoint(resume_path, model, optimizer, classes)
+        best_acc = state.get("best_acc", 0.0)
+        print(f"✅ Resumed from {resume_path} at epoch {start_epoch + 1}/{args.epochs}")
 
     # ===== TRAINING LOOP =====
-    epoch_bar = tqdm(range(num_epochs), desc="Epochs", unit="epoch", ascii=True)
+    epoch_bar = tqdm(range(start_epoch, args.epochs), desc="Epochs", unit="epoch", ascii=True,
+                     initial=start_epoch, total=args.epochs)
 
     for epoch in epoch_bar:
-        model.train()
-        running_loss = 0.0
-        train_loader = tqdm(dataloaders['train'], desc="Training", unit="batch", leave=False, ascii=True)
-
-        for i, (inputs, labels) in enumerate(train_loader):
-            if i == 0:
-                print("✅ First batch loaded successfully")
-            inputs, labels = inputs.to(device), labels.to(device)
-            optimizer.zero_grad()
-            outputs = model(inputs)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-            running_loss += loss.item() * inputs.size(0)
-            train_loader.set_postfix(loss=f"{loss.item():.4f}")
-
-        epoch_loss = running_loss / len(image_datasets['train'])
-
-        model.eval()
-        correct = 0
-        total = 0
-        val_loader = tqdm(dataloaders['val'], desc="Validation", unit="batch", leave=False, ascii=True)
-        with torch.no_grad():
-            for inputs, labels in val_loader:
-                inputs, labels = inputs.to(device), labels.to(device)
-                outputs = model(inputs)
-                _, preds = torch.max(outputs, 1)
-                total += labels.size(0)
-                correct += (preds == labels).sum().item()
-
-        val_acc = correct / total
+        epoch_loss, train_rate = train_one_epoch(
+            model, dataloaders['train'], criterion, optimizer, device, precision, channels_last,
+        )
+        val_acc, val_rate = evaluate(model, dataloaders['val'], device, precision, channels_last)
+        best_acc = max(best_acc, val_acc)
+
+        save_checkpoint(last_path, model, optimizer, epoch, classes,
+                        extra={"best_acc": best_acc, "image_size": args.image_size})
+        log_epoch(os.path.join(args.checkpoint_dir, "train_log.jsonl"),
+                  epoch=epoch + 1, loss=epoch_loss, val_acc=val_acc,
+                  train_images_per_sec=train_rate, val_images_per_sec=val_rate,
+                  precision=precision, channels_last=channels_last, threads=intra_op)
         epoch_bar.set_postfix(loss=f"{epoch_loss:.4f}", val_acc=f"{val_acc:.4f}")
-
-    torch.save(model.state_dict(), "plantpal_resnet18.pth")
-    print("✅ Model saved as plantpal_resnet18.pth")
-    print("Classes:", image_datasets['train'].classes)
+        tqdm.write(f"📊 Epoch {epoch + 1}/{args.epochs}: loss={epoch_loss:.4f} val_acc={val_acc:.4f} "
+                   f"train={train_rate:.1f} img/s val={val_rate:.1f} img/s")
+
+    torch.save(model.state_dict(), args.output)
+    manifest = write_manifest(args.output, classes, args.image_size)
+    print(f"✅ Model saved as {args.output} (best val_acc={best_acc:.4f}, checkpoints in {args.checkpoint_dir})")
+    print(f"✅ Manifest saved as {manifest} (copy it next to models/plant_classifier.pth as plant_classifier.json)")
+    print("Classes:", classes)
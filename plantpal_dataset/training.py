@@ -0,0 +1,143 @@
+"""
+Training-loop helpers shared by train_resnet.py and distill.py: thread and
+precision setup for CPU training, one-epoch train/eval passes that report
+throughput, and resumable checkpoints (model + optimizer + RNG state).
+"""
+import contextlib
+import json
+import os
+import time
+
+import torch
+from tqdm import tqdm
+
+
+# ===== CPU SETUP =====
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    torch.set_interop_threads() only works before the first parallel op, so
+    call this before building models or loaders.
+    """
+    if inter_op:
+        torch.set_interop_threads(inter_op)
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def cpu_has_fast_bf16():
+    """True when the CPU has native bfloat16 matmul (AVX512-BF16 or AMX)."""
+    checks = (getattr(torch.cpu, name, None) for name in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"))
+    return any(check() for check in checks if check is not None)
+
+
+def resolve_precision(device, precision):
+    """'auto' -> bf16 on CPUs with native support, fp32 otherwise (and always fp32 on CUDA)."""
+    if precision == "auto":
+        return "bf16" if device.type == "cpu" and cpu_has_fast_bf16() else "fp32"
+    return precision
+
+
+def autocast_for(device, precision):
+    if precision == "bf16":
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+# ===== EPOCHS =====
+def train_step(model, inputs, labels, criterion, optimizer, device, precision="fp32",
+               channels_last=False, loss_fn=None):
+    """
+    One optimizer step on a batch, shared by train_one_epoch() and
+    data_pipeline.benchmark_train_step() so the benchmark measures the same
+    precision and memory format as training. Returns the loss tensor.
+    """
+    inputs = inputs.to(device, non_blocking=True)
+    labels = labels.to(device, non_blocking=True)
+    if channels_last:
+        inputs = inputs.contiguous(memory_format=torch.channels_last)
+
+    optimizer.zero_grad()
+    with autocast_for(device, precision):
+        outputs = model(inputs)
+        loss = loss_fn(outputs, inputs, labels) if loss_fn else criterion(outputs, labels)
+    loss.backward()
+    optimizer.step()
+    return loss
+
+
+def train_one_epoch(model, loader, criterion, optimizer, device, precision="fp32",
+                    channels_last=False, loss_fn=None, frozen=()):
+    """
+    One training pass. `loss_fn(outputs, inputs, labels)` replaces
+    criterion(outputs, labels) when given (distillation). Modules in `frozen`
+    stay in eval mode so their BatchNorm statistics don't drift.
+    Returns (mean loss, images/sec).
+    """
+    model.train()
+    for module in frozen:
+        module.eval()
+    running_loss = 0.0
+    seen = 0
+    started = time.perf_counter()
+    batches = tqdm(loader, desc="Training", unit="batch", leave=False, ascii=True)
+
+    for inputs, labels in batches:
+        loss = train_step(model, inputs, labels, criterion, optimizer, device, precision, channels_last, loss_fn)
+        running_loss += loss.item() * inputs.size(0)
+        seen += inputs.size(0)
+        batches.set_postfix(loss=f"{loss.item():.4f}")
+
+    return running_loss / max(seen, 1), seen / (time.perf_counter() - started)
+
+
+@torch.no_grad()
+def evaluate(model, loader, device, precision="fp32", channels_last=False):
+    """Returns (accuracy, images/sec)."""
+    model.eval()
+    correct = torch.zeros((), dtype=torch.int64, device=device)  # summed on-device, read once
+    total = 0
+    started = time.perf_counter()
+    for inputs, labels in tqdm(loader, desc="Validation", unit="batch", leave=False, ascii=True):
+        inputs = inputs.to(device, non_blocking=True)
+        labels = labels.to(device, non_blocking=True)
+        if channels_last:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+        with autocast_for(device, precision):
+            outputs = model(inputs)
+        total += labels.size(0)
+        correct += (outputs.argmax(dim=1) == labels).sum()
+    return correct.item() / max(total, 1), total / (time.perf_counter() - started)
+
+
+# ===== CHECKPOINTS =====
+def save_checkpoint(path, model, optimizer, epoch, classes, extra=None):
+    """Atomically write everything needed to resume after `epoch` (0-based)."""
+    state = {
+        "epoch": epoch,
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "classes": list(classes),
+        "rng": torch.get_rng_state(),
+        **(extra or {}),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    torch.save(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path, model, optimizer, classes):
+    """Restore a save_checkpoint() file. Returns (next epoch, checkpoint dict)."""
+    state = torch.load(path, map_location="cpu")
+    if state["classes"] != list(classes):
+        raise SystemExit(f"❌ {path} was trained on classes {state['classes']}, dataset has {list(classes)}")
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    torch.set_rng_state(state["rng"])
+    return state["epoch"] + 1, state
+
+
+def log_epoch(log_path, **values):
+    """Append one JSON line per epoch (loss, accuracy, throughput, ...)."""
+    with open(log_path, "a") as f:
+        f.write(json.dumps(values) + "\n")